@@ -0,0 +1,88 @@
+"""
+Benchmark the approximate IVF index of the face database against exact search, with synthetic
+128-d (SFace) and 512-d (e.g. ArcFace, Facenet512) embeddings.
+
+The database contains subcluster centroids around random identity centers, several subclusters per
+identity, and the queries are new noisy embeddings of the identities. Reports the time to build the index
+one vector at a time (including the k-means training), the slowest add, the median search time, and the
+recall, i.e. the fraction of queries for which the IVF index returns the same subcluster as exact search.
+
+Usage:
+    python3 benchmark_ann_index.py --dims 128 512 --sizes 10000 100000 --nprobe 4 16 64
+"""
+import argparse
+import time
+
+import numpy as np
+
+from face_tracker.ann_index import ExactIndex, IVFIndex
+
+
+def embeddings(rng, centers, count, noise):
+    """Return count noisy embeddings of random identities."""
+    identities = rng.integers(0, len(centers), count)
+    return (centers[identities] + noise * rng.standard_normal((count, centers.shape[1]))).astype(np.float32)
+
+
+def build(index, vectors):
+    """
+    Add the vectors to the index one at a time, and wait for the training of the IVF index.
+    Returns (build time in seconds, slowest add in ms).
+    """
+    start = time.perf_counter()
+    slowest = 0.0
+    for key, vector in enumerate(vectors):
+        add_start = time.perf_counter()
+        index.add(key, vector)
+        slowest = max(slowest, time.perf_counter() - add_start)
+    if isinstance(index, IVFIndex):
+        index.wait()
+    return time.perf_counter() - start, 1000 * slowest
+
+
+def search(index, queries):
+    """Return (results, median search time in ms)."""
+    results = []
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.search(query)[0])
+        times.append(time.perf_counter() - start)
+    return results, 1000 * float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dims", type=int, nargs="+", default=[128, 512])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--subclusters-per-identity", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.3, help="noise relative to the identity center norm")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'dim':>4} {'size':>7} {'index':>10} {'build s':>8} {'max add ms':>11} {'search ms':>10} {'recall':>7}")
+    for dim in args.dims:
+        for size in args.sizes:
+            centers = rng.standard_normal((size // args.subclusters_per_identity, dim)) / np.sqrt(dim)
+            noise = args.noise / np.sqrt(dim)
+            vectors = embeddings(rng, centers, size, noise)
+            queries = embeddings(rng, centers, args.queries, noise)
+
+            exact = ExactIndex()
+            build_time, add_ms = build(exact, vectors)
+            expected, search_ms = search(exact, queries)
+            print(f"{dim:>4} {size:>7} {'exact':>10} {build_time:>8.2f} {add_ms:>11.2f} {search_ms:>10.3f} {1.0:>7.3f}")
+
+            for nprobe in args.nprobe:
+                ivf = IVFIndex(min_size=min(size, 10000), nprobe=nprobe)
+                build_time, add_ms = build(ivf, vectors)
+                results, search_ms = search(ivf, queries)
+                recall = np.mean([result == key for result, key in zip(results, expected)])
+                print(f"{dim:>4} {size:>7} {f'ivf/{nprobe}':>10} {build_time:>8.2f} {add_ms:>11.2f} {search_ms:>10.3f} "
+                      f"{recall:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
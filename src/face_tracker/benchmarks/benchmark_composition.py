@@ -0,0 +1,128 @@
+"""
+Compare the two-process launch (webcam_node + face_tracker_node, face_tracker.test.launch.py)
+against the single-process launch (face_tracker_camera_node, face_tracker_camera.test.launch.py).
+
+Each launch is started for the given duration. The benchmark reports
+* CPU use of all launched processes (percent of one core), read from /proc
+* end-to-end latency from frame capture to the published /face_tracker/image_face image,
+  computed from the capture stamp in the image header
+* rate of the published image_face images
+
+Subscribing to image_face makes the face tracker draw and publish the debug image,
+which costs the same in both configurations. Requires a sourced ROS 2 environment and a webcam.
+
+Usage:
+    python3 benchmark_composition.py --duration 60
+"""
+import argparse
+import os
+import signal
+import subprocess
+import time
+
+import numpy as np
+import rclpy
+from rclpy.node import Node
+from rclpy.time import Time
+from sensor_msgs.msg import Image
+
+LAUNCH_FILES = {
+    "two processes": "face_tracker.test.launch.py",
+    "single process": "face_tracker_camera.test.launch.py",
+}
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def descendants(pid):
+    """Return pids of all descendant processes of pid."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    result = []
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def cpu_seconds(pids):
+    """Return total user + system CPU time of pids."""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += int(fields[11]) + int(fields[12])
+        except (OSError, IndexError, ValueError):
+            continue
+    return total / CLOCK_TICKS
+
+
+class LatencyProbe(Node):
+    """Collects capture to receive latency of the image_face images."""
+
+    def __init__(self):
+        super().__init__("composition_benchmark")
+        self.latencies = []
+        self.create_subscription(Image, "/face_tracker/image_face", self.on_image, 1)
+
+    def on_image(self, msg):
+        stamp = Time.from_msg(msg.header.stamp)
+        if stamp.nanoseconds > 0:
+            self.latencies.append((self.get_clock().now() - stamp).nanoseconds / 1e9)
+
+
+def run(launch_file, duration, warmup):
+    """Run launch file and return (cpu percent, latencies, image rate)."""
+    process = subprocess.Popen(["ros2", "launch", "face_tracker", launch_file], start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    probe = LatencyProbe()
+    try:
+        end = time.monotonic() + warmup
+        while time.monotonic() < end:
+            rclpy.spin_once(probe, timeout_sec=0.1)
+
+        probe.latencies = []
+        pids = descendants(process.pid)
+        cpu_start = cpu_seconds(pids)
+        start = time.monotonic()
+        while time.monotonic() < start + duration:
+            rclpy.spin_once(probe, timeout_sec=0.1)
+        elapsed = time.monotonic() - start
+        cpu = 100 * (cpu_seconds(pids) - cpu_start) / elapsed
+        return cpu, probe.latencies, len(probe.latencies) / elapsed
+    finally:
+        probe.destroy_node()
+        os.killpg(process.pid, signal.SIGINT)
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=60.0, help="measurement time per configuration (s)")
+    parser.add_argument("--warmup", type=float, default=30.0, help="time for model loading before measuring (s)")
+    args = parser.parse_args()
+
+    rclpy.init()
+    print(f"{'configuration':>15} {'cpu %':>7} {'fps':>6} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>7}")
+    for name, launch_file in LAUNCH_FILES.items():
+        cpu, latencies, rate = run(launch_file, args.duration, args.warmup)
+        if latencies:
+            p50, p95, p_max = 1000 * np.percentile(latencies, [50, 95, 100])
+        else:
+            p50 = p95 = p_max = float("nan")
+        print(f"{name:>15} {cpu:>7.1f} {rate:>6.1f} {p50:>7.1f} {p95:>7.1f} {p_max:>7.1f}")
+    rclpy.shutdown()
+
+
+if __name__ == "__main__":
+    main()
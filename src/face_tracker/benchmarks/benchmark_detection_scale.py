@@ -0,0 +1,75 @@
+"""
+Benchmark face detection on downscaled images.
+
+For every detection scale, reports the median FaceRecognizer.extract_faces latency,
+the number of found faces and the width of the smallest found face in full resolution pixels.
+Use an image or a video recorded with the robot camera to see which face sizes are still found.
+
+Usage:
+    python3 benchmark_detection_scale.py --image ../img/example.png --scales 1.0 0.75 0.5 0.25
+    python3 benchmark_detection_scale.py --image ../img/example.png --pyramid 0.25 0.5
+"""
+import argparse
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+from face_tracker.face_recognition import FaceRecognizer
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "img", "example.png")
+
+
+def benchmark(recognizer, frame, scales, repeats):
+    """Return median latency (ms) and detected faces for scales."""
+    recognizer.detection_scales = scales
+    face_objs = recognizer.extract_faces(frame)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        recognizer.extract_faces(frame)
+        times.append(time.perf_counter() - start)
+    return 1000 * float(np.median(times)), face_objs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default=DEFAULT_IMAGE, help="image or video file, first frame of video is used")
+    parser.add_argument("--width", type=int, default=1280, help="frame is resized to this width, 0 to keep size")
+    parser.add_argument("--detector", default="yunet", help="deepface detector backend")
+    parser.add_argument("--model", default="SFace", help="deepface face recognition model")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.75, 0.5, 0.35, 0.25])
+    parser.add_argument("--pyramid", type=float, nargs="+", help="also benchmark this combination of scales")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    ok, frame = cv2.VideoCapture(args.image).read()
+    if not ok:
+        raise SystemExit(f"Could not read {args.image}")
+    if args.width:
+        frame = cv2.resize(frame, (args.width, int(frame.shape[0] * args.width / frame.shape[1])))
+
+    recognizer = FaceRecognizer(db_path=None,
+                                logger=logging.getLogger("benchmark"),
+                                model_name=args.model,
+                                detector_backend=args.detector)
+
+    configurations = [[scale] for scale in args.scales]
+    if args.pyramid:
+        configurations.append(args.pyramid)
+
+    print(f"detector={args.detector} frame={frame.shape[1]}x{frame.shape[0]}")
+    print(f"{'scales':>16} {'latency ms':>11} {'faces':>6} {'min face px':>12}")
+    for scales in configurations:
+        latency, face_objs = benchmark(recognizer, frame, scales, args.repeats)
+        min_face = min((face_obj["facial_area"]["w"] for face_obj in face_objs), default=0)
+        name = ",".join(f"{scale:g}" for scale in scales)
+        print(f"{name:>16} {latency:>11.1f} {len(face_objs):>6} {min_face:>12}")
+
+
+if __name__ == "__main__":
+    main()
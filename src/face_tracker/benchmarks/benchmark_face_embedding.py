@@ -0,0 +1,87 @@
+"""
+Benchmark detection frame latency of FaceAnalyzer against the number of faces in the frame.
+
+Compares embedding every face with its own model call (FaceRecognizer.represent)
+to embedding all faces of the frame with one call (FaceRecognizer.represent_batch).
+The detector is replaced with a fixed list of synthetic faces, so that the face count
+can be controlled and only the embedding and clustering part of the detection frame is measured.
+
+Only Keras models are batched. SFace is an OpenCV model, which embeds one face per call also in represent_batch,
+so it gives the same times in both modes.
+
+Usage:
+    python3 benchmark_face_embedding.py --model Facenet --max-faces 8 --repeats 20
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from face_tracker.face_analyzer import FaceAnalyzer
+
+
+def synthetic_face_objs(count, size=160):
+    """Return deepface extract_faces like result with count random faces."""
+    rng = np.random.default_rng(0)
+    face_objs = []
+    for i in range(count):
+        face_objs.append({
+            "face": rng.random((size, size, 3), dtype=np.float32),
+            "facial_area": {"x": 10 + i * (size + 10), "y": 10, "w": size, "h": size},
+            "confidence": 1.0,
+        })
+    return face_objs
+
+
+def time_detection_frame(analyzer, frame, repeats):
+    """Return median analyze_frame time in milliseconds."""
+    times = []
+    # Start from an empty identity database so that both variants do the same clustering work
+    analyzer.cluster.clusters = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        analyzer.analyze_frame(frame)
+        times.append(time.perf_counter() - start)
+    return 1000 * float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="SFace", help="deepface face recognition model")
+    parser.add_argument("--max-faces", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger("benchmark")
+
+    analyzer = FaceAnalyzer(logger,
+                            lip_movement_detector=None,
+                            face_recognizer=True,
+                            correlation_tracker=False,
+                            face_recognition_model=args.model)
+    recognizer = analyzer.face_recognizer
+    represent_batch = recognizer.represent_batch
+    frame = np.zeros((960, 1280, 3), dtype=np.uint8)
+
+    # Warm up the model
+    recognizer.represent_batch([face["face"] for face in synthetic_face_objs(2)])
+
+    print(f"model={args.model}")
+    print(f"{'faces':>5} {'per-face ms':>12} {'batched ms':>12} {'speedup':>8}")
+    for count in range(1, args.max_faces + 1):
+        face_objs = synthetic_face_objs(count)
+        recognizer.extract_faces = lambda img, face_objs=face_objs: face_objs
+
+        recognizer.represent_batch = lambda imgs: [recognizer.represent(img) for img in imgs]
+        per_face = time_detection_frame(analyzer, frame, args.repeats)
+
+        recognizer.represent_batch = represent_batch
+        batched = time_detection_frame(analyzer, frame, args.repeats)
+
+        print(f"{count:>5} {per_face:>12.1f} {batched:>12.1f} {per_face / batched:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Compare the DeepFace and OpenCV face recognition backends with the yunet detector and SFace model.
+
+For both backends, reports the median latency of extract_faces on a frame, the median latency of
+embedding the found faces with represent_batch, and the number of found faces. For faces found by both
+backends, the cosine similarity of the DeepFace and OpenCV embeddings of the same face is also reported,
+as the OpenCV backend aligns faces by their landmarks.
+
+Usage:
+    python3 benchmark_face_recognition_backend.py --image ../img/example.png --repeats 50
+"""
+import argparse
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+from face_tracker.face_analyzer import face_recognizer_class
+from face_tracker.face_boxes import match_facial_areas
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "img", "example.png")
+
+
+def median_ms(function, repeats):
+    """Return median latency (ms) of function calls."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return 1000 * float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default=DEFAULT_IMAGE, help="image or video file, first frame of video is used")
+    parser.add_argument("--width", type=int, default=1280, help="frame is resized to this width, 0 to keep size")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    ok, frame = cv2.VideoCapture(args.image).read()
+    if not ok:
+        raise SystemExit(f"Could not read {args.image}")
+    if args.width:
+        frame = cv2.resize(frame, (args.width, int(frame.shape[0] * args.width / frame.shape[1])))
+
+    print(f"frame={frame.shape[1]}x{frame.shape[0]}")
+    print(f"{'backend':>10} {'detection ms':>13} {'embedding ms':>13} {'faces':>6}")
+    results = {}
+    for backend in ["deepface", "opencv"]:
+        recognizer = face_recognizer_class(backend)(db_path=None,
+                                                    logger=logging.getLogger("benchmark"),
+                                                    model_name="SFace",
+                                                    detector_backend="yunet")
+        recognizer.warm_up(frame.shape)
+        face_objs = recognizer.extract_faces(frame)
+        faces = [face_obj["face"] for face_obj in face_objs]
+        detection = median_ms(lambda: recognizer.extract_faces(frame), args.repeats)
+        embedding = median_ms(lambda: recognizer.represent_batch(faces), args.repeats)
+        results[backend] = (face_objs, recognizer.represent_batch(faces))
+        print(f"{backend:>10} {detection:>13.1f} {embedding:>13.1f} {len(face_objs):>6}")
+
+    deepface_objs, deepface_embeddings = results["deepface"]
+    opencv_objs, opencv_embeddings = results["opencv"]
+    matches = match_facial_areas([face_obj["facial_area"] for face_obj in opencv_objs],
+                                 [face_obj["facial_area"] for face_obj in deepface_objs])
+    for opencv_idx, deepface_idx in sorted(matches.items()):
+        a = np.asarray(opencv_embeddings[opencv_idx])
+        b = np.asarray(deepface_embeddings[deepface_idx])
+        similarity = float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+        print(f"face {opencv_idx}: embedding cosine similarity {similarity:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark the persistent face database against the number of subclusters.
+
+The database contains random centroids, a few subclusters per identity with edges between them. Reports
+the median time of one change log record on the frame path (one changed cluster, as after recognizing a face),
+the mean time of writing a record in the background thread, the time of a snapshot, the time of loading the
+snapshot and the log, and the size of the snapshot files.
+
+Usage:
+    python3 benchmark_identity_store.py --dim 128 --counts 1000 10000 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from face_tracker.identity_store import IdentityStore
+from face_tracker.links_cluster import Cluster, LinksCluster, Subcluster
+
+
+def make_cluster(count, dim, subclusters_per_identity, rng):
+    """Return LinksCluster with count subclusters of random centroids."""
+    links_cluster = LinksCluster(0.3, 0.2, 1.0)
+    vectors = rng.standard_normal((count, dim))
+    for start in range(0, count, subclusters_per_identity):
+        cluster = Cluster(Subcluster(vectors[start]))
+        for vector in vectors[start + 1:start + subclusters_per_identity]:
+            subcluster = Subcluster(vector)
+            LinksCluster.add_edge(cluster.subclusters[-1], subcluster)
+            cluster.add_subcluster(subcluster)
+        links_cluster.clusters.append(cluster)
+    links_cluster.rebuild_index()
+    return links_cluster
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=128, help="embedding size, 128 for SFace")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--subclusters-per-identity", type=int, default=3)
+    parser.add_argument("--records", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'subclusters':>11} {'record ms':>10} {'write ms':>9} {'snapshot s':>11} {'load s':>8} {'size MB':>8}")
+    for count in args.counts:
+        links_cluster = make_cluster(count, args.dim, args.subclusters_per_identity, rng)
+        with tempfile.TemporaryDirectory() as path:
+            store = IdentityStore(path, links_cluster, snapshot_interval=args.records + 1)
+            start = time.perf_counter()
+            store.snapshot()
+            snapshot_time = time.perf_counter() - start
+            size = sum(os.path.getsize(os.path.join(path, file)) for file in os.listdir(path)) / 1e6
+
+            times = []
+            write_start = time.perf_counter()
+            for cl_idx in rng.integers(0, len(links_cluster.clusters), args.records):
+                links_cluster.clusters[cl_idx].subclusters[0].add(rng.standard_normal(args.dim))
+                links_cluster.changed_clusters.add(int(cl_idx))
+                start = time.perf_counter()
+                store.record()
+                times.append(time.perf_counter() - start)
+            store.flush()
+            write_time = (time.perf_counter() - write_start) / args.records
+            store._log.close()
+
+            restored = LinksCluster(0.3, 0.2, 1.0)
+            start = time.perf_counter()
+            IdentityStore(path, restored).load()
+            load_time = time.perf_counter() - start
+            assert sum(len(cl.subclusters) for cl in restored.clusters) == count
+
+        print(f"{count:>11} {1000 * float(np.median(times)):>10.3f} {1000 * write_time:>9.3f} "
+              f"{snapshot_time:>11.3f} {load_time:>8.3f} "
+              f"{size:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark image conversion between sensor_msgs/Image and NumPy: CvBridge vs. face_tracker.image_conversion.
+
+Measures both directions for bgr8 and mono8 images at 640x480, 1280x960 and 1920x1080.
+Requires a sourced ROS 2 environment.
+
+Usage:
+    python3 benchmark_image_conversion.py --repeats 200
+"""
+import argparse
+import time
+
+import numpy as np
+from cv_bridge import CvBridge
+
+from face_tracker.image_conversion import imgmsg_to_numpy, numpy_to_imgmsg
+
+RESOLUTIONS = [(640, 480), (1280, 960), (1920, 1080)]
+
+
+def median_us(function, repeats):
+    """Return median run time of function in microseconds."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return 1e6 * float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    bridge = CvBridge()
+    rng = np.random.default_rng(0)
+
+    print(f"{'encoding':>8} {'resolution':>10} {'direction':>10} {'CvBridge us':>12} {'helper us':>10} {'speedup':>8}")
+    for encoding, channels in (("bgr8", 3), ("mono8", 1)):
+        for width, height in RESOLUTIONS:
+            shape = (height, width, channels) if channels > 1 else (height, width)
+            img = rng.integers(0, 255, shape, dtype=np.uint8)
+            msg = numpy_to_imgmsg(img, encoding)
+            assert np.array_equal(imgmsg_to_numpy(msg), bridge.imgmsg_to_cv2(msg, encoding))
+
+            results = [
+                ("to numpy",
+                 median_us(lambda: bridge.imgmsg_to_cv2(msg, encoding), args.repeats),
+                 median_us(lambda: imgmsg_to_numpy(msg), args.repeats)),
+                ("to msg",
+                 median_us(lambda: bridge.cv2_to_imgmsg(img, encoding), args.repeats),
+                 median_us(lambda: numpy_to_imgmsg(img, encoding), args.repeats)),
+            ]
+            for direction, bridge_time, helper_time in results:
+                print(f"{encoding:>8} {f'{width}x{height}':>10} {direction:>10} "
+                      f"{bridge_time:>12.1f} {helper_time:>10.1f} {bridge_time / helper_time:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
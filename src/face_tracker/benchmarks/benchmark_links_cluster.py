@@ -0,0 +1,122 @@
+"""
+Benchmark the nearest subcluster search of LinksCluster.predict against the number of subclusters,
+with the centroid matrix (one matrix-vector product) and with the previous loop, which compares
+the query to every centroid with scipy.spatial.distance.cosine.
+
+Subclusters are random unit vectors, each in its own cluster. Reports the median time of one search.
+
+With --cluster-sizes, benchmarks LinksCluster.update_cluster against the number of subclusters of one cluster
+instead, with subcluster positions found by id and with the previous scan of the subcluster list per edge.
+The cluster is a star: a changed subcluster connected to every other subcluster.
+
+Usage:
+    python3 benchmark_links_cluster.py --dim 128 --counts 10 100 1000 10000 100000
+    python3 benchmark_links_cluster.py --cluster-sizes 10 100 1000 10000
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.spatial.distance import cosine
+
+from face_tracker.links_cluster import Cluster, LinksCluster, Subcluster
+
+
+def make_cluster(count, dim, rng):
+    """Return LinksCluster with count subclusters of random centroids."""
+    links_cluster = LinksCluster(0.3, 0.2, 1.0)
+    links_cluster.clusters = [Cluster(Subcluster(vector)) for vector in rng.standard_normal((count, dim))]
+    links_cluster.rebuild_index()
+    return links_cluster
+
+
+def loop_search(links_cluster, vector):
+    """Nearest subcluster search of the previous LinksCluster.predict."""
+    best_similarity = -np.inf
+    best = None
+    for cl_idx, cl in enumerate(links_cluster.clusters):
+        for sc_idx, sc in enumerate(cl.subclusters):
+            cossim = 1.0 - cosine(vector, sc.centroid)
+            if cossim > best_similarity:
+                best_similarity = cossim
+                best = (cl_idx, sc_idx, cossim)
+    return best
+
+
+def star_cluster(size, dim, rng):
+    """Return LinksCluster with one cluster, whose first subcluster is connected to size - 1 subclusters."""
+    links_cluster = LinksCluster(0.3, 0.2, 1.0)
+    hub = np.zeros(dim)
+    hub[0] = 1.0
+    cluster = Cluster(Subcluster(hub))
+    for _ in range(size - 1):
+        # Similar enough to keep the edge, but not to be merged
+        direction = rng.standard_normal(dim)
+        direction[0] = 0.0
+        subcluster = Subcluster(0.15 * hub + np.sqrt(1 - 0.15 ** 2) * direction / np.linalg.norm(direction))
+        LinksCluster.add_edge(cluster.subclusters[0], subcluster)
+        cluster.add_subcluster(subcluster)
+    links_cluster.clusters = [cluster]
+    links_cluster.rebuild_index()
+    return links_cluster
+
+
+def scan_update(links_cluster, cl_idx, sc_idx):
+    """Edge updates of the previous LinksCluster.update_cluster, which scanned the subclusters for every edge."""
+    updated_sc = links_cluster.clusters[cl_idx].subclusters[sc_idx]
+    for connected_sc in set(updated_sc.connected_subclusters):
+        connected_sc_idx = None
+        for c_sc_idx, sc in enumerate(links_cluster.clusters[cl_idx].subclusters):
+            if sc == connected_sc:
+                connected_sc_idx = c_sc_idx
+        cossim = 1.0 - cosine(updated_sc.centroid, connected_sc.centroid)
+        if cossim < links_cluster.subcluster_similarity_threshold:
+            links_cluster.update_edge(updated_sc, connected_sc)
+
+
+def median_ms(function, queries):
+    """Return median time of function(query) in milliseconds."""
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        function(query)
+        times.append(time.perf_counter() - start)
+    return 1000 * float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=128, help="embedding size, 128 for SFace")
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--cluster-sizes", type=int, nargs="+", help="benchmark update_cluster with these sizes")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.cluster_sizes:
+        print(f"{'subclusters':>11} {'scan ms':>10} {'by id ms':>10} {'speedup':>8}")
+        for size in args.cluster_sizes:
+            links_cluster = star_cluster(size, args.dim, rng)
+            repeats = list(range(max(3, min(20, 10000 // size))))
+            scan_ms = median_ms(lambda _: scan_update(links_cluster, 0, 0), repeats)
+            update_ms = median_ms(lambda _: links_cluster.update_cluster(0, 0), repeats)
+            assert len(links_cluster.clusters) == 1 and len(links_cluster.clusters[0].subclusters) == size
+            print(f"{size:>11} {scan_ms:>10.3f} {update_ms:>10.3f} {scan_ms / update_ms:>7.0f}x")
+        return
+
+    print(f"{'subclusters':>11} {'loop ms':>10} {'matrix ms':>10} {'speedup':>8}")
+    for count in args.counts:
+        links_cluster = make_cluster(count, args.dim, rng)
+        queries = list(rng.standard_normal((args.queries, args.dim)))
+        for query in queries[:3]:
+            assert loop_search(links_cluster, query)[:2] == links_cluster.nearest_subcluster(query)[:2]
+
+        # The loop takes seconds per search with large databases, so it is timed with fewer queries
+        loop_ms = median_ms(lambda query: loop_search(links_cluster, query),
+                            queries[:max(3, min(len(queries), 100000 // count))])
+        matrix_ms = median_ms(links_cluster.nearest_subcluster, queries)
+        print(f"{count:>11} {loop_ms:>10.3f} {matrix_ms:>10.3f} {loop_ms / matrix_ms:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark memory use and throughput of the face tracker against the number of cameras, with the models
+shared by the cameras (image_topics parameter of face_tracker_node) and with a separate copy of the models
+for every camera (one face tracker per camera).
+
+Every configuration is run in a new process, which loads the models and processes the frames of the input
+in one thread per camera, like face_tracker_node does. Reports the resident memory of the process after
+the run, the frame rate of each camera, the total frame rate and the median and 95th percentile
+processing latency of a frame. Frames of the cameras are the same
+frames shifted in time, so the cameras see different faces on the same frame.
+
+Usage:
+    python3 benchmark_multi_camera.py faces.mp4 --max-cameras 4
+    python3 benchmark_multi_camera.py frames/ --predictor shape_predictor_68_face_landmarks.dat \\
+        --lip-model ../models/1_32_False_True_0.25_lip_motion_net_model.h5
+"""
+import argparse
+import logging
+import multiprocessing
+import threading
+import time
+
+import dlib
+import numpy as np
+
+from face_tracker.face_analyzer import FaceAnalyzer, face_recognizer_class, DEFAULT_FACE_DB_PATH
+from face_tracker.instrumentation import memory_usage_mb
+from face_tracker.links_cluster import LinksCluster
+from face_tracker.replay import read_frames
+from face_tracker.shared_models import EmbeddingBatcher, SharedFaceRecognizer
+
+
+def load_models(args, logger):
+    """Return (lip movement detector or None, face recognizer)."""
+    lip_movement_detector = None
+    if args.predictor and args.lip_model:
+        from face_tracker.lip_movement_net import LipMovementDetector
+        lip_movement_detector = LipMovementDetector(args.lip_model, dlib.shape_predictor(args.predictor))
+    face_recognizer = face_recognizer_class(args.backend)(db_path=DEFAULT_FACE_DB_PATH,
+                                                          logger=logger,
+                                                          model_name=args.model,
+                                                          detector_backend=args.detector)
+    face_recognizer.warm_up()
+    return lip_movement_detector, face_recognizer
+
+
+def run(cameras, shared, args, frames, result_queue):
+    """Process frames with the cameras in this process, and put the result to the queue."""
+    logger = logging.getLogger("benchmark")
+    analyzers = []
+    if shared:
+        lip_movement_detector, face_recognizer = load_models(args, logger)
+        detection_lock = threading.Lock()
+        batcher = EmbeddingBatcher(face_recognizer.represent_batch, cameras)
+        cluster = LinksCluster(0.3, 0.2, 1.0, logger=logger, vector_retention="reservoir")
+        cluster_lock = threading.Lock()
+        for _ in range(cameras):
+            analyzers.append(FaceAnalyzer(logger,
+                                          lip_movement_detector.share() if lip_movement_detector else None,
+                                          SharedFaceRecognizer(face_recognizer, detection_lock, batcher),
+                                          correlation_tracker=args.correlation_tracking,
+                                          cluster=cluster,
+                                          cluster_lock=cluster_lock))
+    else:
+        for _ in range(cameras):
+            lip_movement_detector, face_recognizer = load_models(args, logger)
+            analyzers.append(FaceAnalyzer(logger,
+                                          lip_movement_detector,
+                                          face_recognizer,
+                                          correlation_tracker=args.correlation_tracking))
+
+    latencies = []
+
+    def process(analyzer, offset):
+        for i in range(len(frames)):
+            start = time.perf_counter()
+            analyzer.on_frame_received(frames[(i + offset) % len(frames)].copy(), draw=False)
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=process, args=(analyzer, index * len(frames) // cameras))
+               for index, analyzer in enumerate(analyzers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    result_queue.put((memory_usage_mb(), len(frames) / elapsed,
+                      1000 * np.percentile(latencies, 50), 1000 * np.percentile(latencies, 95)))
+
+
+def benchmark(cameras, shared, args, frames):
+    """Return (memory in MB, fps of one camera, p50 ms, p95 ms) of a configuration, measured in a new process."""
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(target=run, args=(cameras, shared, args, frames, result_queue))
+    process.start()
+    # The result is small, so the process can exit before it is read
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Benchmark of {cameras} cameras failed with exit code {process.exitcode}")
+    return result_queue.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="video file or directory of frames")
+    parser.add_argument("--max-cameras", type=int, default=4)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--backend", default="deepface")
+    parser.add_argument("--model", default="SFace")
+    parser.add_argument("--detector", default="yunet")
+    parser.add_argument("--correlation-tracking", action="store_true")
+    parser.add_argument("--predictor", help="dlib shape predictor file, enables lip movement detection")
+    parser.add_argument("--lip-model", help="lip movement model file, enables lip movement detection")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    frames = []
+    for frame in read_frames(args.input, args.width):
+        frames.append(frame)
+        if len(frames) >= args.frames:
+            break
+
+    print(f"{'cameras':>7} {'models':>8} {'memory MB':>10} {'fps/camera':>11} {'total fps':>10} "
+          f"{'p50 ms':>7} {'p95 ms':>7}")
+    for cameras in range(1, args.max_cameras + 1):
+        for shared in (True, False):
+            if cameras == 1 and not shared:
+                continue
+            memory, fps, p50, p95 = benchmark(cameras, shared, args, frames)
+            print(f"{cameras:>7} {'shared' if shared else 'separate':>8} {memory:>10.0f} {fps:>11.1f} "
+                  f"{cameras * fps:>10.1f} {p50:>7.1f} {p95:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
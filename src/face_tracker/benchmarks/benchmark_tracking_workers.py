@@ -0,0 +1,91 @@
+"""
+Benchmark tracking frames of FaceAnalyzer against the number of faces, with faces updated serially
+and in the tracking thread pool (tracking_workers parameter).
+
+A tracking frame updates the dlib correlation tracker of every face and, if a shape predictor and
+a lip movement model are given, predicts the lip landmarks and classifies lip movement of every face.
+Faces are textured squares on a synthetic frame, which moves a few pixels every frame.
+
+Usage:
+    python3 benchmark_tracking_workers.py --max-faces 8 --workers 2 4
+    python3 benchmark_tracking_workers.py --predictor shape_predictor_68_face_landmarks.dat \\
+        --lip-model ../models/1_32_False_True_0.25_lip_motion_net_model.h5
+"""
+import argparse
+import logging
+import time
+
+import cv2
+import dlib
+import numpy as np
+
+from face_tracker.face import Face
+from face_tracker.face_analyzer import FaceAnalyzer
+
+FACE_SIZE = 150
+
+
+def make_frames(count, width=1280, height=960):
+    """Return synthetic frames, where the image content moves 2 pixels per frame."""
+    rng = np.random.default_rng(0)
+    base = cv2.GaussianBlur((rng.random((height, width, 3)) * 255).astype(np.uint8), (9, 9), 0)
+    return [np.roll(base, shift=(2 * i, 2 * i), axis=(0, 1)) for i in range(count)]
+
+
+def benchmark(workers, face_count, frames, lip_movement_detector):
+    """Return median time of a tracking frame in milliseconds."""
+    analyzer = FaceAnalyzer(logging.getLogger("benchmark"),
+                            lip_movement_detector=lip_movement_detector,
+                            face_recognizer=False,
+                            correlation_tracker=True,
+                            tracking_workers=workers)
+    faces = []
+    for i in range(face_count):
+        left = 20 + (i % 6) * (FACE_SIZE + 50)
+        top = 20 + (i // 6) * (FACE_SIZE + 50)
+        face = Face(left, left + FACE_SIZE, top, top + FACE_SIZE, None, None, None)
+        face.start_track(frames[0])
+        faces.append(face)
+    analyzer.set_faces(faces)
+
+    times = []
+    for frame in frames[1:]:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        start = time.perf_counter()
+        analyzer.update_locations(frame)
+        if lip_movement_detector is not None:
+            analyzer.detect_lip_movement(gray)
+        times.append(time.perf_counter() - start)
+    analyzer.shutdown()
+    return 1000 * float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-faces", type=int, default=8)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--predictor", help="dlib shape predictor file, enables lip landmark stage")
+    parser.add_argument("--lip-model", help="lip movement model file, enables lip landmark stage")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    lip_movement_detector = None
+    if args.predictor and args.lip_model:
+        from face_tracker.lip_movement_net import LipMovementDetector
+        lip_movement_detector = LipMovementDetector(args.lip_model, dlib.shape_predictor(args.predictor))
+
+    frames = make_frames(args.frames)
+
+    header = f"{'faces':>5} {'serial ms':>10}" + "".join(f" {f'{w} workers ms':>14}" for w in args.workers)
+    print(header)
+    for face_count in range(1, args.max_faces + 1):
+        row = f"{face_count:>5} {benchmark(0, face_count, frames, lip_movement_detector):>10.1f}"
+        for workers in args.workers:
+            row += f" {benchmark(workers, face_count, frames, lip_movement_detector):>14.1f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
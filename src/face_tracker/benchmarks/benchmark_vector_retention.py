@@ -0,0 +1,50 @@
+"""
+Benchmark the memory held by the face database over a long run, for every vector retention policy.
+
+A few identities are seen again and again, like the regular visitors of a long deployment. Identity centers
+are orthogonal unit vectors, and every face is a noisy embedding of its identity, predicted with LinksCluster.
+Reports the memory held by the centroids and the stored vectors (LinksCluster.memory_report) and the median
+time of a prediction.
+
+Usage:
+    python3 benchmark_vector_retention.py --dim 128 --faces 1000 10000 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from face_tracker.links_cluster import LinksCluster
+from face_tracker.vector_retention import RETENTION_POLICIES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=128, help="embedding size, 128 for SFace")
+    parser.add_argument("--faces", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--identities", type=int, default=20)
+    parser.add_argument("--retained-vectors", type=int, default=32)
+    parser.add_argument("--noise", type=float, default=0.3, help="noise norm relative to the identity center norm")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = np.linalg.qr(rng.standard_normal((args.dim, args.identities)))[0].T
+    print(f"{'faces':>7} {'policy':>10} {'identities':>10} {'vectors':>8} {'memory MB':>10} {'predict ms':>11}")
+    for faces in args.faces:
+        noise = args.noise / np.sqrt(args.dim) * rng.standard_normal((faces, args.dim))
+        vectors = centers[rng.integers(0, args.identities, faces)] + noise
+        for policy in RETENTION_POLICIES:
+            links_cluster = LinksCluster(0.3, 0.2, 1.0, vector_retention=policy,
+                                         retained_vectors=args.retained_vectors)
+            times = []
+            for vector in vectors:
+                start = time.perf_counter()
+                links_cluster.predict(vector)
+                times.append(time.perf_counter() - start)
+            report = links_cluster.memory_report()
+            print(f"{faces:>7} {policy:>10} {len(report):>10} {sum(cl['vectors'] for cl in report):>8} "
+                  f"{sum(cl['bytes'] for cl in report) / 1e6:>10.2f} {1000 * float(np.median(times)):>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Nearest neighbour indexes of the subcluster centroids of LinksCluster.
+
+Vectors are stored normalized, so the inner product of a normalized query and a stored vector is their
+cosine similarity. Every vector has a key (a subcluster), and vectors can be added, updated and removed
+one at a time as subclusters are created, changed and merged.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+INDEXES = ["exact", "ivf"]
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def create_index(kind="exact", **kwargs):
+    """
+    Return a new index.
+
+    "exact": ExactIndex, compares the query to every vector
+    "ivf": IVFIndex, compares the query only to the vectors of the nearest k-means lists
+    """
+    if kind == "exact":
+        return ExactIndex(**kwargs)
+    if kind == "ivf":
+        return IVFIndex(**kwargs)
+    raise ValueError(f"Unknown index {kind}, use one of {INDEXES}")
+
+
+class ExactIndex:
+    """
+    Exact search. The vectors are rows of a contiguous matrix, so the query is compared to all of them
+    with one matrix-vector product. A removed row is replaced by the last row.
+    """
+
+    def __init__(self, capacity=64):
+        """
+        Args:
+            capacity: Initial number of rows, doubled when full
+        """
+        self.capacity = capacity
+        self.matrix = None
+        self.keys = []
+        self._rows = {}  # key -> row
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def vectors(self):
+        """Return the normalized vectors as a matrix view, in the order of keys."""
+        return self.matrix[:len(self.keys)] if self.matrix is not None else np.zeros((0, 0), dtype=np.float32)
+
+    def vector(self, key):
+        """Return the normalized vector of the key."""
+        return self.matrix[self._rows[key]]
+
+    def add(self, key, vector, normalized=False):
+        """Add vector of a new key."""
+        if self.matrix is None:
+            self.matrix = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+        elif len(self.keys) == len(self.matrix):
+            self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+        row = len(self.keys)
+        self._rows[key] = row
+        self.keys.append(key)
+        self.matrix[row] = vector if normalized else _normalize(vector)
+
+    def update(self, key, vector, normalized=False):
+        """Replace the vector of the key."""
+        self.matrix[self._rows[key]] = vector if normalized else _normalize(vector)
+
+    def remove(self, key):
+        """Remove the key and its vector."""
+        row = self._rows.pop(key)
+        last = len(self.keys) - 1
+        if row != last:
+            moved = self.keys[last]
+            self.matrix[row] = self.matrix[last]
+            self.keys[row] = moved
+            self._rows[moved] = row
+        self.keys.pop()
+
+    def search(self, vector, normalized=False):
+        """
+        Return (key, cosine similarity) of the vector most similar to the query, or None if the index is empty.
+        """
+        if not self.keys:
+            return None
+        query = vector if normalized else _normalize(vector)
+        similarities = self.vectors() @ query
+        row = int(np.argmax(similarities))
+        return self.keys[row], float(similarities[row])
+
+
+class IVFIndex:
+    """
+    Approximate search with an inverted file index. The vectors are divided to lists by spherical k-means,
+    and a query is compared only to the vectors of the nprobe lists, whose k-means centroids are nearest
+    to the query. A new or updated vector is moved to the list of its nearest centroid.
+
+    Below min_size vectors, the index is a single list and the search is exact. The lists are trained when
+    the index reaches min_size vectors, and trained again whenever the index has doubled in size,
+    so the lists follow the vectors as the database grows.
+
+    With background training, k-means runs in a background thread on a copy of the vectors, and the current
+    lists serve the queries meanwhile. The vectors added, updated and removed during training are logged, and
+    the background thread applies the log to the new lists after k-means. The next call after the training has
+    finished applies the few changes logged since then and swaps the new lists in at once.
+    The index is not otherwise thread-safe: add, update, remove and search must be called from one thread
+    at a time, e.g. under the lock of the cluster.
+    """
+
+    def __init__(self, min_size=10000, nprobe=16, lists_per_sqrt=1.0, samples_per_list=32, iterations=10, seed=0,
+                 background=True):
+        """
+        Args:
+            min_size: Number of vectors, below which the search is exact
+            nprobe: Number of lists searched per query
+            lists_per_sqrt: Number of lists is lists_per_sqrt * sqrt(number of vectors)
+            samples_per_list: k-means is trained on a random sample of samples_per_list vectors per list
+            iterations: Number of k-means iterations in training
+            seed: Seed of the k-means initialization
+            background: Train the lists in a background thread, when the index grows
+        """
+        self.min_size = min_size
+        self.nprobe = nprobe
+        self.lists_per_sqrt = lists_per_sqrt
+        self.samples_per_list = samples_per_list
+        self.iterations = iterations
+        self.rng = np.random.default_rng(seed)
+        self.background = background
+
+        self.centroids = None  # k-means centroids of the lists, None until trained
+        self.lists = [ExactIndex()]
+        self._list_of = {}  # key -> list index
+        self.trained_size = 0
+
+        self._training = None  # Future of the background training
+        self._changes = None  # (key, normalized vector or None if removed) logged during the background training
+        self._trainer = None  # Thread of the background training, started on the first training
+
+    def __len__(self):
+        return len(self._list_of)
+
+    def __contains__(self, key):
+        return key in self._list_of
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def vector(self, key):
+        """Return the normalized vector of the key."""
+        return self.lists[self._list_of[key]].vector(key)
+
+    def _nearest_list(self, vector):
+        if self.centroids is None:
+            return 0
+        return int(np.argmax(self.centroids @ vector))
+
+    def _log(self, key, vector):
+        """Log a change during the background training."""
+        if self._changes is not None:
+            self._changes.append((key, vector))
+
+    def add(self, key, vector, normalized=False):
+        """Add vector of a new key."""
+        self._swap()
+        vector = vector if normalized else _normalize(vector)
+        self._log(key, vector)
+        list_index = self._nearest_list(vector)
+        self.lists[list_index].add(key, vector, normalized=True)
+        self._list_of[key] = list_index
+        if self._training is None and len(self) >= max(self.min_size, 2 * self.trained_size):
+            if self.background:
+                self._start_training()
+            else:
+                self.train()
+
+    def update(self, key, vector, normalized=False):
+        """Replace the vector of the key, and move it to the list of the nearest centroid."""
+        self._swap()
+        vector = vector if normalized else _normalize(vector)
+        self._log(key, vector)
+        list_index = self._nearest_list(vector)
+        if list_index == self._list_of[key]:
+            self.lists[list_index].update(key, vector, normalized=True)
+        else:
+            self.lists[self._list_of[key]].remove(key)
+            self.lists[list_index].add(key, vector, normalized=True)
+            self._list_of[key] = list_index
+
+    def remove(self, key):
+        """Remove the key and its vector."""
+        self._swap()
+        self._log(key, None)
+        self.lists[self._list_of.pop(key)].remove(key)
+
+    def search(self, vector, normalized=False):
+        """
+        Return (key, cosine similarity) of the most similar vector in the nprobe nearest lists,
+        or None if the index is empty.
+        """
+        self._swap()
+        query = vector if normalized else _normalize(vector)
+        if self.centroids is None:
+            return self.lists[0].search(query, normalized=True)
+        coarse = self.centroids @ query
+        probes = np.argpartition(-coarse, self.nprobe - 1)[:self.nprobe] if len(coarse) > self.nprobe \
+            else range(len(coarse))
+        best = None
+        for list_index in probes:
+            result = self.lists[list_index].search(query, normalized=True)
+            if result is not None and (best is None or result[1] > best[1]):
+                best = result
+        return best
+
+    def train(self):
+        """
+        Divide the vectors to lists with spherical k-means in the calling thread, after waiting for
+        a background training. Takes a fraction of a second with 100k 512-d vectors.
+        """
+        self.wait()
+        self._apply(*self._train(*self._vectors(), [])[:4])
+
+    def wait(self):
+        """Wait for the background training to finish and swap in its lists."""
+        if self._training is not None:
+            self._training.result()
+            self._swap()
+
+    def _vectors(self):
+        """Return the keys and a copy of their vectors."""
+        keys = [key for index in self.lists for key in index.keys]
+        vectors = np.concatenate([index.vectors() for index in self.lists if len(index)])
+        return keys, vectors
+
+    def _start_training(self):
+        if self._trainer is None:
+            self._trainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ivf_train")
+        self._changes = []
+        self._training = self._trainer.submit(self._train, *self._vectors(), self._changes)
+
+    def _swap(self):
+        """Swap in the lists of a finished background training, after applying the rest of the logged changes."""
+        if self._training is None or not self._training.done():
+            return
+        training, changes = self._training, self._changes
+        self._training = None
+        self._changes = None
+        centroids, lists, list_of, trained_size, applied = training.result()
+        self._apply_changes(centroids, lists, list_of, changes, applied)
+        self._apply(centroids, lists, list_of, trained_size)
+
+    def _apply(self, centroids, lists, list_of, trained_size):
+        self.centroids = centroids
+        self.lists = lists
+        self._list_of = list_of
+        self.trained_size = trained_size
+
+    @staticmethod
+    def _apply_changes(centroids, lists, list_of, changes, start):
+        """Apply the logged changes from index start to new lists. Returns the number of applied changes."""
+        # The log is appended to by the calling thread while the background thread reads it
+        while start < len(changes):
+            key, vector = changes[start]
+            if key in list_of:
+                lists[list_of.pop(key)].remove(key)
+            if vector is not None:
+                list_index = int(np.argmax(centroids @ vector))
+                lists[list_index].add(key, vector, normalized=True)
+                list_of[key] = list_index
+            start += 1
+        return start
+
+    def _train(self, keys, vectors, changes):
+        """
+        Run spherical k-means on the vectors, and apply the changes logged meanwhile to the new lists.
+        Only reads the index through its arguments, so it can run in the background thread.
+        Returns the centroids, lists, list of each key, number of trained vectors and number of applied changes.
+        """
+        list_count = max(1, int(self.lists_per_sqrt * np.sqrt(len(keys))))
+        sample_size = min(len(vectors), list_count * self.samples_per_list)
+        sample = vectors[self.rng.choice(len(vectors), sample_size, replace=False)]
+
+        centroids = sample[:list_count].copy()
+        for _ in range(self.iterations):
+            assignment = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1)
+            empty = norms == 0
+            # Empty lists are restarted from random vectors
+            sums[empty] = sample[self.rng.choice(len(sample), int(empty.sum()))]
+            norms[empty] = 1.0
+            centroids = sums / norms[:, None]
+
+        assignment = self._assign(vectors, centroids)
+        centroids = centroids.astype(np.float32)
+        lists = [ExactIndex() for _ in range(list_count)]
+        list_of = {}
+        for key, vector, list_index in zip(keys, vectors, assignment):
+            lists[list_index].add(key, vector, normalized=True)
+            list_of[key] = int(list_index)
+        applied = self._apply_changes(centroids, lists, list_of, changes, 0)
+        return centroids, lists, list_of, len(keys), applied
+
+    @staticmethod
+    def _assign(vectors, centroids, chunk=8192):
+        """Return the index of the nearest centroid of every vector. Computed in chunks to limit memory use."""
+        return np.concatenate([np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+                               for start in range(0, len(vectors), chunk)])
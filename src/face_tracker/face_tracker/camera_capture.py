@@ -0,0 +1,158 @@
+import collections
+import threading
+import time
+
+import cv2
+
+
+class WebcamError(Exception):
+    """signal that webcam has stopped working"""
+    pass
+
+
+class CameraCapture:
+    """
+    Reads frames from a webcam in a background thread into a small ring buffer.
+
+    Every frame is stored together with its capture time, so that frames can be published
+    at a different rate than the camera runs, and the capture to publish latency can be measured.
+    If reading a frame fails, the webcam is closed and opened again.
+    """
+
+    def __init__(self, logger, index=0, width=None, height=None, fps=None, mjpg=False,
+                 buffer_size=2, clock=time.time):
+        """
+        Args:
+            logger: Logger
+            index: Device index, 0 for /dev/video0.
+            width, height, fps: Requested capture parameters, None or 0 for device default.
+            mjpg: Use mjpg compression.
+            buffer_size: Number of newest frames kept in the ring buffer.
+            clock: Function returning the capture time stamp of a frame.
+        """
+        self.logger = logger
+        self.index = index
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.mjpg = mjpg
+        self.clock = clock
+
+        self.cap = None
+        self.camera_fps = None
+
+        self._buffer = collections.deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        self.captured_frames = 0
+
+    def start(self):
+        """
+        Open the webcam and start the capture thread.
+
+        Raises: WebcamError if the webcam can not be opened.
+        """
+        self.open_webcam()
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, name="camera_capture", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the capture thread and close the webcam.
+        """
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.close_webcam()
+
+    def latest(self):
+        """
+        Return tuple (frame, capture_time, sequence) of the newest captured frame, or None if there are no frames.
+        Sequence is the running number of the frame and can be used to detect, if the frame is new.
+        """
+        with self._condition:
+            if not self._buffer:
+                return None
+            return self._buffer[-1]
+
+    def wait_for_frame(self, after_sequence, timeout=None):
+        """
+        Wait for a frame newer than after_sequence. Returns the newest frame like latest, or None on timeout.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: not self._running or (self._buffer and self._buffer[-1][2] > after_sequence), timeout)
+            if self._buffer and self._buffer[-1][2] > after_sequence:
+                return self._buffer[-1]
+            return None
+
+    def _capture_loop(self):
+        while self._running:
+            try:
+                # Capture a frame from webcam
+                ret, frame = self.cap.read()
+                if not ret:
+                    raise WebcamError
+            except WebcamError:
+                self.logger.error("[*] something went wrong, restarting webcam..")
+                # close and try reopening webcam
+                self.close_webcam()
+                self._reopen_webcam()
+                continue
+
+            capture_time = self.clock()
+            with self._condition:
+                self.captured_frames += 1
+                self._buffer.append((frame, capture_time, self.captured_frames))
+                self._condition.notify_all()
+
+    def _reopen_webcam(self):
+        while self._running:
+            try:
+                self.open_webcam()
+                return
+            except WebcamError:
+                time.sleep(1.0)
+
+    def open_webcam(self):
+        '''
+        Open webcam handle
+        '''
+        self.cap = cv2.VideoCapture(self.index)
+
+        if not self.cap.isOpened():
+            self.logger.error("[*] Cannot open a webcam!")
+            raise WebcamError
+
+        # Set video capture parameters
+        if self.width:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.mjpg:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
+        if self.fps:
+            self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+
+        self.camera_fps = self.cap.get(cv2.CAP_PROP_FPS)
+        w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        self.logger.info(f"Webcam fps={self.camera_fps}, shape={w},{h}")
+
+    def close_webcam(self):
+        '''
+        Destroy webcam handle
+        '''
+        if self.cap is None:
+            return
+        self.logger.info("closing webcam handle...")
+        self.cap.release()
+        self.cap = None
+        self.logger.info("Webcam closed!")
@@ -0,0 +1,86 @@
+import time
+
+
+class DetectionScheduler:
+    """
+    Decides on which frames faces are detected again, and on which frames the correlation trackers are enough.
+
+    Faces are detected again when a correlation tracker loses confidence, or when max_interval frames
+    or max_age seconds have passed since the last detection, but never more often than every min_interval frames.
+
+    With region of interest detection, only every full_scan_interval detection scans the full frame
+    for new faces, and the other detections look for the faces only around the tracked faces.
+    """
+
+    def __init__(self, min_interval=1, max_interval=5, confidence_threshold=7.0, max_age=1.0, full_scan_interval=1):
+        """
+        Args:
+            min_interval: Minimum number of frames between detections.
+            max_interval: Maximum number of frames between detections.
+            confidence_threshold: Detect again when any tracker confidence (peak to sidelobe ratio)
+                drops below this value.
+            max_age: Maximum time between detections in seconds.
+            full_scan_interval: Number of detections between full frame detections, 1 scans the full frame always.
+        """
+        self.min_interval = max(1, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.confidence_threshold = confidence_threshold
+        self.max_age = max_age
+        self.full_scan_interval = max(1, full_scan_interval)
+
+        self.frames_since_detection = None
+        self.last_detection_time = None
+
+        # Number of frames between the two latest detections and the reason for the latest detection
+        self.interval = None
+        self.reason = None
+
+        self.detections_since_full_scan = 0
+        self.full_scan = None  # True if the latest detection scanned the full frame
+
+    def should_detect(self, confidences, now=None):
+        """
+        Return True if faces should be detected on the current frame. Call once per frame.
+
+        Args:
+            confidences: Latest correlation tracker confidences of the tracked faces.
+                None values (tracker not updated yet) are ignored.
+            now: Current time in seconds, defaults to time.monotonic().
+        """
+        if now is None:
+            now = time.monotonic()
+
+        if self.frames_since_detection is None:
+            return self._detect(now, "start")
+
+        self.frames_since_detection += 1
+        if self.frames_since_detection < self.min_interval:
+            return False
+        if self.frames_since_detection >= self.max_interval:
+            return self._detect(now, "max_interval")
+        if now - self.last_detection_time >= self.max_age:
+            return self._detect(now, "max_age")
+        if any(c is not None and c < self.confidence_threshold for c in confidences):
+            return self._detect(now, "confidence")
+        return False
+
+    def should_scan_full_frame(self, track_count):
+        """
+        Return True if the detection should scan the full frame, and False if detecting faces around
+        the tracked faces is enough. Call once per detection.
+
+        Args:
+            track_count: Number of tracked faces. Without tracked faces the full frame is always scanned.
+        """
+        self.detections_since_full_scan += 1
+        self.full_scan = track_count == 0 or self.detections_since_full_scan >= self.full_scan_interval
+        if self.full_scan:
+            self.detections_since_full_scan = 0
+        return self.full_scan
+
+    def _detect(self, now, reason):
+        self.interval = self.frames_since_detection
+        self.reason = reason
+        self.frames_since_detection = 0
+        self.last_detection_time = now
+        return True
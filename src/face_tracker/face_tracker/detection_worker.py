@@ -0,0 +1,86 @@
+import threading
+import traceback
+
+
+class DetectionWorker:
+    """
+    Runs face detection and recognition in a background thread, so that the frame callback
+    only has to advance the correlation trackers.
+
+    Only the latest submitted frame is analyzed. If a new frame is submitted while the previous
+    one is still waiting, the older one is dropped.
+    """
+
+    def __init__(self, analyze, logger):
+        """
+        Args:
+            analyze: Function that takes a frame and the arguments given to submit
+                and returns list of detected Face objects.
+            logger: Logger for errors of the worker thread.
+        """
+        self.logger = logger
+        self._analyze = analyze
+
+        self._condition = threading.Condition()
+        self._pending_frame = None
+        self._pending_args = ()
+        self._result = None
+        self._running = True
+
+        self.busy = False
+        self.dropped_frames = 0
+
+        self._thread = threading.Thread(target=self._run, name="detection_worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, *args):
+        """
+        Give a new frame to the worker. The frame must not be modified after submitting it.
+        """
+        with self._condition:
+            if self._pending_frame is not None:
+                self.dropped_frames += 1
+            self._pending_frame = frame
+            self._pending_args = args
+            self._condition.notify()
+
+    def poll_result(self):
+        """
+        Return list of faces detected from the latest analyzed frame, or None if there is no new result.
+        """
+        with self._condition:
+            result = self._result
+            self._result = None
+            return result
+
+    def stop(self):
+        """
+        Stop the worker thread. Analysis in progress is finished before returning.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and self._pending_frame is None:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                frame = self._pending_frame
+                args = self._pending_args
+                self._pending_frame = None
+                self.busy = True
+
+            try:
+                faces = self._analyze(frame, *args)
+            except Exception:
+                self.logger.error(f"Face detection failed:\n{traceback.format_exc()}")
+                faces = None
+
+            with self._condition:
+                self.busy = False
+                if faces is not None:
+                    self._result = faces
@@ -0,0 +1,187 @@
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Face recognizer of a worker process, loaded once by the pool initializer
+_recognizer = None
+
+
+def _init_worker(backend, model_name, detector_backend):
+    """
+    Load the face recognition model of a worker process. Every worker uses one thread for inference,
+    the pool itself provides the parallelism.
+    """
+    global _recognizer
+    os.environ["OMP_NUM_THREADS"] = "1"
+    os.environ["TF_NUM_INTRAOP_THREADS"] = "1"
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    import cv2
+    cv2.setNumThreads(1)
+
+    if isinstance(backend, str):
+        try:
+            from .face_analyzer import face_recognizer_class
+        except ImportError:  # Imported as a top-level module by the tests
+            from face_analyzer import face_recognizer_class
+        backend = face_recognizer_class(backend)
+    _recognizer = backend(db_path=None,
+                          logger=logging.getLogger("embedding_worker"),
+                          model_name=model_name,
+                          detector_backend=detector_backend)
+
+
+def _attach_shared_memory(name):
+    """
+    Attach to shared memory created by the parent process. The parent unlinks it.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        # Spawned workers share the resource tracker of the parent, which forgets the block on unlink
+        return shared_memory.SharedMemory(name=name)
+
+
+def _represent(shm_name, layout):
+    """
+    Worker function. Embed the face images stored in shared memory.
+
+    Args:
+        shm_name: Name of the shared memory block
+        layout: List of (offset, shape) of the float32 face images in the block
+    """
+    shm = _attach_shared_memory(shm_name)
+    try:
+        imgs = [np.ndarray(shape, dtype=np.float32, buffer=shm.buf, offset=offset) for offset, shape in layout]
+        representations = _recognizer.represent_batch(imgs)
+        del imgs
+        return representations
+    finally:
+        shm.close()
+
+
+class EmbeddingPool:
+    """
+    Calculates face embeddings in worker processes, so that inference is not limited to one CPU core
+    by the GIL of the node process.
+
+    Every worker loads the face recognition model once. Face images are passed to the workers through
+    shared memory, and the faces of a frame are split between the workers. submit returns a Future,
+    so the caller can continue while the embeddings are calculated.
+    If a worker process crashes, the pending embeddings fail, and the pool is started again on the next submit.
+    """
+
+    def __init__(self, workers, logger, backend="deepface", model_name="SFace", detector_backend="yunet"):
+        """
+        Args:
+            workers: Number of worker processes
+            logger: Logger
+            backend, model_name, detector_backend: Face recognizer of the workers, see face_recognizer_class.
+                backend can also be a face recognizer class, which the workers can import.
+        """
+        self.workers = workers
+        self.logger = logger
+        self._initargs = (backend, model_name, detector_backend)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._broken = False
+        self.restarts = 0
+        self._start()
+
+    def _start(self):
+        # TensorFlow is not fork safe, so the workers are started with spawn
+        self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker,
+                                             initargs=self._initargs)
+        self._broken = False
+
+    def _restart(self):
+        self.restarts += 1
+        self.logger.error(f"Embedding worker crashed, restarting the embedding pool (restarts={self.restarts})")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._start()
+
+    def submit(self, imgs):
+        """
+        Start calculating embeddings of face images (RGB, float values in [0, 1]).
+
+        Returns: Future, whose result is the list of representations in the same order as imgs.
+            If a worker crashes, the future raises BrokenProcessPool.
+        """
+        result = Future()
+        if len(imgs) == 0:
+            result.set_result([])
+            return result
+
+        chunk_size = math.ceil(len(imgs) / self.workers)
+        chunks = [imgs[i:i + chunk_size] for i in range(0, len(imgs), chunk_size)]
+        chunk_results = [None] * len(chunks)
+        remaining = [len(chunks)]
+        remaining_lock = threading.Lock()
+
+        def chunk_done(index, shm, future):
+            shm.close()
+            shm.unlink()
+            try:
+                chunk_results[index] = future.result()
+            except BrokenProcessPool as e:
+                self._broken = True
+                if not result.done():
+                    result.set_exception(e)
+            except Exception as e:
+                if not result.done():
+                    result.set_exception(e)
+            with remaining_lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished and not result.done():
+                result.set_result([representation for chunk in chunk_results for representation in chunk])
+
+        with self._lock:
+            if self._broken:
+                self._restart()
+            for index, chunk in enumerate(chunks):
+                shm, layout = self._to_shared_memory(chunk)
+                try:
+                    future = self._executor.submit(_represent, shm.name, layout)
+                except BrokenProcessPool:
+                    self._restart()
+                    future = self._executor.submit(_represent, shm.name, layout)
+                future.add_done_callback(lambda f, index=index, shm=shm: chunk_done(index, shm, f))
+        return result
+
+    def represent_batch(self, imgs):
+        """
+        Calculate embeddings of face images and wait for the result, like FaceRecognizer.represent_batch.
+        """
+        return self.submit(imgs).result()
+
+    @staticmethod
+    def _to_shared_memory(imgs):
+        """
+        Copy images to a new shared memory block as float32. Returns (shared memory, layout).
+        """
+        imgs = [np.asarray(img, dtype=np.float32) for img in imgs]
+        layout = []
+        offset = 0
+        for img in imgs:
+            layout.append((offset, img.shape))
+            offset += img.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for img, (offset, shape) in zip(imgs, layout):
+            np.ndarray(shape, dtype=np.float32, buffer=shm.buf, offset=offset)[...] = img
+        return shm, layout
+
+    def shutdown(self):
+        """
+        Stop the worker processes.
+        """
+        with self._lock:
+            self._executor.shutdown(wait=True, cancel_futures=True)
@@ -1,6 +1,9 @@
 import dlib
 from typing import List
 
+IDENTITY_VALIDATIONS = 3  # Number of consecutive matching cluster predictions, after which identity is valid
+REVERIFICATION_INTERVAL = 10  # Number of detections between re-verifications of a valid identity
+
 class Face():
     def __init__(self, left, right, top, bottom, image, representation, cluster_dict):
         self.left = left
@@ -13,14 +16,75 @@ class Face():
 
         self.rect = dlib.rectangle(left, top, right, bottom)
         self.correlation_tracker = None # dlib correlation tracker
+        self.tracking_confidence = None # peak to sidelobe ratio of the latest tracker update
 
         self.speaking = None
 
         self.concurrent_validations = 0
+        self.detections_since_verification = 0
 
         self.identity_is_valid = False
         self.cluster_dict = cluster_dict
 
+        self.embedding_pending = False # embedding of the track is being calculated in the background
+        self.successor = None # face that continues the track of this face after a new detection
+
+    def facial_area(self):
+        """
+        Return face location as a facial area dictionary with keys 'x', 'y', 'w', 'h'.
+        """
+        return {"x": self.left, "y": self.top, "w": self.right - self.left, "h": self.bottom - self.top}
+
+    def inherit_identity(self, track: "Face"):
+        """
+        Take the identity of a tracked face, that has been detected again as this face.
+        """
+        self.representation = track.representation
+        self.cluster_dict = track.cluster_dict
+        self.identity_is_valid = track.identity_is_valid
+        self.concurrent_validations = track.concurrent_validations
+        self.detections_since_verification = track.detections_since_verification + 1
+        self.embedding_pending = track.embedding_pending
+        track.successor = self
+
+    def latest(self):
+        """
+        Return the latest face of the track of this face, by following the successors.
+        """
+        face = self
+        while face.successor is not None:
+            face = face.successor
+        return face
+
+    def needs_verification(self):
+        """
+        Return True if the face should be embedded and matched to the database on this detection.
+        Identity of a new face is verified on every detection until it is valid,
+        after that only every REVERIFICATION_INTERVAL detections.
+        """
+        if not self.identity_is_valid:
+            return True
+        return self.detections_since_verification >= REVERIFICATION_INTERVAL
+
+    def verify_identity(self, representation: List[float], cluster_dict):
+        """
+        Update identity with a new representation and cluster prediction.
+        """
+        self.representation = representation
+        self.detections_since_verification = 0
+
+        if (cluster_dict is not None and self.cluster_dict is not None
+                and cluster_dict["id"] == self.cluster_dict["id"]):
+            self.concurrent_validations += 1
+        else:
+            # Prediction changed, identity has to be validated again
+            self.concurrent_validations = 0 if cluster_dict is None else 1
+            self.identity_is_valid = False
+
+        self.cluster_dict = cluster_dict
+        if self.concurrent_validations >= IDENTITY_VALIDATIONS:
+            self.identity_is_valid = True
+
     def start_track(self, frame):
         """
         Init and start dlib correlation tracker.
@@ -33,7 +97,7 @@ class Face():
         """
         Update face location with dlib correlation tracker.
         """
-        self.correlation_tracker.update(frame)
+        self.tracking_confidence = self.correlation_tracker.update(frame)
         pos = self.correlation_tracker.get_position()
         
         #unpack the face position
@@ -41,6 +105,7 @@ class Face():
         self.right = int(pos.right())
         self.top = int(pos.top())
         self.bottom = int(pos.bottom())
+        self.rect = dlib.rectangle(self.left, self.top, self.right, self.bottom)
 
     def as_dict(self):
         """
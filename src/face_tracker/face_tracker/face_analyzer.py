@@ -1,44 +1,104 @@
-import dlib
+import collections
 import cv2
 import os
 import numpy as np
-import time
-import sys
-import traceback
-from typing import List
-from pathlib import Path
+import threading
+from typing import List, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
 
-from .lip_movement_net import LipMovementDetector
-from .face_recognition import FaceRecognizer
-from .face import Face
-from .links_cluster import LinksCluster, Subcluster
+try:
+    from .face import Face
+    from .face_boxes import match_facial_areas, expand_facial_area, merge_regions, offset_facial_area
+    from .detection_worker import DetectionWorker
+    from .detection_scheduler import DetectionScheduler
+    from .instrumentation import StageTimer
+    from .links_cluster import LinksCluster
+except ImportError:  # Imported as a top-level module by the tests
+    from face import Face
+    from face_boxes import match_facial_areas, expand_facial_area, merge_regions, offset_facial_area
+    from detection_worker import DetectionWorker
+    from detection_scheduler import DetectionScheduler
+    from instrumentation import StageTimer
+    from links_cluster import LinksCluster
+
+# TensorFlow and DeepFace are imported only when lip movement detection or face recognition is enabled
+if TYPE_CHECKING:
+    from .lip_movement_net import LipMovementDetector
+    from .face_recognition import FaceRecognizer
+    from .identity_store import IdentityStore
 
 DEFAULT_FACE_DB_PATH = os.path.expanduser('~')+"/database"
+FACE_RECOGNITION_BACKENDS = ["deepface", "opencv"]
+
+
+def face_recognizer_class(backend="deepface"):
+    """
+    Import and return the face recognizer class of the backend.
+
+    "deepface": FaceRecognizer, any DeepFace detector and recognition model
+    "opencv": OpenCVFaceRecognizer, OpenCV YuNet detector and SFace model without DeepFace
+    """
+    if backend == "deepface":
+        from .face_recognition import FaceRecognizer
+        return FaceRecognizer
+    if backend == "opencv":
+        from .opencv_face_recognition import OpenCVFaceRecognizer
+        return OpenCVFaceRecognizer
+    raise ValueError(f"Unknown face recognition backend {backend}, use one of {FACE_RECOGNITION_BACKENDS}")
 
 class FaceAnalyzer:
 
     def __init__(self,
                 logger,
-                lip_movement_detector: LipMovementDetector=None,
+                lip_movement_detector: "LipMovementDetector"=None,
                 face_recognizer=True,
                 correlation_tracker=True,
                 cluster_similarity_threshold=0.3,
                 subcluster_similarity_threshold=0.2,
                 pair_similarity_maximum=1.0,
                 face_recognition_model="SFace",
-                face_detection_model="yunet"):
+                face_detection_model="yunet",
+                async_detection=False,
+                detection_scales=(1.0,),
+                detection_interval_min=1,
+                detection_interval_max=5,
+                tracking_confidence_threshold=7.0,
+                detection_max_age=1.0,
+                tracking_workers=0,
+                stage_timer: StageTimer=None,
+                face_recognition_backend="deepface",
+                roi_detection=False,
+                roi_margin=1.0,
+                full_scan_interval=5,
+                embedding_workers=0,
+                cluster: LinksCluster=None,
+                cluster_lock: threading.Lock=None,
+                embedding_pool=None,
+                cluster_index="exact",
+                identity_store: "IdentityStore"=None,
+                vector_retention="reservoir",
+                retained_vectors=32):
         self.logger = logger
+        # Timing of the processing stages, disabled by default
+        self.stage_timer = stage_timer if stage_timer is not None else StageTimer(enabled=False)
         self.correlation_tracker_enabled = correlation_tracker
-        self.lip_movement_detector: LipMovementDetector = lip_movement_detector
-
-        # Face recognition
-        if face_recognizer:
-            self.face_recognizer = FaceRecognizer(db_path=DEFAULT_FACE_DB_PATH,
-                                                  logger=self.logger,
-                                                  model_name=face_recognition_model,
-                                                  detector_backend=face_detection_model)
-        else:
-            self.face_recognizer = None
+        self.detection_scales = list(detection_scales)
+        # Lip movement is detected on every lip_stride-th frame
+        self.lip_stride = 1
+        self.frame_count = 0
+        # Time spent in the processing stages of the latest frame, see StageTimer.end_frame
+        self.frame_stage_durations = {}
+        self.lip_movement_detector: "LipMovementDetector" = lip_movement_detector
+
+        # Face recognition. face_recognizer can also be an already built FaceRecognizer
+        if face_recognizer is True:
+            face_recognizer = face_recognizer_class(face_recognition_backend)(
+                db_path=DEFAULT_FACE_DB_PATH,
+                logger=self.logger,
+                model_name=face_recognition_model,
+                detector_backend=face_detection_model,
+                detection_scales=detection_scales)
+        self.face_recognizer: "FaceRecognizer" = face_recognizer or None
 
         self.face_ids = []
         self.face_representations = []
@@ -46,50 +106,113 @@ class FaceAnalyzer:
         self.cluster_similarity_threshold = cluster_similarity_threshold
         self.subcluster_similarity_threshold = subcluster_similarity_threshold
         self.pair_similarity_maximum = pair_similarity_maximum
-        self.cluster = LinksCluster(self.cluster_similarity_threshold,
-                                    self.subcluster_similarity_threshold,
-                                    self.pair_similarity_maximum,
-                                    store_vectors=True,
-                                    logger=self.logger)
+        # The face database can be shared by the analyzers of multiple cameras. It is used under cluster_lock.
+        if cluster is None:
+            cluster = LinksCluster(self.cluster_similarity_threshold,
+                                   self.subcluster_similarity_threshold,
+                                   self.pair_similarity_maximum,
+                                   logger=self.logger,
+                                   index=cluster_index,
+                                   vector_retention=vector_retention,
+                                   retained_vectors=retained_vectors)
+        self.cluster = cluster
+        self.cluster_lock = cluster_lock if cluster_lock is not None else threading.Lock()
+        # Saves the changes of the face database, if it is persistent
+        self.identity_store = identity_store
 
-        self.frame = 0
         self.faces: List[Face] = []
 
+        # Decides when faces are detected again instead of using correlation trackers.
+        # Large intervals lead to drifting of the tracked faces
+        self.detection_scheduler = DetectionScheduler(detection_interval_min,
+                                                      detection_interval_max,
+                                                      tracking_confidence_threshold,
+                                                      detection_max_age,
+                                                      full_scan_interval if roi_detection else 1)
+
+        # Between full frame detections, faces are detected only in the regions around the tracked faces.
+        # The regions are roi_margin times the face size larger on every side.
+        self.roi_margin = roi_margin
+
         self.font = cv2.FONT_HERSHEY_SIMPLEX
-        
-        # self.timer = self.create_timer(2, self.profile_cycle)
-        # pr.enable()
-            
-    def on_frame_received(self, frame: cv2.typing.MatLike):
-        cv2_gray_img = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-        # Get the face locations
-        if self.frame == 0:
-            faces_len_old = len(self.faces)
-            # Use face detection to get face locations
-            self.faces = self.analyze_frame(frame)
+        # Thread pool for per face correlation tracker and lip landmark updates
+        if tracking_workers > 1:
+            self.executor = ThreadPoolExecutor(max_workers=tracking_workers, thread_name_prefix="tracking")
+        else:
+            self.executor = None
 
-            # Initialize new input sequences for lip movement detector if the number of detected faces change
-            if self.lip_movement_detector is not None:
-                if faces_len_old != len(self.faces):
-                    #TODO: original implementation had speaking state clearing here
-                    self.lip_movement_detector.initialize_input_sequence(len(self.faces))
+        # Face embeddings in worker processes. Embeddings of the detected faces are matched to the
+        # database on the following frames, when they are ready. A given embedding_pool is shared
+        # with other analyzers and not shut down by this analyzer.
+        self.owns_embedding_pool = embedding_pool is None
+        if embedding_pool is not None:
+            self.embedding_pool = embedding_pool
+        elif embedding_workers > 0 and self.face_recognizer is not None:
+            from .embedding_pool import EmbeddingPool
+            self.embedding_pool = EmbeddingPool(embedding_workers,
+                                                self.logger,
+                                                face_recognition_backend,
+                                                face_recognition_model,
+                                                face_detection_model)
+        else:
+            self.embedding_pool = None
+        self.pending_embeddings = collections.deque()  # (faces, future of their representations)
+        # Faces are re-detected while their embeddings are calculated. The embeddings are applied to the
+        # latest faces of the tracks, so track continuation and verification are done under track_lock.
+        self.track_lock = threading.Lock()
 
-            # self.logger.info(f"Face detection: faces={len(self.faces)}")
-            
+        # Face detection and recognition in a background thread
+        if async_detection:
+            self.detection_worker = DetectionWorker(self.analyze_frame, self.logger)
+        else:
+            self.detection_worker = None
+
+    def on_frame_received(self, frame: cv2.typing.MatLike, draw=True):
+        """
+        Update faces with a new frame. If draw is True, face information is drawn to the frame.
+
+        Returns: List of face dictionaries, see Face.as_dict
+        """
+        if self.embedding_pool is not None:
+            self.collect_embeddings()
+
+        # Without correlation tracking faces are detected on every frame
+        detect = (not self.correlation_tracker_enabled
+                  or self.detection_scheduler.should_detect([face.tracking_confidence for face in self.faces]))
+        full_scan = detect and self.detection_scheduler.should_scan_full_frame(len(self.faces))
+
+        # Get the face locations
+        if self.detection_worker is not None:
+            self.update_faces_async(frame, detect, copy_frame=draw, full_scan=full_scan)
+
+        elif detect:
+            # Use face detection to get face locations
+            self.set_faces(self.analyze_frame(frame, full_scan=full_scan))
         else:
             # Use dlib correlation tracker to update face locations
-            for face in self.faces:
-                face.update_location(frame)
+            self.update_locations(frame)
 
-            # self.logger.info(f"correlation tracking: faces={len(self.faces)}")
-        
-        # loop through all faces
-        for i, face in enumerate(self.faces):
-            if self.lip_movement_detector is not None:
-                # Determine if the face is speaking or silent
-                face.speaking = self.lip_movement_detector.test_video_frame(cv2_gray_img, face.rect, i)
+        self.frame_count += 1
+        if self.lip_movement_detector is not None and self.frame_count % self.lip_stride == 0:
+            # Determine if the faces are speaking or silent
+            with self.stage_timer.stage("grayscale"):
+                cv2_gray_img = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            self.detect_lip_movement(cv2_gray_img)
+
+        if draw:
+            with self.stage_timer.stage("drawing"):
+                self.draw_frame_info(frame)
 
+        self.frame_stage_durations = self.stage_timer.end_frame()
+        return [face.as_dict() for face in self.faces]
+
+    def draw_frame_info(self, frame):
+        """
+        Draws information of all faces and the analyzer state to the frame
+        """
+        # loop through all faces
+        for face in self.faces:
             # Draw information to frame
             self.draw_face_info(frame, face)
 
@@ -112,24 +235,143 @@ class FaceAnalyzer:
                     cv2.LINE_AA)
 
         if self.correlation_tracker_enabled:
-            self.frame += 1
-            # Set frame to zero for new detection every nth frame.
-            # Large values lead to drifting of the detected faces
-            n = 5
-            self.frame = self.frame % n
-        
-        return [face.as_dict() for face in self.faces]
+            cv2.putText(frame,
+                        f"Detection interval {self.detection_scheduler.interval} ({self.detection_scheduler.reason})",
+                        (100,50),
+                        self.font,
+                        0.5,
+                        (255, 255, 255),
+                        1,
+                        cv2.LINE_AA)
+
+    def update_faces_async(self, frame, detect, copy_frame=True, full_scan=True):
+        """
+        Update face locations, when face detection and recognition is done by the detection worker.
+        Correlation trackers are updated on every frame and the newest detection result replaces
+        the tracked faces, when it is ready.
+
+        copy_frame: Give a copy of the frame to the worker. Required if the frame is modified afterwards.
+        full_scan: Detect faces in the full frame, instead of only around the tracked faces.
+        """
+        detected_faces = self.detection_worker.poll_result()
+        if detected_faces is not None:
+            self.set_faces(detected_faces)
+
+        # Detected faces are from an older frame, so their trackers are updated also
+        self.update_locations(frame)
+
+        if detect:
+            # Locations of the tracks are copied, because the tracks keep moving while the worker is running.
+            tracks = [(face, face.facial_area()) for face in self.faces]
+            self.detection_worker.submit(frame.copy() if copy_frame else frame, tracks, full_scan)
+
+    def update_locations(self, frame):
+        """
+        Update locations of the tracked faces with dlib correlation trackers.
+        """
+        with self.stage_timer.stage("tracking"):
+            self._map(lambda face: face.update_location(frame),
+                      [face for face in self.faces if face.correlation_tracker is not None])
+
+    def detect_lip_movement(self, gray_frame):
+        """
+        Determine if the tracked faces are speaking or silent. Facial landmarks of the faces are
+        predicted in parallel, when tracking workers are enabled. The lip movement classification
+        updates the input sequences of the faces, so it is done serially.
+        """
+        with self.stage_timer.stage("lip_landmarks"):
+            landmarks = self._map(
+                lambda face: self.lip_movement_detector.get_facial_landmark_vectors_from_bounding_box(gray_frame,
+                                                                                                      face.rect),
+                self.faces)
+        with self.stage_timer.stage("lip_rnn"):
+            for i, (face, facial_points_vector) in enumerate(zip(self.faces, landmarks)):
+                face.speaking = self.lip_movement_detector.classify_landmarks(facial_points_vector, i)
+
+    def _map(self, function, items):
+        """
+        Apply function to all items, in the tracking thread pool if it is enabled.
+        """
+        if self.executor is None or len(items) < 2:
+            return [function(item) for item in items]
+        return list(self.executor.map(function, items))
+
+    def set_faces(self, faces: List[Face]):
+        """
+        Replace tracked faces with newly detected faces.
+        """
+        faces_len_old = len(self.faces)
+        self.faces = faces
+
+        # Initialize new input sequences for lip movement detector if the number of detected faces change
+        if self.lip_movement_detector is not None:
+            if faces_len_old != len(self.faces):
+                self.lip_movement_detector.initialize_input_sequence(len(self.faces))
+
+    def set_quality(self, detection_scale_factor=None, detection_interval_max=None, lip_stride=None):
+        """
+        Change quality settings at runtime, e.g. by QualityController. None keeps the current value.
+
+        Args:
+            detection_scale_factor: Multiplier of the configured detection scales
+            detection_interval_max: Maximum number of frames between detections
+            lip_stride: Detect lip movement on every lip_stride-th frame
+        """
+        if detection_scale_factor is not None and self.face_recognizer is not None:
+            self.face_recognizer.detection_scales = [scale * detection_scale_factor
+                                                     for scale in self.detection_scales]
+        if detection_interval_max is not None:
+            scheduler = self.detection_scheduler
+            scheduler.max_interval = max(scheduler.min_interval, detection_interval_max)
+        if lip_stride is not None:
+            self.lip_stride = max(1, lip_stride)
+
+    def shutdown(self):
+        """
+        Stop background workers.
+        """
+        if self.detection_worker is not None:
+            self.detection_worker.stop()
+        if self.embedding_pool is not None and self.owns_embedding_pool:
+            self.embedding_pool.shutdown()
+        if self.executor is not None:
+            self.executor.shutdown()
     
-    def analyze_frame(self, frame):
+    def analyze_frame(self, frame, tracks=None, full_scan=True):
         """
         Get face objects from frame. Do face detection and recognition. Intialize dlib correlation trackers.
+
+        Detected faces are associated with the tracked faces. A face that continues a track keeps its identity,
+        so only new faces and faces whose identity is not yet valid are embedded and matched to the database.
+
+        Args:
+            frame: BGR image
+            tracks: List of (Face, facial area) pairs, where facial area is the location of the face in this frame.
+                Defaults to the currently tracked faces.
+            full_scan: Detect faces in the full frame. If False, faces are detected only in the regions
+                around the tracks, and faces that have left the regions are lost until the next full scan.
+
+        Returns no faces, if face recognition is disabled.
         """
+        if self.face_recognizer is None:
+            # Faces are detected by the face recognizer, so without it there are no faces
+            return []
+        if tracks is None:
+            tracks = [(face, face.facial_area()) for face in self.faces]
+
         faces: List[Face] = []
 
         # Uses deepface to extract face locations from frame
-        face_objs = self.face_recognizer.extract_faces(frame)
-        
-        for face_obj in face_objs:
+        with self.stage_timer.stage("detection"):
+            if full_scan or not tracks:
+                face_objs = self.face_recognizer.extract_faces(frame)
+            else:
+                face_objs = self.extract_faces_roi(frame, [facial_area for _, facial_area in tracks])
+
+        matches = match_facial_areas([face_obj["facial_area"] for face_obj in face_objs],
+                                     [facial_area for _, facial_area in tracks])
+
+        for i, face_obj in enumerate(face_objs):
             
             face_img = face_obj["face"]
             face_region = face_obj["facial_area"]
@@ -138,20 +380,93 @@ class FaceAnalyzer:
             w = face_region["w"]
             h = face_region["h"]
 
-            representation: List[float] = self.face_recognizer.represent(face_img)
+            face = Face(x, x + w, y, y + h, face_img, None, None)
+            if i in matches:
+                with self.track_lock:
+                    face.inherit_identity(tracks[matches[i]][0])
 
-            # Compare face to the database
+            if self.correlation_tracker_enabled:
+                with self.stage_timer.stage("tracking"):
+                    face.start_track(frame)
+            faces.append(face)
 
-            cluster_predictation = self.cluster.predict(np.array(representation))
+        # Calculate representations of unverified faces with one model call
+        if self.embedding_pool is not None:
+            # Tracks, whose embedding is already being calculated, are not submitted again
+            with self.track_lock:
+                unverified_faces = [face for face in faces if face.needs_verification() and not face.embedding_pending]
+                for face in unverified_faces:
+                    face.embedding_pending = True
+            if unverified_faces:
+                with self.stage_timer.stage("embedding"):
+                    future = self.embedding_pool.submit([face.image for face in unverified_faces])
+                self.pending_embeddings.append((unverified_faces, future))
+            return faces
 
-            # Matching face not found, create new one
-            face = Face(x, x + w, y, y + h, face_img, representation, cluster_predictation)
+        unverified_faces = [face for face in faces if face.needs_verification()]
 
-            if self.correlation_tracker_enabled:
-                face.start_track(frame)
-            faces.append(face)
+        with self.stage_timer.stage("embedding"):
+            representations: List[List[float]] = self.face_recognizer.represent_batch(
+                [face.image for face in unverified_faces])
+
+        self.verify_faces(unverified_faces, representations)
         return faces
 
+    def verify_faces(self, faces: List[Face], representations: List[List[float]]):
+        """
+        Match the representations of the faces to the database and update the identities of the faces.
+        """
+        with self.stage_timer.stage("clustering"), self.cluster_lock:
+            for face, representation in zip(faces, representations):
+                # Compare face to the database
+                cluster_predictation = self.cluster.predict(np.array(representation))
+                face.verify_identity(representation, cluster_predictation)
+            if self.identity_store is not None:
+                self.identity_store.record()
+
+    def collect_embeddings(self):
+        """
+        Verify the faces, whose embeddings calculated by the embedding pool are ready. The faces may have been
+        detected again since the embeddings were submitted, so the latest faces of their tracks are verified.
+        Faces of failed embeddings stay unverified, and are embedded again on the next detection.
+        """
+        for _ in range(len(self.pending_embeddings)):
+            faces, future = self.pending_embeddings.popleft()
+            if not future.done():
+                self.pending_embeddings.append((faces, future))
+                continue
+            with self.track_lock:
+                faces = [face.latest() for face in faces]
+                for face in faces:
+                    face.embedding_pending = False
+                try:
+                    representations = future.result()
+                except Exception as e:
+                    self.logger.warning(f"Face embedding failed: {e!r}")
+                    continue
+                self.verify_faces(faces, representations)
+
+    def extract_faces_roi(self, frame, facial_areas):
+        """
+        Detect faces only in the regions of interest around the facial areas. Overlapping regions are merged,
+        so that a face is not detected twice. Returns detections like FaceRecognizer.extract_faces,
+        with facial areas in full frame coordinates.
+
+        The regions are small, so they are not downscaled by the detection scales, and faces are filtered
+        by their size relative to the full frame.
+        """
+        height, width = frame.shape[:2]
+        regions = merge_regions([expand_facial_area(facial_area, self.roi_margin, width, height)
+                                 for facial_area in facial_areas])
+        face_objs = []
+        for region in regions:
+            x, y = region["x"], region["y"]
+            for face_obj in self.face_recognizer.extract_faces(frame[y:y + region["h"], x:x + region["w"]],
+                                                               detection_scales=[1.0], frame_height=height):
+                face_obj["facial_area"] = offset_facial_area(face_obj["facial_area"], x, y)
+                face_objs.append(face_obj)
+        return face_objs
+
     def draw_face_info(self, frame, face:Face):
         """
         Draws rectangle around face and other information to display 
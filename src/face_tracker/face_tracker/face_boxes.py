@@ -0,0 +1,144 @@
+"""
+Helper functions for face bounding boxes.
+
+Facial areas are dictionaries in the format returned by DeepFace.extract_faces:
+keys 'x', 'y', 'w', 'h' with int values and optionally 'left_eye', 'right_eye'
+with a tuple of 2 ints as values.
+"""
+from typing import Dict, List
+
+
+def scale_facial_area(facial_area: Dict, factor: float) -> Dict:
+    """
+    Return copy of the facial area with all coordinates multiplied by factor.
+    """
+    scaled = dict(facial_area)
+    for key in ("x", "y", "w", "h"):
+        scaled[key] = int(round(facial_area[key] * factor))
+    for key in ("left_eye", "right_eye"):
+        if facial_area.get(key) is not None:
+            scaled[key] = tuple(int(round(c * factor)) for c in facial_area[key])
+    return scaled
+
+
+def offset_facial_area(facial_area: Dict, dx: int, dy: int) -> Dict:
+    """
+    Return copy of the facial area moved by dx, dy, e.g. from a region of interest to the full frame.
+    """
+    moved = dict(facial_area)
+    moved["x"] = facial_area["x"] + dx
+    moved["y"] = facial_area["y"] + dy
+    for key in ("left_eye", "right_eye"):
+        if facial_area.get(key) is not None:
+            moved[key] = (facial_area[key][0] + dx, facial_area[key][1] + dy)
+    return moved
+
+
+def expand_facial_area(facial_area: Dict, margin: float, width: int, height: int) -> Dict:
+    """
+    Return region of interest around the facial area. The area is grown by margin times its width and height
+    on every side and clipped to the width x height frame.
+    """
+    left = max(0, int(facial_area["x"] - margin * facial_area["w"]))
+    top = max(0, int(facial_area["y"] - margin * facial_area["h"]))
+    right = min(width, int(facial_area["x"] + (1 + margin) * facial_area["w"]))
+    bottom = min(height, int(facial_area["y"] + (1 + margin) * facial_area["h"]))
+    return {"x": left, "y": top, "w": max(0, right - left), "h": max(0, bottom - top)}
+
+
+def merge_regions(regions: List[Dict]) -> List[Dict]:
+    """
+    Replace overlapping regions with their bounding box, until no regions overlap.
+    """
+    merged = [dict(region) for region in regions if region["w"] > 0 and region["h"] > 0]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                a, b = merged[i], merged[j]
+                if iou(a, b) > 0:
+                    left, top = min(a["x"], b["x"]), min(a["y"], b["y"])
+                    right = max(a["x"] + a["w"], b["x"] + b["w"])
+                    bottom = max(a["y"] + a["h"], b["y"] + b["h"])
+                    merged[i] = {"x": left, "y": top, "w": right - left, "h": bottom - top}
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+def iou(a: Dict, b: Dict) -> float:
+    """
+    Intersection over union of two facial areas.
+    """
+    left = max(a["x"], b["x"])
+    top = max(a["y"], b["y"])
+    right = min(a["x"] + a["w"], b["x"] + b["w"])
+    bottom = min(a["y"] + a["h"], b["y"] + b["h"])
+    if right <= left or bottom <= top:
+        return 0.0
+    intersection = (right - left) * (bottom - top)
+    union = a["w"] * a["h"] + b["w"] * b["h"] - intersection
+    return intersection / union
+
+
+def non_max_suppression(face_objs: List[Dict], iou_threshold: float = 0.4) -> List[Dict]:
+    """
+    Remove duplicate detections of the same face. When detections overlap more than iou_threshold,
+    the one with the highest confidence is kept.
+    """
+    kept = []
+    for face_obj in sorted(face_objs, key=lambda obj: obj.get("confidence") or 0, reverse=True):
+        if all(iou(face_obj["facial_area"], other["facial_area"]) <= iou_threshold for other in kept):
+            kept.append(face_obj)
+    return kept
+
+
+def centroid_distance(a: Dict, b: Dict) -> float:
+    """
+    Distance between the centers of two facial areas.
+    """
+    dx = (a["x"] + a["w"] / 2) - (b["x"] + b["w"] / 2)
+    dy = (a["y"] + a["h"] / 2) - (b["y"] + b["h"] / 2)
+    return (dx ** 2 + dy ** 2) ** 0.5
+
+
+def match_facial_areas(detections: List[Dict], tracks: List[Dict],
+                       iou_threshold: float = 0.3, max_centroid_distance: float = 0.5) -> Dict[int, int]:
+    """
+    Associate detected facial areas to tracked facial areas.
+
+    Pairs are matched greedily by the highest IoU. Detections that do not overlap enough with any track
+    are matched to the nearest remaining track, if the centers are closer than max_centroid_distance
+    times the track width.
+
+    Returns: Dictionary detection index -> track index.
+    """
+    pairs = []
+    for d_idx, detection in enumerate(detections):
+        for t_idx, track in enumerate(tracks):
+            overlap = iou(detection, track)
+            if overlap >= iou_threshold:
+                pairs.append((overlap, d_idx, t_idx))
+
+    matches = {}
+    matched_tracks = set()
+    for _, d_idx, t_idx in sorted(pairs, reverse=True):
+        if d_idx not in matches and t_idx not in matched_tracks:
+            matches[d_idx] = t_idx
+            matched_tracks.add(t_idx)
+
+    for d_idx, detection in enumerate(detections):
+        if d_idx in matches:
+            continue
+        candidates = [(centroid_distance(detection, track), t_idx) for t_idx, track in enumerate(tracks)
+                      if t_idx not in matched_tracks
+                      and centroid_distance(detection, track) < max_centroid_distance * track["w"]]
+        if candidates:
+            t_idx = min(candidates)[1]
+            matches[d_idx] = t_idx
+            matched_tracks.add(t_idx)
+    return matches
@@ -1,20 +1,31 @@
+import cv2
 import numpy as np
 import scipy
 
 from deepface import DeepFace
+from deepface.modules import preprocessing
 from deepface.models.FacialRecognition import FacialRecognition
 from deepface.modules.verification import find_threshold
 
+try:
+    from .face_boxes import scale_facial_area, non_max_suppression
+except ImportError:  # Imported as a top-level module by the tests
+    from face_boxes import scale_facial_area, non_max_suppression
+
 class FaceRecognizer(object):
 
-    def __init__(self, db_path, logger, model_name, detector_backend):
+    def __init__(self, db_path, logger, model_name, detector_backend, detection_scales=(1.0,)):
         """
         Initialize face recognizer, and create embeddings in the intialization
+
+        detection_scales: Scales of the image, where faces are detected. Smaller scales are faster,
+            but small faces are not found. If multiple scales are given, detections are combined.
         """
         self.logger = logger
         self.db_path = db_path
         self.model_name = model_name
         self.detector_backend = detector_backend
+        self.detection_scales = list(detection_scales)
 
         # build models once to store them in the memory
         self.model: FacialRecognition = DeepFace.build_model(model_name=model_name)
@@ -25,10 +36,23 @@ class FaceRecognizer(object):
         logger.info(f"facial recognition model {model_name} is just built")
 
         self.logger.info("FaceRecognizer initialized!")
+
+    def warm_up(self, frame_shape=(480, 640, 3)):
+        """
+        Run the face detector and the recognition model once on dummy images,
+        so that the first real frames do not pay for detector creation and graph compilation.
+        """
+        self.extract_faces(np.zeros(frame_shape, dtype=np.uint8))
+        self.represent_batch([np.zeros((*self.target_size, 3), dtype=np.float32)])
     
-    def extract_faces(self, img):
+    def extract_faces(self, img, detection_scales=None, frame_height=None):
         """
         Extract faces from image. Discards small faces.
+
+        Args:
+            detection_scales: Scales of the image, where faces are detected. Defaults to self.detection_scales
+            frame_height: Faces wider than 0.8 times frame_height are discarded. Defaults to the image height,
+                give the height of the full frame, when img is a region of it.
         Returns:
         results (List[Dict[str, Any]]): A list of dictionaries, where each dictionary contains:
 
@@ -40,13 +64,74 @@ class FaceRecognizer(object):
 
         - "confidence" (float): The confidence score associated with the detected face.
         """
+        if detection_scales is None:
+            detection_scales = self.detection_scales
+        if frame_height is None:
+            frame_height = img.shape[0]
+
+        face_objs = []
+        for scale in detection_scales:
+            face_objs += self._extract_faces_scaled(img, scale)
+
+        if len(detection_scales) > 1:
+            # The same face is usually found on multiple scales
+            face_objs = non_max_suppression(face_objs)
+
+        return [face_obj for face_obj in face_objs if face_obj["facial_area"]["w"] < frame_height * 0.8]
+
+    def _extract_faces_scaled(self, img, scale):
+        """
+        Detect faces from image resized by scale. Facial areas are mapped back to the full resolution image
+        and face images are cropped from the full resolution image, aligned and resized like at scale 1.0.
+        """
+        if scale == 1.0:
+            return DeepFace.extract_faces(
+                img_path=img,
+                target_size=self.target_size,
+                detector_backend=self.detector_backend,
+                enforce_detection=False,
+            )
+
+        small_img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
         face_objs = DeepFace.extract_faces(
-            img_path=img,
+            img_path=small_img,
             target_size=self.target_size,
             detector_backend=self.detector_backend,
             enforce_detection=False,
         )
-        return [face_obj for face_obj in face_objs if face_obj["facial_area"]["w"] < img.shape[0] * 0.8]
+        for face_obj in face_objs:
+            face_obj["facial_area"] = scale_facial_area(face_obj["facial_area"], 1.0 / scale)
+            face_obj["face"] = self.crop_face(img, face_obj["facial_area"], self.target_size)
+        return face_objs
+
+    @staticmethod
+    def crop_face(img, facial_area, target_size):
+        """
+        Crop face from BGR image and preprocess it like DeepFace.extract_faces: the face is rotated so that
+        the eyes are level, and resized to fit target_size keeping its aspect ratio and padded with black.
+        Returns RGB face image of target_size with values in [0, 1].
+        """
+        height, width = img.shape[:2]
+        x = min(max(facial_area["x"], 0), width - 1)
+        y = min(max(facial_area["y"], 0), height - 1)
+        face = img[y:min(y + facial_area["h"], height), x:min(x + facial_area["w"], width)]
+
+        left_eye, right_eye = facial_area.get("left_eye"), facial_area.get("right_eye")
+        if left_eye is not None and right_eye is not None:
+            # Angle of the line from the eye on the left of the image to the other, whichever eye is which
+            (x1, y1), (x2, y2) = sorted([left_eye, right_eye])
+            angle = float(np.degrees(np.arctan2(y2 - y1, x2 - x1)))
+            center = (face.shape[1] / 2, face.shape[0] / 2)
+            face = cv2.warpAffine(face, cv2.getRotationMatrix2D(center, angle, 1.0), (face.shape[1], face.shape[0]))
+
+        target_height, target_width = target_size
+        factor = min(target_height / face.shape[0], target_width / face.shape[1])
+        face = cv2.resize(face, (max(int(face.shape[1] * factor), 1), max(int(face.shape[0] * factor), 1)))
+        pad_height, pad_width = target_height - face.shape[0], target_width - face.shape[1]
+        face = np.pad(face, ((pad_height // 2, pad_height - pad_height // 2),
+                             (pad_width // 2, pad_width - pad_width // 2),
+                             (0, 0)), "constant")
+        return (face[:, :, ::-1] / 255).astype(np.float32)
     
     def represent(self, img):
         """
@@ -55,10 +140,60 @@ class FaceRecognizer(object):
         Returns representation (List[float]): Multidimensional vector representing facial features.
             The number of dimensions varies based on the reference model
             (e.g., FaceNet returns 128 dimensions, VGG-Face returns 4096 dimensions).
+
+        Keras models are run like in represent_batch, so that a face gets the same embedding either way.
         """
+        if self._keras_model() is not None:
+            return self.represent_batch([img])[0]
         target_embedding_obj = DeepFace.represent(
             img_path=img,
             model_name=self.model_name,
             detector_backend="skip",
             )
         return target_embedding_obj[0]["embedding"]
+
+    def represent_batch(self, imgs):
+        """
+        This function calculates vector representations for all faces of a frame with one model call.
+        Images are resized keeping their aspect ratio and padded to the model input, like DeepFace does.
+
+        Models that are not keras models (e.g. SFace is an OpenCV model) can not be batched,
+        so for them the embeddings are calculated one by one.
+
+        Returns representations (List[List[float]]): One representation per input image, in the same order.
+        """
+        if len(imgs) == 0:
+            return []
+
+        keras_model = self._keras_model()
+        if keras_model is None:
+            return [self.represent(img) for img in imgs]
+
+        batch = np.concatenate([self._preprocess(img) for img in imgs], axis=0)
+        embeddings = keras_model.predict_on_batch(batch)
+        return [embedding.tolist() for embedding in np.asarray(embeddings)]
+
+    def _keras_model(self):
+        """Return the keras model of the recognition model, or None if it is not a keras model."""
+        keras_model = getattr(self.model, "model", None)
+        return keras_model if hasattr(keras_model, "predict_on_batch") else None
+
+    def _preprocess(self, img):
+        """
+        Resize one face image to the model input keeping its aspect ratio, pad it with black and normalize it.
+        The model input_shape is (width, height), like DeepFace.represent uses it.
+        Returns array of shape (1, height, width, 3).
+        """
+        if len(img.shape) == 4:
+            img = img[0]
+        width, height = self.target_size
+        factor = min(height / img.shape[0], width / img.shape[1])
+        img = cv2.resize(img, (max(int(img.shape[1] * factor), 1), max(int(img.shape[0] * factor), 1)))
+        pad_height, pad_width = height - img.shape[0], width - img.shape[1]
+        img = np.pad(img, ((pad_height // 2, pad_height - pad_height // 2),
+                           (pad_width // 2, pad_width - pad_width // 2),
+                           (0, 0)), "constant")
+        img = np.expand_dims(img, axis=0).astype(np.float32)
+        if img.max() > 1:
+            img = img / 255.0
+        return preprocessing.normalize_input(img=img, normalization="base")
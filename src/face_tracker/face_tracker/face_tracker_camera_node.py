@@ -0,0 +1,115 @@
+import threading
+import traceback
+
+import rclpy
+
+from std_msgs.msg import Header
+from sensor_msgs.msg import Image
+
+from .camera_capture import CameraCapture, WebcamError
+from .face_tracker_node import FaceTrackerNode
+from .image_conversion import numpy_to_imgmsg
+
+
+class FaceTrackerCameraNode(FaceTrackerNode):
+    """
+    Face tracker and webcam in one process.
+
+    Frames are passed from the capture thread to the face tracker in memory, so raw frames do not
+    have to be serialized and sent over DDS. The raw frames are still published on raw_image topic
+    for other nodes, but only when the topic has subscribers.
+    Takes the parameters of both face_tracker_node and webcam_node.
+    """
+
+    def __init__(self):
+        super().__init__("face_tracker_camera_node", subscribe=False)
+
+        raw_image_topic = (
+            self.declare_parameter("raw_image", "/image_raw")
+            .get_parameter_value()
+            .string_value
+        )
+        index = (
+            self.declare_parameter("index", 0)
+            .get_parameter_value().integer_value
+        )
+        width = (
+            self.declare_parameter("width", 1280)
+            .get_parameter_value().integer_value
+        )
+        height = (
+            self.declare_parameter("height", 960)
+            .get_parameter_value().integer_value
+        )
+        fps = (
+            self.declare_parameter("fps", 30)
+            .get_parameter_value().integer_value
+        )
+        mjpg = (
+            self.declare_parameter("mjpg", True)
+            .get_parameter_value()._bool_value
+        )
+
+        self.raw_image_publisher = self.create_publisher(Image, raw_image_topic, 5)
+
+        self.capture = CameraCapture(self.logger,
+                                     index=index,
+                                     width=width,
+                                     height=height,
+                                     fps=fps,
+                                     mjpg=mjpg,
+                                     clock=lambda: self.get_clock().now())
+        self.capture.start()
+
+        self.feeding = True
+        self.feeder_thread = threading.Thread(target=self.feed_frames, name="frame_feeder", daemon=True)
+        self.feeder_thread.start()
+
+    def feed_frames(self):
+        """
+        Feeder thread loop. Gives every captured frame to the face tracker and publishes raw frames.
+        """
+        sequence = 0
+        while self.feeding:
+            latest = self.capture.wait_for_frame(sequence, timeout=0.5)
+            if latest is None:
+                continue
+            frame, capture_time, sequence = latest
+            header = Header(stamp=capture_time.to_msg())
+            try:
+                if self.raw_image_publisher.get_subscription_count() > 0:
+                    self.raw_image_publisher.publish(numpy_to_imgmsg(frame, "bgr8", header))
+            except Exception:
+                self.logger.error(f"Publishing raw frame failed:\n{traceback.format_exc()}")
+            # The face tracker may draw on the frame, so it is given after publishing
+            self.put_frame(frame, header)
+
+    def destroy_node(self):
+        self.feeding = False
+        self.feeder_thread.join()
+        self.capture.stop()
+        return super().destroy_node()
+
+
+def main(args=None):
+    # Initialize
+    rclpy.init(args=args)
+    try:
+        tracker = FaceTrackerCameraNode()
+    except WebcamError:
+        rclpy.shutdown()
+        return
+
+    # Do work
+    try:
+        rclpy.spin(tracker)
+    except KeyboardInterrupt:
+        pass
+
+    # Shutdown
+    tracker.destroy_node()
+    rclpy.try_shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,3 @@
-import cProfile
-import io
-import pstats
 import rclpy
 import cv2
 import dlib
@@ -8,33 +5,46 @@ import os
 import numpy as np
 import time
 import sys
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
 from ament_index_python.packages import get_package_share_directory
 
 from rclpy.node import Node
+from rclpy.parameter import Parameter
+from rclpy.time import Time
 
-from std_msgs.msg import String
-from sensor_msgs.msg import Image
+from std_msgs.msg import String, Header
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+from rcl_interfaces.msg import SetParametersResult
+from sensor_msgs.msg import Image, CompressedImage
 from face_tracker_msgs.msg import Faces, Face as FaceMsg, Point2, Occurance
 
-from cv_bridge import CvBridge, CvBridgeError
-
-from .lip_movement_net import LipMovementDetector
-from .face_analyzer import FaceAnalyzer
-
-bridge = CvBridge()
+from .face_analyzer import FaceAnalyzer, DEFAULT_FACE_DB_PATH, face_recognizer_class
+from .frame_buffer import LatestFrameBuffer
+from .identity_store import IdentityStore
+from .links_cluster import LinksCluster
+from .motion_gate import MotionGate
+from .quality_controller import QualityController
+from .image_conversion import imgmsg_to_bgr, numpy_to_imgmsg
+from .instrumentation import StageTimer, ProfileCapture, HISTOGRAM_EDGES_MS, memory_usage_mb
+from .shared_models import EmbeddingBatcher, SharedFaceRecognizer
 
 class WebcamError(Exception):
     """signal that webcam has stopped working"""
     pass
 
-# pr = cProfile.Profile()
-
 class FaceTrackerNode(Node):
-    def __init__(self):
-        super().__init__("face_tracker_node")
+    def __init__(self, node_name="face_tracker_node", subscribe=True):
+        """
+        Args:
+            node_name: Name of the node
+            subscribe: Subscribe to image_topic or image_topics. If False, frames are given with put_frame.
+        """
+        start_time = time.perf_counter()
+        super().__init__(node_name)
         self.logger = self.get_logger()
 
         lip_movement_detection = (
@@ -55,6 +65,66 @@ class FaceTrackerNode(Node):
             ._bool_value
         )
 
+        async_detection = (
+            self.declare_parameter("async_detection", False)
+            .get_parameter_value()
+            ._bool_value
+        )
+
+        detection_interval_min = (
+            self.declare_parameter("detection_interval_min", 1)
+            .get_parameter_value()
+            .integer_value
+        )
+
+        detection_interval_max = (
+            self.declare_parameter("detection_interval_max", 5)
+            .get_parameter_value()
+            .integer_value
+        )
+
+        tracking_confidence_threshold = (
+            self.declare_parameter("tracking_confidence_threshold", 7.0)
+            .get_parameter_value()
+            .double_value
+        )
+
+        detection_max_age = (
+            self.declare_parameter("detection_max_age", 1.0)
+            .get_parameter_value()
+            .double_value
+        )
+
+        tracking_workers = (
+            self.declare_parameter("tracking_workers", 0)
+            .get_parameter_value()
+            .integer_value
+        )
+
+        embedding_workers = (
+            self.declare_parameter("embedding_workers", 0)
+            .get_parameter_value()
+            .integer_value
+        )
+
+        roi_detection = (
+            self.declare_parameter("roi_detection", False)
+            .get_parameter_value()
+            ._bool_value
+        )
+
+        roi_margin = (
+            self.declare_parameter("roi_margin", 1.0)
+            .get_parameter_value()
+            .double_value
+        )
+
+        full_scan_interval = (
+            self.declare_parameter("full_scan_interval", 5)
+            .get_parameter_value()
+            .integer_value
+        )
+
         cluster_similarity_threshold = (
             self.declare_parameter("cluster_similarity_threshold", 0.3)
             .get_parameter_value()
@@ -73,6 +143,45 @@ class FaceTrackerNode(Node):
             .double_value
         )
 
+        # "ivf" finds the nearest face in large face databases approximately, see ann_index.py
+        cluster_index = (
+            self.declare_parameter("cluster_index", "exact")
+            .get_parameter_value()
+            .string_value
+        )
+
+        # Face embeddings kept per subcluster of the face database, see vector_retention.py
+        vector_retention = (
+            self.declare_parameter("vector_retention", "reservoir")
+            .get_parameter_value()
+            .string_value
+        )
+
+        retained_vectors = (
+            self.declare_parameter("retained_vectors", 32)
+            .get_parameter_value()
+            .integer_value
+        )
+
+        # The face database is saved to face_db_path and restored on startup, see identity_store.py
+        face_db = (
+            self.declare_parameter("face_db", False)
+            .get_parameter_value()
+            ._bool_value
+        )
+
+        face_db_path = (
+            self.declare_parameter("face_db_path", DEFAULT_FACE_DB_PATH)
+            .get_parameter_value()
+            .string_value
+        )
+
+        face_db_snapshot_interval = (
+            self.declare_parameter("face_db_snapshot_interval", 1000)  # changes between snapshots
+            .get_parameter_value()
+            .integer_value
+        )
+
         face_recognition_model = (
             self.declare_parameter("face_recognition_model", "SFace")
             .get_parameter_value()
@@ -85,12 +194,37 @@ class FaceTrackerNode(Node):
             .string_value
         )
 
+        face_recognition_backend = (
+            self.declare_parameter("face_recognition_backend", "deepface")
+            .get_parameter_value()
+            .string_value
+        )
+
+        detection_scale = (
+            self.declare_parameter("detection_scale", 1.0)
+            .get_parameter_value()
+            .double_value
+        )
+
+        detection_pyramid = (
+            self.declare_parameter("detection_pyramid", Parameter.Type.DOUBLE_ARRAY)
+            .get_parameter_value()
+            .double_array_value
+        )
+
         image_topic = (
             self.declare_parameter("image_topic", "/image_raw")
             .get_parameter_value()
             .string_value
         )
 
+        # Multiple cameras share the models and the face database. Overrides image_topic when set.
+        image_topics = (
+            self.declare_parameter("image_topics", Parameter.Type.STRING_ARRAY)
+            .get_parameter_value()
+            .string_array_value
+        )
+
         face_image_topic = (
             self.declare_parameter(
                 "face_image_topic", "image_face"
@@ -107,14 +241,276 @@ class FaceTrackerNode(Node):
             .string_value
         )
 
+        # Debug image is published only when someone subscribes to it
+        self.debug_image_rate = (
+            self.declare_parameter("debug_image_rate", 0.0)  # Hz, 0 publishes every frame
+            .get_parameter_value()
+            .double_value
+        )
+
+        self.debug_image_scale = (
+            self.declare_parameter("debug_image_scale", 1.0)
+            .get_parameter_value()
+            .double_value
+        )
+
+        debug_image_compressed = (
+            self.declare_parameter("debug_image_compressed", False)
+            .get_parameter_value()
+            ._bool_value
+        )
+
+        self.debug_image_jpeg_quality = (
+            self.declare_parameter("debug_image_jpeg_quality", 80)
+            .get_parameter_value()
+            .integer_value
+        )
+
+        motion_gate = (
+            self.declare_parameter("motion_gate", False)
+            .get_parameter_value()
+            ._bool_value
+        )
+
+        motion_threshold = (
+            self.declare_parameter("motion_threshold", 20)  # gray levels
+            .get_parameter_value()
+            .integer_value
+        )
+
+        motion_min_area = (
+            self.declare_parameter("motion_min_area", 0.005)  # fraction of the frame
+            .get_parameter_value()
+            .double_value
+        )
+
+        motion_idle_interval = (
+            self.declare_parameter("motion_idle_interval", 1.0)  # s
+            .get_parameter_value()
+            .double_value
+        )
+
+        # Quality is lowered automatically, when frames take longer than 1 / target_fps to process
+        target_fps = (
+            self.declare_parameter("target_fps", 0.0)  # 0 disables
+            .get_parameter_value()
+            .double_value
+        )
+
+        stage_statistics = (
+            self.declare_parameter("stage_statistics", False)
+            .get_parameter_value()
+            ._bool_value
+        )
+
+        diagnostics_period = (
+            self.declare_parameter("diagnostics_period", 5.0)  # s
+            .get_parameter_value()
+            .double_value
+        )
+
+        self.profile_file = (
+            self.declare_parameter("profile_file", "face_tracker.prof")
+            .get_parameter_value()
+            .string_value
+        )
+
+        # Setting profile_duration at runtime captures a cProfile dump of the processing thread
+        profile_duration = (
+            self.declare_parameter("profile_duration", 0.0)  # s, 0 disables
+            .get_parameter_value()
+            .double_value
+        )
+
         predictor = (
             self.declare_parameter("predictor", "shape_predictor_68_face_landmarks.dat")
             .get_parameter_value()
             .string_value
         )
 
-        lip_movement_detector = None
-        if lip_movement_detection:
+        # Models are loaded and warmed up in parallel. Modules of disabled features are not imported.
+        startup_timer = StageTimer(enabled=True)
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="model_loading") as executor:
+            if lip_movement_detection:
+                lip_movement_detector_model = (
+                    self.declare_parameter("lip_movement_detector", "1_32_False_True_0.25_lip_motion_net_model.h5")
+                    .get_parameter_value()
+                    .string_value
+                )
+                lip_movement_detector_future = executor.submit(self.load_lip_movement_detector,
+                                                               predictor,
+                                                               lip_movement_detector_model,
+                                                               startup_timer)
+            else:
+                self.logger.info('Lip movement detection disabled.')
+
+            if face_recognition:
+                face_recognizer_future = executor.submit(self.load_face_recognizer,
+                                                         face_recognition_backend,
+                                                         face_recognition_model,
+                                                         face_detection_model,
+                                                         list(detection_pyramid) or [detection_scale],
+                                                         startup_timer)
+            else:
+                self.logger.info('Face recognition disabled.')
+
+            lip_movement_detector = lip_movement_detector_future.result() if lip_movement_detection else None
+            face_recognizer = face_recognizer_future.result() if face_recognition else False
+
+        camera_topics = list(image_topics) or [image_topic]
+        multi_camera = len(camera_topics) > 1
+
+        # With multiple cameras, every camera has its own face analyzer, whose face recognizer and lip movement
+        # detector share the loaded models. Detection is serialized, embeddings of the cameras are calculated
+        # in combined batches and the faces of all cameras are matched to one face database.
+        cluster = None
+        cluster_lock = None
+        embedding_pool = None
+        self.identity_store = None
+        if multi_camera or face_db:
+            cluster = LinksCluster(cluster_similarity_threshold,
+                                   subcluster_similarity_threshold,
+                                   pair_similarity_maximum,
+                                   logger=self.logger.get_child("Face_Analyzer"),
+                                   index=cluster_index,
+                                   vector_retention=vector_retention,
+                                   retained_vectors=retained_vectors)
+            cluster_lock = threading.Lock()
+        if face_db:
+            self.identity_store = IdentityStore(os.path.expanduser(face_db_path),
+                                                cluster,
+                                                self.logger.get_child("Identity_Store"),
+                                                face_db_snapshot_interval,
+                                                lock=cluster_lock)
+            with startup_timer.stage("face_db"):
+                self.identity_store.load()
+        if multi_camera:
+            if face_recognizer:
+                detection_lock = threading.Lock()
+                batcher = EmbeddingBatcher(face_recognizer.represent_batch, len(camera_topics))
+                if embedding_workers > 0:
+                    from .embedding_pool import EmbeddingPool
+                    embedding_pool = EmbeddingPool(embedding_workers,
+                                                   self.logger.get_child("Face_Analyzer"),
+                                                   face_recognition_backend,
+                                                   face_recognition_model,
+                                                   face_detection_model)
+
+        self.cameras: List[Camera] = []
+        for index, topic in enumerate(camera_topics):
+            name = f"camera{index}"
+            camera_lip_movement_detector = lip_movement_detector
+            camera_face_recognizer = face_recognizer
+            if multi_camera:
+                if lip_movement_detector is not None:
+                    camera_lip_movement_detector = lip_movement_detector.share()
+                if face_recognizer:
+                    camera_face_recognizer = SharedFaceRecognizer(face_recognizer, detection_lock, batcher)
+
+            face_analyzer = FaceAnalyzer(self.logger.get_child("Face_Analyzer"),
+                                         camera_lip_movement_detector,
+                                         camera_face_recognizer,
+                                         correlation_tracking,
+                                         cluster_similarity_threshold,
+                                         subcluster_similarity_threshold,
+                                         pair_similarity_maximum,
+                                         face_recognition_model,
+                                         face_detection_model,
+                                         async_detection,
+                                         list(detection_pyramid) or [detection_scale],
+                                         detection_interval_min,
+                                         detection_interval_max,
+                                         tracking_confidence_threshold,
+                                         detection_max_age,
+                                         tracking_workers,
+                                         StageTimer(enabled=stage_statistics or target_fps > 0),
+                                         face_recognition_backend,
+                                         roi_detection,
+                                         roi_margin,
+                                         full_scan_interval,
+                                         embedding_workers,
+                                         cluster,
+                                         cluster_lock,
+                                         embedding_pool,
+                                         cluster_index,
+                                         self.identity_store,
+                                         vector_retention,
+                                         retained_vectors)
+
+            # Topics of multiple cameras are separated by the camera name, e.g. faces/camera1
+            suffix = f"/{name}" if multi_camera else ""
+            camera = Camera(name, topic, face_analyzer)
+            camera.face_img_publisher = self.create_publisher(Image, face_image_topic + suffix, 5)
+            if debug_image_compressed:
+                camera.face_img_compressed_publisher = self.create_publisher(
+                    CompressedImage, face_image_topic + suffix + "/compressed", 5)
+            camera.face_publisher = self.create_publisher(Faces, face_topic + suffix, 1)
+            camera.debug_image_rate = self.debug_image_rate
+
+            # Skips the face analysis of static frames, when no faces are tracked
+            if motion_gate:
+                camera.motion_gate = MotionGate(threshold=motion_threshold,
+                                                min_area=motion_min_area,
+                                                idle_interval=motion_idle_interval)
+
+            if target_fps > 0:
+                camera.quality_controller = QualityController(target_fps,
+                                                              detection_interval_max=detection_interval_max,
+                                                              correlation_tracking=correlation_tracking,
+                                                              lip_movement_detection=lip_movement_detection,
+                                                              debug_image_rate=self.debug_image_rate)
+            self.cameras.append(camera)
+        self.embedding_pool = embedding_pool
+        self.batcher = batcher if multi_camera and face_recognizer else None
+
+        startup_times = " ".join(f"{stage}={duration:.2f}s" for stage, duration in startup_timer.end_frame().items())
+        self.logger.info(f"Startup took {time.perf_counter() - start_time:.2f}s with {len(self.cameras)} cameras, "
+                         f"memory={memory_usage_mb():.0f}MB: {startup_times}")
+
+        self.font = cv2.FONT_HERSHEY_SIMPLEX
+
+        # Rolling stage timing statistics are published periodically on /diagnostics
+        if stage_statistics:
+            self.diagnostics_publisher = self.create_publisher(DiagnosticArray, "/diagnostics", 1)
+            self.diagnostics_timer = self.create_timer(diagnostics_period, self.publish_stage_statistics)
+            # CPU time of the whole process since the previous publish
+            self.diagnostics_time = time.monotonic()
+            self.diagnostics_cpu_time = time.process_time()
+
+        # Profiles the processing thread of the first camera
+        self.profile_capture = ProfileCapture(self.logger)
+        if profile_duration > 0:
+            self.profile_capture.request(profile_duration, self.profile_file)
+        self.add_on_set_parameters_callback(self.on_parameters_set)
+
+        # Frames of each camera are processed in a separate thread. Only the newest frame is processed,
+        # frames that arrive while the previous one is processed are dropped.
+        self.processing = True
+        for camera in self.cameras:
+            camera.processing_thread = threading.Thread(target=self.process_frames,
+                                                        args=(camera,),
+                                                        name=f"processing_{camera.name}",
+                                                        daemon=True)
+            camera.processing_thread.start()
+
+        # Create subscriptions, that receive camera frames
+        if subscribe:
+            self.subscribers = [
+                self.create_subscription(Image,
+                                         camera.image_topic,
+                                         lambda img, index=index: self.on_frame_received(img, index),
+                                         1)
+                for index, camera in enumerate(self.cameras)
+            ]
+
+    def load_lip_movement_detector(self, predictor, model, startup_timer):
+        """
+        Import, load and warm up the lip movement detector. Runs in a model loading thread.
+        """
+        self.logger.info('Initializing lip movement detector...')
+        with startup_timer.stage("lip_movement_import"):
+            from .lip_movement_net import LipMovementDetector
+        with startup_timer.stage("lip_movement_load"):
             self.predictor = dlib.shape_predictor(
                 os.path.join(
                     get_package_share_directory("face_tracker"),
@@ -122,76 +518,180 @@ class FaceTrackerNode(Node):
                     predictor,
                 )
             )
-            lip_movement_detector_model = (
-                self.declare_parameter("lip_movement_detector", "1_32_False_True_0.25_lip_motion_net_model.h5")
-                .get_parameter_value()
-                .string_value
-            )
-           # Initialize lip movement detector
-            self.logger.info('Initializing lip movement detector...')
             lip_movement_detector = LipMovementDetector(
                 os.path.join(
                     get_package_share_directory("face_tracker"),
                     "models",
-                    lip_movement_detector_model,
+                    model,
                 ),
                 self.predictor
             )
-            self.logger.info('Lip movement detector initialized.')
+        with startup_timer.stage("lip_movement_warm_up"):
+            lip_movement_detector.warm_up()
+        self.logger.info('Lip movement detector initialized.')
+        return lip_movement_detector
+
+    def load_face_recognizer(self, backend, model_name, detector_backend, detection_scales, startup_timer):
+        """
+        Import, load and warm up the face recognizer. Runs in a model loading thread.
+        """
+        with startup_timer.stage("face_recognition_import"):
+            recognizer_class = face_recognizer_class(backend)
+        with startup_timer.stage("face_recognition_load"):
+            face_recognizer = recognizer_class(db_path=DEFAULT_FACE_DB_PATH,
+                                               logger=self.logger.get_child("Face_Analyzer"),
+                                               model_name=model_name,
+                                               detector_backend=detector_backend,
+                                               detection_scales=detection_scales)
+        with startup_timer.stage("face_recognition_warm_up"):
+            face_recognizer.warm_up()
+        return face_recognizer
+
+    def on_frame_received(self, img: Image, camera=0):
+        """
+        Store received frame for processing thread of the camera.
+        """
+        # convert ros img to opencv image, bgr8 images are not copied
+        self.put_frame(imgmsg_to_bgr(img), img.header, camera)
+
+    def put_frame(self, cv2_bgr_img, header: Header, camera=0):
+        """
+        Give a frame for processing thread of the camera (index). Header stamp is the capture time of the frame.
+        """
+        self.cameras[camera].frame_buffer.put((cv2_bgr_img, header))
+
+    def process_frames(self, camera: "Camera"):
+        """
+        Processing thread loop of a camera. Processes always the newest received frame.
+        """
+        profiled = camera is self.cameras[0]
+        while self.processing:
+            if profiled:
+                self.profile_capture.poll()
+            frame, dropped_frames = camera.frame_buffer.get(timeout=0.5)
+            if frame is None:
+                continue
+            try:
+                self.process_frame(camera, *frame, dropped_frames)
+            except Exception:
+                self.logger.error(f"Frame processing of {camera.name} failed:\n{traceback.format_exc()}")
+        if profiled:
+            self.profile_capture.stop()
+
+    def on_parameters_set(self, parameters):
+        """
+        Start a cProfile capture when profile_duration is set.
+        """
+        for parameter in parameters:
+            if parameter.name == "profile_file":
+                self.profile_file = parameter.value
+            elif parameter.name == "profile_duration" and parameter.value > 0:
+                self.profile_capture.request(parameter.value, self.profile_file)
+        return SetParametersResult(successful=True)
+
+    def publish_stage_statistics(self):
+        """
+        Publish rolling stage timing statistics, fps and memory use of every camera on /diagnostics.
+        """
+        now, cpu_time = time.monotonic(), time.process_time()
+        process_cpu = 100 * (cpu_time - self.diagnostics_cpu_time) / max(now - self.diagnostics_time, 1e-9)
+        self.diagnostics_time, self.diagnostics_cpu_time = now, cpu_time
+
+        statuses = [self.camera_status(camera) for camera in self.cameras]
+        # The face database is shared by the cameras
+        face_tracker = self.cameras[0].face_tracker
+        with face_tracker.cluster_lock:
+            face_db = face_tracker.cluster.memory_report()
+        memory = [KeyValue(key="memory_mb", value=f"{memory_usage_mb():.0f}"),
+                  KeyValue(key="process_cpu_percent", value=f"{process_cpu:.0f}"),
+                  KeyValue(key="face_db.identities", value=str(len(face_db))),
+                  KeyValue(key="face_db.memory_mb", value=f"{sum(cl['bytes'] for cl in face_db) / 1e6:.1f}")]
+        if len(self.cameras) == 1:
+            statuses[0].values[:0] = memory
         else:
-            self.logger.info('Lip movement detection disabled.')
-
-        self.face_tracker = FaceAnalyzer(self.logger.get_child("Face_Analyzer"),
-                                        lip_movement_detector,
-                                        face_recognition,
-                                        correlation_tracking,
-                                        cluster_similarity_threshold,
-                                        subcluster_similarity_threshold,
-                                        pair_similarity_maximum,
-                                        face_recognition_model,
-                                        face_detection_model)
-
-        # Create subscription, that receives camera frames
-        self.subscriber = self.create_subscription(
-            Image,
-            image_topic,
-            self.on_frame_received,
-            1,
-        )
-        self.face_img_publisher = self.create_publisher(Image, face_image_topic, 5)
-        self.face_publisher = self.create_publisher(Faces, face_topic, 1)
-
-        self.font = cv2.FONT_HERSHEY_SIMPLEX
-
-        self.fps = FramesPerSecond()
-        self.fps.start()
-
-    #     self.timer = self.create_timer(2, self.profile_cycle)
-    #     pr.enable()
-
-    # def profile_cycle(self):
-    #     global pr
-    #     pr.disable()
-    #     s = io.StringIO()
-    #     ps = pstats.Stats(pr, stream=s).sort_stats(pstats.SortKey.CUMULATIVE)
-    #     ps.print_stats()
-    #     self.logger.info("Profiler: -----------------------------")
-    #     self.logger.info(s.getvalue())
-    #     self.logger.info("Profiler: -----------------------------")
-    #     # Save result to file
-    #     pr.create_stats()
-    #     filename = f"profiler.prof"
-    #     pr.dump_stats(filename)
-
-    #     pr = cProfile.Profile()
-    #     pr.enable()
-
-    def on_frame_received(self, img: Image):
-        # convert ros img to opencv image
-        cv2_bgr_img = bridge.imgmsg_to_cv2(img, "bgr8")
+            values = [KeyValue(key="cameras", value=str(len(self.cameras))),
+                      *memory,
+                      KeyValue(key="fps", value=f"{sum(camera.fps.fps for camera in self.cameras):.2f}")]
+            if self.batcher is not None and self.batcher.batches > 0:
+                values.append(KeyValue(key="embedding_requests_per_batch",
+                                       value=f"{self.batcher.requests / self.batcher.batches:.2f}"))
+            statuses.insert(0, DiagnosticStatus(level=DiagnosticStatus.OK,
+                                                name=f"{self.get_name()}: cameras",
+                                                hardware_id=self.get_name(),
+                                                message=f"{len(self.cameras)} cameras",
+                                                values=values))
+
+        self.diagnostics_publisher.publish(DiagnosticArray(header=Header(stamp=self.get_clock().now().to_msg()),
+                                                           status=statuses))
+
+    def camera_status(self, camera: "Camera"):
+        """
+        Return diagnostic status with the stage timing statistics and fps of a camera.
+        """
+        values = [KeyValue(key="fps", value=f"{camera.fps.fps:.2f}"),
+                  KeyValue(key="dropped_frames", value=str(camera.fps.dropped_frames))]
+        if camera.fps.latency is not None:
+            values.append(KeyValue(key="latency_ms", value=f"{1000 * camera.fps.latency:.1f}"))
+        if camera.fps.cpu is not None:
+            values.append(KeyValue(key="thread_cpu_percent", value=f"{camera.fps.cpu:.0f}"))
+        if camera.motion_gate is not None:
+            values += [KeyValue(key="motion_gate.idle", value=str(camera.motion_gate.idle)),
+                       KeyValue(key="motion_gate.skipped_frames", value=str(camera.fps.skipped_frames)),
+                       KeyValue(key="motion_gate.total_skipped_frames", value=str(camera.fps.total_skipped_frames)),
+                       KeyValue(key="motion_gate.wake_ups", value=str(camera.motion_gate.wake_ups))]
+            if camera.wake_latency is not None:
+                values.append(KeyValue(key="motion_gate.wake_latency_ms", value=f"{1000 * camera.wake_latency:.1f}"))
+        if camera.quality_controller is not None:
+            if camera.quality_controller.load is not None:
+                values.append(KeyValue(key="quality.load", value=f"{camera.quality_controller.load:.2f}"))
+            for name, setting in camera.quality_controller.settings.items():
+                values.append(KeyValue(key=f"quality.{name}", value=str(setting.value)))
+            if camera.quality_decision is not None:
+                values.append(KeyValue(key="quality.latest_decision", value=camera.quality_decision))
+        histogram_buckets = [f"<{edge}ms" for edge in HISTOGRAM_EDGES_MS] + [f">={HISTOGRAM_EDGES_MS[-1]}ms"]
+        for stage, statistics in camera.face_tracker.stage_timer.statistics().items():
+            values.append(KeyValue(key=f"{stage}.calls", value=str(statistics["calls"])))
+            for key in ("mean", "p50", "p95", "p99", "max"):
+                values.append(KeyValue(key=f"{stage}.{key}_ms", value=f"{statistics[key]:.2f}"))
+            values.append(KeyValue(key=f"{stage}.histogram",
+                                   value=" ".join(f"{bucket}:{count}" for bucket, count
+                                                  in zip(histogram_buckets, statistics["histogram"]))))
+
+        name = f"{self.get_name()}: stages" if len(self.cameras) == 1 else f"{self.get_name()}: {camera.name} stages"
+        return DiagnosticStatus(level=DiagnosticStatus.OK,
+                                name=name,
+                                hardware_id=self.get_name(),
+                                message=camera.fps.report(),
+                                values=values)
+
+    def destroy_node(self):
+        self.processing = False
+        for camera in self.cameras:
+            camera.frame_buffer.close()
+            camera.processing_thread.join()
+            camera.face_tracker.shutdown()
+        if self.embedding_pool is not None:
+            self.embedding_pool.shutdown()
+        if self.identity_store is not None:
+            self.identity_store.close()
+        return super().destroy_node()
+
+    def process_frame(self, camera: "Camera", cv2_bgr_img, header: Header, dropped_frames: int):
+        start_time = time.perf_counter()
+        publish_raw, publish_compressed = self.debug_image_subscribed(camera)
+        publish_debug_image = (publish_raw or publish_compressed) and self.debug_image_due(camera)
+
+        if camera.motion_gate is not None:
+            with camera.face_tracker.stage_timer.stage("motion_gate"):
+                analyze = camera.motion_gate.update(cv2_bgr_img, tracking=len(camera.face_tracker.faces) > 0)
+            if not analyze:
+                if publish_debug_image:
+                    self.publish_debug_image(camera, cv2_bgr_img, header, publish_raw, publish_compressed)
+                self.update_fps(camera, header, dropped_frames, skipped=True)
+                return
 
         msg_faces = []
-        faces = self.face_tracker.on_frame_received(cv2_bgr_img)
+        faces = camera.face_tracker.on_frame_received(cv2_bgr_img, draw=publish_debug_image)
         # loop through all faces
         for face in faces:
             occurances = []
@@ -204,32 +704,155 @@ class FaceTrackerNode(Node):
                                 occurances=occurances)
             msg_faces.append(msg_face)
 
+        stage_durations = dict(camera.face_tracker.frame_stage_durations)
+        if publish_debug_image:
+            debug_image_start = time.perf_counter()
+            self.publish_debug_image(camera, cv2_bgr_img, header, publish_raw, publish_compressed)
+            stage_durations["debug_image"] = time.perf_counter() - debug_image_start
+
+        # Publish faces info if faces found
+        if len(msg_faces) > 0:
+            camera.face_publisher.publish(Faces(faces=msg_faces))
+
+        if camera.quality_controller is not None:
+            camera.quality_controller.add_frame(time.perf_counter() - start_time, stage_durations)
+
+        self.update_fps(camera, header, dropped_frames)
+
+    def update_fps(self, camera: "Camera", header: Header, dropped_frames: int, skipped=False):
+        """
+        Update fps measurement of the camera with a processed frame and log it. Skipped frames were not analyzed
+        by the motion gate, so their latency is not measured.
+        """
+        # Capture to publish latency. Frames without header stamp are not measured.
+        latency = None
+        stamp = Time.from_msg(header.stamp)
+        if stamp.nanoseconds > 0 and not skipped:
+            latency = (self.get_clock().now() - stamp).nanoseconds / 1e9
+            if camera.motion_gate is not None and camera.motion_gate.woke_up:
+                camera.wake_latency = latency
+                self.logger.info(f"Motion gate of {camera.name} woke up, latency={1000 * latency:.1f}ms")
+
+        if camera.fps.update_fps(latency, dropped_frames, skipped):
+            if camera.quality_controller is not None:
+                self.update_quality(camera)
+            scheduler = camera.face_tracker.detection_scheduler
+            report = f"{camera.fps.report()} detection_interval={scheduler.interval} ({scheduler.reason})"
+            if camera.motion_gate is not None:
+                report += f" motion_gate={'idle' if camera.motion_gate.idle else 'active'}"
+            if len(self.cameras) > 1:
+                report = f"{camera.name}: {report} memory={memory_usage_mb():.0f}MB"
+            # Logging is throttled per camera
+            now = time.monotonic()
+            if now - camera.last_report_time >= 10.0:
+                camera.last_report_time = now
+                self.logger.info(report)
+
+    def update_quality(self, camera: "Camera"):
+        """
+        Let the quality controller of the camera evaluate the latest fps measurement, and apply and log its decisions.
+        """
+        decisions = camera.quality_controller.update(camera.fps.fps)
+        if not decisions:
+            return
+        controller = camera.quality_controller
+        camera.face_tracker.set_quality(controller.value("detection_scale_factor"),
+                                        controller.value("detection_interval_max"),
+                                        controller.value("lip_stride"))
+        camera.debug_image_rate = controller.value("debug_image_rate")
+        for decision in decisions:
+            self.logger.info(f"Quality of {camera.name} {decision}")
+        camera.quality_decision = decisions[-1]
+
+    def debug_image_subscribed(self, camera: "Camera"):
+        """
+        Return tuple (raw, compressed) telling which debug image topics of the camera have subscribers.
+        """
+        raw = camera.face_img_publisher.get_subscription_count() > 0
+        compressed = (camera.face_img_compressed_publisher is not None
+                      and camera.face_img_compressed_publisher.get_subscription_count() > 0)
+        return raw, compressed
+
+    def debug_image_due(self, camera: "Camera"):
+        """
+        Return True if it is time to publish the next debug image of the camera according to debug_image_rate.
+        """
+        now = time.monotonic()
+        if camera.debug_image_rate > 0 and now - camera.last_debug_image_time < 1.0 / camera.debug_image_rate:
+            return False
+        camera.last_debug_image_time = now
+        return True
+
+    def publish_debug_image(self, camera: "Camera", cv2_bgr_img, header, publish_raw, publish_compressed):
+        """
+        Draw fps to the frame and publish it on the debug image topics of the camera.
+        """
         # Draw fps to the frame
         cv2.putText(cv2_bgr_img,
-                    '%.2f' % self.fps.fps,
+                    '%.2f' % camera.fps.fps,
                     (10, 20),
                     self.font,
                     0.5,
                     (255, 255, 255),
                     1,
                     cv2.LINE_AA)
+        cv2.putText(cv2_bgr_img,
+                    camera.fps.report(),
+                    (10, 50),
+                    self.font,
+                    0.5,
+                    (255, 255, 255),
+                    1,
+                    cv2.LINE_AA)
 
-        # publish faces
-        try:
+        if self.debug_image_scale != 1.0:
+            cv2_bgr_img = cv2.resize(cv2_bgr_img, None, fx=self.debug_image_scale, fy=self.debug_image_scale,
+                                     interpolation=cv2.INTER_AREA)
+
+        if publish_raw:
             # Publish modified frame image
-            self.face_img_publisher.publish(bridge.cv2_to_imgmsg(cv2_bgr_img, "bgr8"))
-        except CvBridgeError as e:
-            self.logger.warn("Could not convert ros img to opencv image: ", e)
-        # Publish faces info if faces found
-        if len(msg_faces) > 0:
-            self.face_publisher.publish(Faces(faces=msg_faces))
+            camera.face_img_publisher.publish(numpy_to_imgmsg(cv2_bgr_img, "bgr8", header))
+
+        if publish_compressed:
+            ok, jpeg = cv2.imencode(".jpg", cv2_bgr_img, [cv2.IMWRITE_JPEG_QUALITY, self.debug_image_jpeg_quality])
+            if ok:
+                camera.face_img_compressed_publisher.publish(
+                    CompressedImage(header=header, format="jpeg", data=jpeg.tobytes()))
+
+class Camera:
+    """
+    Per camera state of the face tracker node: face analyzer, frame buffer and processing thread,
+    output publishers and the fps, motion gate and quality measurements.
+    """
+    def __init__(self, name, image_topic, face_tracker: FaceAnalyzer):
+        self.name = name
+        self.image_topic = image_topic
+        self.face_tracker = face_tracker
 
-        self.fps.update_fps()
+        self.frame_buffer = LatestFrameBuffer()
+        self.processing_thread = None
+
+        self.face_publisher = None
+        self.face_img_publisher = None
+        self.face_img_compressed_publisher = None
+        self.debug_image_rate = 0.0
+        self.last_debug_image_time = 0.0
+
+        self.fps = FramesPerSecond()
+        self.fps.start()
+        self.last_report_time = -float("inf")
+
+        self.motion_gate: MotionGate = None
+        self.wake_latency = None  # Capture to publish latency (s) of the latest frame that woke up the motion gate
+        self.quality_controller: QualityController = None
+        self.quality_decision = None  # Latest quality change
 
 class FramesPerSecond:
     """
     Class for calculating real time fps of video stream. Code is based from stack owerflow thread:
     https://stackoverflow.com/questions/55154753/trouble-calculating-fps-on-output-video-stream
+
+    Also keeps count of dropped frames and capture to publish latency of the processed frames.
     """
     def __init__(self):
         self.startTime = None
@@ -238,16 +861,75 @@ class FramesPerSecond:
         self.frameRate = 1  # The number of seconds to wait for each measurement.
         self.fps = 0
 
+        self.dropped_frames = 0  # Frames dropped during the last measurement
+        self.total_dropped_frames = 0
+        self.skipped_frames = 0  # Frames skipped by the motion gate during the last measurement
+        self.total_skipped_frames = 0
+        # CPU use of the thread calling update_fps, i.e. the processing thread of the camera, during the last
+        # measurement, percent of one core. Excludes the detection, tracking and embedding workers.
+        self.cpu = None
+        self.latency = None  # Mean capture to publish latency (s) during the last measurement
+        self.max_latency = None  # Max capture to publish latency (s) during the last measurement
+        self._dropped_counter = 0
+        self._skipped_counter = 0
+        self._latencies = []
+        self._cpu_start = None
+
     def start(self):
         self.startTime = time.time()  # Returns a UNIX timestamp.
 
-    def update_fps(self):
+    def update_fps(self, latency=None, dropped_frames=0, skipped=False):
+        """
+        Update measurement with a processed frame.
+
+        Args:
+            latency: Capture to publish latency of the frame in seconds, None if not known.
+            dropped_frames: Number of frames dropped before this frame.
+            skipped: The frame was not analyzed, because the motion gate was idle.
+
+        Returns: True, if a new measurement was completed.
+        """
+        cpu_time = time.thread_time()
+        if self._cpu_start is None:
+            self._cpu_start = cpu_time
         self.total_number_of_frames += 1
         self.counter += 1  # Count will increase until the if condition executes.
+        self._dropped_counter += dropped_frames
+        self.total_dropped_frames += dropped_frames
+        if skipped:
+            self._skipped_counter += 1
+            self.total_skipped_frames += 1
+        if latency is not None:
+            self._latencies.append(latency)
         if self._elapsed_time() > self.frameRate:  # We measure the self only after 1 second has passed.
             self.fps = self.counter / self._elapsed_time()
+            self.cpu = 100 * (cpu_time - self._cpu_start) / self._elapsed_time()
+            self._cpu_start = cpu_time
             self.counter = 0  # reset the counter for next iteration.
+            self.skipped_frames = self._skipped_counter
+            self._skipped_counter = 0
+            self.dropped_frames = self._dropped_counter
+            self._dropped_counter = 0
+            if self._latencies:
+                self.latency = sum(self._latencies) / len(self._latencies)
+                self.max_latency = max(self._latencies)
+                self._latencies = []
             self.start()  # reset the start time.
+            return True
+        return False
+
+    def report(self):
+        """
+        Return the latest measurement as a string.
+        """
+        report = f"fps={self.fps:.2f} dropped={self.dropped_frames} total_dropped={self.total_dropped_frames}"
+        if self.cpu is not None:
+            report += f" thread_cpu={self.cpu:.0f}%"
+        if self.total_skipped_frames:
+            report += f" skipped={self.skipped_frames} total_skipped={self.total_skipped_frames}"
+        if self.latency is not None:
+            report += f" latency={1000 * self.latency:.1f}ms max_latency={1000 * self.max_latency:.1f}ms"
+        return report
 
     def _elapsed_time(self):
         return time.time() - self.startTime
@@ -258,11 +940,14 @@ def main(args=None):
     tracker = FaceTrackerNode()
 
     # Do work
-    rclpy.spin(tracker)
-
-    # Shutdown
-    tracker.destroy_node()
-    rclpy.shutdown()
+    try:
+        rclpy.spin(tracker)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Shutdown, also saves the face database
+        tracker.destroy_node()
+        rclpy.try_shutdown()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,56 @@
+import threading
+
+
+class LatestFrameBuffer:
+    """
+    Single slot buffer between a frame source and frame processing.
+
+    Only the newest frame is kept. A frame that is replaced before it is processed
+    is counted as dropped, so that the cost of slow processing is visible.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._frame = None
+        self._dropped_since_get = 0
+        self._closed = False
+
+        self.received_frames = 0
+        self.dropped_frames = 0
+
+    def put(self, frame):
+        """
+        Store the newest frame. Replaces the frame waiting for processing, if there is one.
+        """
+        with self._condition:
+            self.received_frames += 1
+            if self._frame is not None:
+                self.dropped_frames += 1
+                self._dropped_since_get += 1
+            self._frame = frame
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Wait for a frame and take it from the buffer.
+
+        Returns: Tuple (frame, dropped), where dropped is the number of frames dropped since the
+            previous get. Frame is None, if the timeout expired or the buffer was closed.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._frame is not None or self._closed, timeout)
+            frame = self._frame
+            if frame is None:
+                return None, 0
+            dropped = self._dropped_since_get
+            self._frame = None
+            self._dropped_since_get = 0
+            return frame, dropped
+
+    def close(self):
+        """
+        Wake up waiting consumers. Frames put after closing are still stored.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
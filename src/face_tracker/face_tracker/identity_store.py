@@ -0,0 +1,279 @@
+"""
+Persistent face database. Saves the clusters of LinksCluster to a directory, so that the identities and their
+conversation history survive restarts of the node.
+
+The database is a snapshot and a change log:
+
+    snapshot-<generation>.npy     Centroids of all subclusters, one float64 row per subcluster
+    snapshot-<generation>.json    Cluster ids, subcluster metadata, conversations and edges, in row order
+    changes-<generation>.jsonl    Append-only log of the clusters changed after the snapshot
+
+Every record appends one line with the full state of the changed clusters, so writes do not depend on the size of
+the database. After snapshot_interval records, a new snapshot generation is written, new records go to the log of
+the new generation and the previous generations are deleted.
+
+The frame path only queues the indices of the changed clusters. A background thread serializes and writes the
+records and the snapshots in order. It copies the state of the clusters under the lock of the cluster and
+serializes and writes it after releasing the lock. The changes are always logged before a snapshot is started, so
+they are not lost if the snapshot fails. The snapshot files are written to temporary files and renamed, and the
+json file is renamed last, so a snapshot is either complete or ignored. If the process dies, the latest complete
+snapshot is loaded and the logs of its and later generations are replayed, and a partially written last line of
+a log is cut off.
+
+The snapshot array is loaded memory-mapped, and the restored centroids are rows of it, so loading does not copy
+the centroids. Stored vectors of the subclusters are not saved.
+"""
+import glob
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    from .links_cluster import Cluster, LinksCluster
+except ImportError:  # Imported as a top-level module by the tests
+    from links_cluster import Cluster, LinksCluster
+
+SNAPSHOT_VERSION = 1
+
+
+class IdentityStore:
+    """
+    Snapshot and change log of the clusters of a LinksCluster. Call record under the lock of the cluster,
+    and load, snapshot, flush and close without holding it.
+    """
+
+    def __init__(self, path, links_cluster: LinksCluster, logger=logging.getLogger(), snapshot_interval=1000,
+                 fsync=False, lock: threading.Lock=None):
+        """
+        Args:
+            path: Directory of the database, created if missing
+            links_cluster: Clusters to save and restore
+            snapshot_interval: Number of records between snapshots
+            fsync: Flush every record to disk with os.fsync. Without it, records survive a crash of the process,
+                but not of the operating system.
+            lock: Lock of links_cluster, held by the background thread while it copies the clusters
+        """
+        self.path = path
+        self.links_cluster = links_cluster
+        self.logger = logger
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self.lock = lock if lock is not None else threading.Lock()
+
+        self.generation = 0  # Generation of the log, used by the background thread after load
+        self.records = 0  # Records queued after the latest snapshot
+        self._log = None
+        # Records and snapshots are written in one background thread in the order they were queued
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="face_db")
+
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, kind, generation, extension):
+        return os.path.join(self.path, f"{kind}-{generation:06d}.{extension}")
+
+    def _generations(self, kind="snapshot", extension="json"):
+        """Return generations of the complete snapshots, or of other files, in ascending order."""
+        generations = []
+        for file in glob.glob(os.path.join(self.path, f"{kind}-*.{extension}")):
+            match = re.fullmatch(rf"{kind}-(\d+)\.{extension}", os.path.basename(file))
+            if match:
+                generations.append(int(match.group(1)))
+        return sorted(generations)
+
+    def load(self):
+        """
+        Replace the clusters of links_cluster with the latest snapshot and the changes logged after it,
+        and open the log for new records. The logs of later generations are replayed too, if the process
+        died before their snapshot was written.
+
+        Returns:
+            bool
+                True if a database was found
+        """
+        generations = self._generations()
+        clusters = []
+        if generations:
+            self.generation = generations[-1]
+            clusters = self._load_snapshot(self.generation)
+        snapshot_generation = self.generation
+        changes = 0
+        for generation in self._generations("changes", "jsonl"):
+            if generation >= self.generation:
+                changes += self._replay(clusters, self._file("changes", generation, "jsonl"))
+                self.generation = generation
+
+        self.links_cluster.clusters = clusters
+        self.links_cluster.rebuild_index()
+        self.links_cluster.changed_clusters.clear()
+        self.records = changes
+        self._log = open(self._file("changes", self.generation, "jsonl"), "a", encoding="utf-8")
+        if generations or changes:
+            self.logger.info(f"Loaded {len(clusters)} identities from {self.path} "
+                             f"(snapshot {snapshot_generation}, {changes} changes)")
+        return bool(generations or changes)
+
+    def _load_snapshot(self, generation):
+        with open(self._file("snapshot", generation, "json"), encoding="utf-8") as file:
+            snapshot = json.load(file)
+        if snapshot["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported face database version {snapshot['version']} in {self.path}")
+        centroids = np.load(self._file("snapshot", generation, "npy"), mmap_mode="r")
+        clusters = []
+        row = 0
+        for cluster_dict in snapshot["clusters"]:
+            count = len(cluster_dict["subclusters"])
+            clusters.append(Cluster.from_dict(cluster_dict,
+                                              centroids[row:row + count],
+                                              store_vectors=self.links_cluster.store_vectors,
+                                              new_retention=self.links_cluster.new_retention,
+                                              logger=self.links_cluster.logger))
+            row += count
+        return clusters
+
+    def _replay(self, clusters, log_file):
+        """Apply the logged changes to clusters. Returns the number of records."""
+        if not os.path.exists(log_file):
+            return 0
+        with open(log_file, "rb") as file:
+            data = file.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        if len(complete) < len(data):
+            # The last line is incomplete, if the process died while writing it. It is cut off,
+            # so that new records are appended after the last complete record.
+            self.logger.warning(f"Skipped an incomplete record of the face database {log_file}")
+            os.truncate(log_file, len(complete))
+
+        records = 0
+        for line in complete.decode("utf-8").splitlines():
+            for cl_idx, cluster_dict in json.loads(line)["clusters"]:
+                cluster = Cluster.from_dict(cluster_dict,
+                                            store_vectors=self.links_cluster.store_vectors,
+                                            new_retention=self.links_cluster.new_retention,
+                                            logger=self.links_cluster.logger)
+                if cl_idx < len(clusters):
+                    clusters[cl_idx] = cluster
+                else:
+                    clusters.append(cluster)
+            records += 1
+        return records
+
+    def record(self):
+        """
+        Queue a record of the clusters changed since the previous record, and a snapshot after it,
+        when snapshot_interval records have been queued since the previous snapshot.
+        """
+        changed = sorted(self.links_cluster.changed_clusters)
+        if not changed:
+            return
+        self.links_cluster.changed_clusters.clear()
+        self._submit(self._write_record, changed)
+        self.records += 1
+        if self.records >= self.snapshot_interval:
+            self.records = 0
+            self._submit(self._write_snapshot)
+
+    def snapshot(self):
+        """
+        Write all clusters as a new snapshot generation, start a new log and delete the previous generations.
+        Waits until the queued records and the snapshot are written.
+        """
+        self.records = 0
+        self._submit(self._write_snapshot).result()
+
+    def flush(self):
+        """Wait until the queued records and snapshots are written."""
+        self._writer.submit(lambda: None).result()
+
+    def _submit(self, function, *args):
+        """Run function in the background thread. Errors are logged, so that the following writes still run."""
+        def run():
+            try:
+                function(*args)
+            except Exception as e:
+                self.logger.error(f"Writing the face database {self.path} failed: {e!r}")
+        return self._writer.submit(run)
+
+    def _write_record(self, changed):
+        """Append the current state of the changed clusters to the log."""
+        with self.lock:
+            clusters = self.links_cluster.clusters
+            states = [(cl_idx, clusters[cl_idx].to_dict(centroids=False),
+                       [np.array(sc.centroid, dtype=np.float64) for sc in clusters[cl_idx].subclusters])
+                      for cl_idx in changed]
+        for _, cluster_dict, centroids in states:
+            for subcluster_dict, centroid in zip(cluster_dict["subclusters"], centroids):
+                subcluster_dict["centroid"] = centroid.tolist()
+
+        if self._log is None:
+            self._log = open(self._file("changes", self.generation, "jsonl"), "a", encoding="utf-8")
+        line = json.dumps({"clusters": [[cl_idx, cluster_dict] for cl_idx, cluster_dict, _ in states]})
+        self._log.write(line + "\n")
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+
+    def _write_snapshot(self):
+        self._save_snapshot(*self._start_snapshot())
+
+    def _start_snapshot(self):
+        """
+        Copy the state of all clusters and start the log of the next generation.
+        Returns the generation, centroids and metadata of the snapshot for _save_snapshot.
+        """
+        with self.lock:
+            clusters = self.links_cluster.clusters
+            subclusters = [sc for cl in clusters for sc in cl.subclusters]
+            if subclusters:
+                centroids = np.array([sc.centroid for sc in subclusters], dtype=np.float64)
+            else:
+                centroids = np.zeros((0, 0), dtype=np.float64)
+            snapshot = {
+                "version": SNAPSHOT_VERSION,
+                "clusters": [cl.to_dict(centroids=False) for cl in clusters],
+            }
+
+        if self._log is not None:
+            self._log.close()
+        self.generation += 1
+        self._log = open(self._file("changes", self.generation, "jsonl"), "a", encoding="utf-8")
+        return self.generation, centroids, snapshot
+
+    def _save_snapshot(self, generation, centroids, snapshot):
+        """Write the snapshot files of the generation and delete the previous generations."""
+        try:
+            self._write(self._file("snapshot", generation, "npy"), lambda file: np.save(file, centroids))
+            self._write(self._file("snapshot", generation, "json"),
+                        lambda file: file.write(json.dumps(snapshot).encode("utf-8")))
+        except OSError as e:
+            # The previous snapshot and the logs after it are kept, so the database can still be loaded
+            self.logger.error(f"Writing a snapshot of the face database {self.path} failed: {e!r}")
+            return
+        for file in glob.glob(os.path.join(self.path, "snapshot-*")) + glob.glob(os.path.join(self.path, "changes-*")):
+            match = re.fullmatch(r"(?:snapshot|changes)-(\d+)\..*", os.path.basename(file))
+            if match and int(match.group(1)) < generation:
+                os.remove(file)
+
+    @staticmethod
+    def _write(path, write):
+        """Write a file atomically: write(file) writes a temporary file, which is synced and renamed to path."""
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+
+    def close(self):
+        """Write a snapshot of the changes since the last snapshot, close the log and stop the background thread."""
+        if self.records > 0 or self.links_cluster.changed_clusters:
+            self.snapshot()
+        self.flush()
+        self._writer.shutdown()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
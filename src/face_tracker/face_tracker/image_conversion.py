@@ -0,0 +1,91 @@
+"""
+Conversion between sensor_msgs/Image messages and NumPy arrays without CvBridge.
+
+Received images are converted to NumPy views over the message buffer, so a frame is not copied
+when it is taken into use. Published images are copied once into the message buffer,
+CvBridge.cv2_to_imgmsg copies them twice.
+"""
+import cv2
+import numpy as np
+
+from sensor_msgs.msg import Image
+
+# Number of channels of the supported 8-bit encodings
+ENCODING_CHANNELS = {
+    "mono8": 1,
+    "8UC1": 1,
+    "bgr8": 3,
+    "rgb8": 3,
+    "8UC3": 3,
+    "bgra8": 4,
+    "rgba8": 4,
+    "8UC4": 4,
+}
+
+# Color conversions to bgr8
+TO_BGR = {
+    "mono8": cv2.COLOR_GRAY2BGR,
+    "8UC1": cv2.COLOR_GRAY2BGR,
+    "rgb8": cv2.COLOR_RGB2BGR,
+    "bgra8": cv2.COLOR_BGRA2BGR,
+    "rgba8": cv2.COLOR_RGBA2BGR,
+    "8UC4": cv2.COLOR_BGRA2BGR,
+}
+
+
+def imgmsg_to_numpy(msg: Image) -> np.ndarray:
+    """
+    Return NumPy view of the image message data. The data is not copied, so changes to the
+    array change the message.
+
+    Returns: uint8 array of shape (height, width) for single channel images and (height, width, channels) for others.
+
+    Raises: ValueError if the encoding is not an 8-bit encoding or the data is too short.
+    """
+    channels = ENCODING_CHANNELS.get(msg.encoding)
+    if channels is None:
+        raise ValueError(f"Unsupported image encoding {msg.encoding}")
+    if len(msg.data) < msg.height * msg.step or msg.step < msg.width * channels:
+        raise ValueError(f"Image data does not match {msg.width}x{msg.height} {msg.encoding} step={msg.step}")
+
+    if channels == 1:
+        shape = (msg.height, msg.width)
+        strides = (msg.step, 1)
+    else:
+        shape = (msg.height, msg.width, channels)
+        strides = (msg.step, channels, 1)
+    return np.ndarray(shape=shape, dtype=np.uint8, buffer=msg.data, strides=strides)
+
+
+def imgmsg_to_bgr(msg: Image) -> np.ndarray:
+    """
+    Return the image message as a BGR image. bgr8 and 8UC3 images are returned as views without copying,
+    other encodings are converted.
+    """
+    img = imgmsg_to_numpy(msg)
+    conversion = TO_BGR.get(msg.encoding)
+    if conversion is None:
+        return img
+    return cv2.cvtColor(img, conversion)
+
+
+def numpy_to_imgmsg(img: np.ndarray, encoding: str = "bgr8", header=None) -> Image:
+    """
+    Create image message from uint8 NumPy array. The image data is copied once into the message.
+    """
+    channels = ENCODING_CHANNELS.get(encoding)
+    if channels is None:
+        raise ValueError(f"Unsupported image encoding {encoding}")
+    if img.dtype != np.uint8 or (img.shape[2] if img.ndim == 3 else 1) != channels:
+        raise ValueError(f"Array of shape {img.shape} and type {img.dtype} can not be encoded as {encoding}")
+
+    msg = Image()
+    if header is not None:
+        msg.header = header
+    msg.height = img.shape[0]
+    msg.width = img.shape[1]
+    msg.encoding = encoding
+    msg.is_bigendian = 0
+    msg.step = img.shape[1] * channels
+    msg.data.frombytes(np.ascontiguousarray(img).reshape(-1))
+    return msg
@@ -0,0 +1,213 @@
+"""
+Lightweight timing and profiling of the face tracker processing stages.
+"""
+import cProfile
+import collections
+import os
+import resource
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+# Processing stages of FaceAnalyzer
+STAGES = [
+    "grayscale",
+    "detection",
+    "embedding",
+    "clustering",
+    "tracking",
+    "lip_landmarks",
+    "lip_rnn",
+    "drawing",
+]
+
+# Upper edges of the stage duration histogram buckets (ms). The last bucket collects longer durations.
+HISTOGRAM_EDGES_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+
+
+def memory_usage_mb():
+    """
+    Return the resident memory of the process in megabytes. Falls back to the peak resident memory,
+    where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _NullStage:
+    """Context manager that does nothing, returned when timing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """Context manager that records the time spent inside it."""
+
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class StageTimer:
+    """
+    Measures time spent in named processing stages.
+
+    Usage:
+        with stage_timer.stage("detection"):
+            ...
+
+    The durations of the newest window calls of every stage are kept for rolling statistics.
+    With keep_samples, durations of all calls are also kept in samples, e.g. for offline benchmarks.
+    When disabled, stage() returns a shared no-op context manager, so timing costs one attribute check.
+    Stages can be timed from multiple threads, e.g. the detection worker.
+    """
+
+    def __init__(self, enabled=False, window=300, keep_samples=False):
+        self.enabled = enabled
+        self.window = window
+        self.keep_samples = keep_samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def stage(self, name):
+        """
+        Return context manager that times the stage.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def record(self, name, duration):
+        """
+        Record duration (s) of one call of the stage.
+        """
+        with self._lock:
+            if name not in self.rolling:
+                self.rolling[name] = collections.deque(maxlen=self.window)
+            self.rolling[name].append(duration)
+            if self.keep_samples:
+                self.samples[name].append(duration)
+            self._current_frame[name] += duration
+
+    def end_frame(self):
+        """
+        Mark the end of a frame. Returns the stage durations of the frame.
+        """
+        if not self.enabled:
+            return {}
+        with self._lock:
+            frame = dict(self._current_frame)
+            self._current_frame = defaultdict(float)
+            self.frame_count += 1
+        return frame
+
+    def reset(self):
+        """
+        Forget all recorded durations.
+        """
+        with self._lock:
+            self.rolling = {}  # stage -> durations of the newest calls (s)
+            self.samples = defaultdict(list)  # stage -> durations of all calls (s), if keep_samples
+            self.frame_count = 0
+            self._current_frame = defaultdict(float)
+
+    def statistics(self):
+        """
+        Return rolling statistics of every recorded stage as dictionary stage -> statistics.
+        Durations are in milliseconds, histogram contains call counts of the HISTOGRAM_EDGES_MS buckets.
+        """
+        with self._lock:
+            rolling = {name: list(durations) for name, durations in self.rolling.items()}
+
+        statistics = {}
+        for name in STAGES + sorted(set(rolling) - set(STAGES)):
+            durations = rolling.get(name)
+            if not durations:
+                continue
+            durations_ms = 1000 * np.asarray(durations)
+            p50, p95, p99 = np.percentile(durations_ms, [50, 95, 99])
+            statistics[name] = {
+                "calls": len(durations_ms),
+                "mean": float(durations_ms.mean()),
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99),
+                "max": float(durations_ms.max()),
+                "histogram": np.bincount(np.searchsorted(HISTOGRAM_EDGES_MS, durations_ms, side="right"),
+                                         minlength=len(HISTOGRAM_EDGES_MS) + 1).tolist(),
+            }
+        return statistics
+
+
+class ProfileCapture:
+    """
+    Captures a cProfile dump of the thread that calls poll.
+
+    cProfile only profiles the thread where it is enabled, so request() can be called from any thread
+    (e.g. a parameter callback), and the profiled thread starts and stops the profiler in poll().
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self._request = None  # (duration, filename)
+        self._profile = None
+        self._filename = None
+        self._end_time = 0.0
+
+    @property
+    def active(self):
+        return self._profile is not None
+
+    def request(self, duration, filename):
+        """
+        Profile the polling thread for duration seconds and dump the stats to filename.
+        """
+        self._request = (duration, filename)
+
+    def poll(self):
+        """
+        Start a requested capture, or stop and dump the running capture when its time is over.
+        Called by the profiled thread, e.g. once per frame.
+        """
+        if self._profile is not None and time.monotonic() >= self._end_time:
+            self.stop()
+        if self._request is not None and self._profile is None:
+            duration, self._filename = self._request
+            self._request = None
+            self._end_time = time.monotonic() + duration
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+            self.logger.info(f"Profiling for {duration:.1f} s to {self._filename}")
+
+    def stop(self):
+        """
+        Stop the running capture and dump the stats. Must be called from the profiled thread.
+        """
+        if self._profile is None:
+            return
+        self._profile.disable()
+        self._profile.dump_stats(self._filename)
+        self._profile = None
+        self.logger.info(f"Profile saved to {self._filename}, view it with: python3 -m pstats {self._filename}")
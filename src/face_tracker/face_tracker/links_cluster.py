@@ -7,24 +7,44 @@ Links online clustering algorithm.
 
 Reference: https://arxiv.org/abs/1801.10123
 """
+import itertools
 import logging
 import time
 import uuid
-from typing import List, Dict
+from typing import List, Dict, Set
 
 import numpy as np
 from scipy.spatial.distance import cosine
 
+try:
+    from .ann_index import create_index
+    from .vector_retention import create_retention
+except ImportError:  # Imported as a top-level module by the tests
+    from ann_index import create_index
+    from vector_retention import create_retention
+
 CONVERSATION_TRESHOLD = 30  # Threshold value to determine that two conversations is same (s)
 CONVERSATION_MINIMUM_LENGTH = 1  # Minimum lenght of conversation
 
+_subcluster_ids = itertools.count()
+
 class Subcluster:
     """Class for subclusters and edges between subclusters."""
 
-    def __init__(self, initial_vector: np.ndarray, store_vectors: bool=False, logger=logging.getLogger()):
+    def __init__(self, initial_vector: np.ndarray, store_vectors: bool=False, logger=logging.getLogger(),
+                 retention=None):
+        """
+        Args:
+            store_vectors: Store every vector, if retention is None
+            retention: Empty vector store, which decides which vectors are kept, see vector_retention.py
+        """
         self.logger = logger
+        self.id = next(_subcluster_ids)  # Stable id, the position of a subcluster in its cluster changes
 
-        self.vectors = [initial_vector]
+        if retention is None:
+            retention = create_retention("all" if store_vectors else "none")
+        self.retained = retention
+        self.retained.add(initial_vector)
         self.centroid = initial_vector
         self.vector_count = 1
         self.store_vectors = store_vectors
@@ -43,8 +63,7 @@ class Subcluster:
 
     def add(self, vector: np.ndarray):
         """Add a new vector to the subcluster, update the centroid."""
-        if self.store_vectors:
-            self.vectors.append(vector)
+        self.retained.add(vector)
         self.vector_count += 1
         if self.centroid is None:
             self.centroid = vector
@@ -73,6 +92,57 @@ class Subcluster:
 
         self.last_seen = now
 
+    @property
+    def vectors(self):
+        """Stored vectors of the subcluster, a list of at most retention capacity vectors."""
+        return self.retained.vectors()
+
+    @property
+    def nbytes(self):
+        """Memory held by the centroid and the stored vectors in bytes."""
+        return np.asarray(self.centroid).nbytes + self.retained.nbytes
+
+    def to_dict(self, centroid=True):
+        """
+        Return the state of the subcluster as a JSON serializable dict, see from_dict.
+        Stored vectors and edges are not included, edges are stored by Cluster.to_dict.
+
+        Args:
+            centroid: Include the centroid as a list. Snapshots store the centroids in a separate array.
+        """
+        data = {
+            "vector_count": self.vector_count,
+            "last_seen": self.last_seen,
+            "current_conversation": dict(self.current_conversation),
+            "conversations": [dict(conversation) for conversation in self.conversations],
+            "total_time_on_camera": self.total_time_on_camera,
+        }
+        if centroid:
+            data["centroid"] = np.asarray(self.centroid, dtype=np.float64).tolist()
+        return data
+
+    @classmethod
+    def from_dict(cls, data, centroid: np.ndarray=None, store_vectors: bool=False, logger=logging.getLogger(),
+                  retention=None):
+        """
+        Restore a subcluster saved with to_dict.
+
+        Args:
+            data: Dict returned by to_dict
+            centroid: Centroid of the subcluster, read from data if None. It is not modified in place,
+                so it can be a row of a read-only memory-mapped array.
+        """
+        if centroid is None:
+            centroid = np.array(data["centroid"], dtype=np.float64)
+        subcluster = cls(centroid, store_vectors=store_vectors, logger=logger, retention=retention)
+        subcluster.retained.clear()  # Stored vectors are not persisted
+        subcluster.vector_count = data["vector_count"]
+        subcluster.last_seen = data["last_seen"]
+        subcluster.current_conversation = dict(data["current_conversation"])
+        subcluster.conversations = [dict(conversation) for conversation in data["conversations"]]
+        subcluster.total_time_on_camera = data["total_time_on_camera"]
+        return subcluster
+
 class Cluster:
     """Class for clusters"""
     def __init__(self, subcluster: Subcluster, logger=logging.getLogger()):
@@ -81,15 +151,78 @@ class Cluster:
 
         self.id = str(uuid.uuid4())
 
+    @property
+    def subclusters(self) -> List[Subcluster]:
+        """Subclusters of the cluster. Do not modify the list directly, use add_subcluster and remove_subcluster."""
+        return self._subclusters
+
+    @subclusters.setter
+    def subclusters(self, subclusters: List[Subcluster]):
+        self._subclusters = list(subclusters)
+        # Subcluster id -> position in subclusters, so that a subcluster is found without scanning the list
+        self._positions: Dict[int, int] = {sc.id: sc_idx for sc_idx, sc in enumerate(self._subclusters)
+                                           if sc is not None}
+
+    def __contains__(self, subcluster: Subcluster):
+        return subcluster.id in self._positions
+
+    def index_of(self, subcluster: Subcluster) -> int:
+        """Return the position of the subcluster in subclusters."""
+        return self._positions[subcluster.id]
+
+    def to_dict(self, centroids=True):
+        """
+        Return the state of the cluster as a JSON serializable dict, see from_dict.
+        Edges between the subclusters are stored as pairs of subcluster indices.
+
+        Args:
+            centroids: Include the centroids of the subclusters, see Subcluster.to_dict
+        """
+        positions = {sc: sc_idx for sc_idx, sc in enumerate(self.subclusters)}
+        edges = sorted((sc_idx, positions[connected]) for sc_idx, sc in enumerate(self.subclusters)
+                       for connected in sc.connected_subclusters
+                       if connected in positions and sc_idx < positions[connected])
+        return {
+            "id": self.id,
+            "subclusters": [sc.to_dict(centroid=centroids) for sc in self.subclusters],
+            "edges": [list(edge) for edge in edges],
+        }
+
     @classmethod
-    def from_dict(cls, dict, logger=logging.getLogger()):
+    def from_dict(cls, dict, centroids=None, store_vectors: bool=False, logger=logging.getLogger(),
+                  new_retention=None):
+        """
+        Restore a cluster saved with to_dict.
+
+        Args:
+            dict: Dict returned by to_dict
+            centroids: Centroids of the subclusters in order, e.g. rows of a snapshot array.
+                If None, the centroids are read from dict.
+            new_retention: Function returning an empty vector store for a subcluster, e.g. LinksCluster.new_retention
+        """
         cluster = cls(subcluster=None, logger=logger)
         cluster.id = dict["id"]
-        cluster.subclusters = [Subcluster.from_dict(subcluster_dict) for subcluster_dict in dict["subclusters"]]
+        cluster.subclusters = [Subcluster.from_dict(subcluster_dict,
+                                                    None if centroids is None else centroids[sc_idx],
+                                                    store_vectors=store_vectors,
+                                                    logger=logger,
+                                                    retention=new_retention() if new_retention else None)
+                               for sc_idx, subcluster_dict in enumerate(dict["subclusters"])]
+        for sc_idx1, sc_idx2 in dict.get("edges", []):
+            LinksCluster.add_edge(cluster.subclusters[sc_idx1], cluster.subclusters[sc_idx2])
         return cluster
 
     def add_subcluster(self, subcluster: Subcluster):
-        self.subclusters.append(subcluster)
+        self._positions[subcluster.id] = len(self._subclusters)
+        self._subclusters.append(subcluster)
+
+    def remove_subcluster(self, subcluster: Subcluster):
+        """Remove the subcluster in constant time. The last subcluster is moved to its position."""
+        sc_idx = self._positions.pop(subcluster.id)
+        last = self._subclusters.pop()
+        if last is not subcluster:
+            self._subclusters[sc_idx] = last
+            self._positions[last.id] = sc_idx
 
     def as_dict(self):
         return {
@@ -98,11 +231,15 @@ class Cluster:
         }
 
     def merge_subclusters(self, sc_idx1, sc_idx2, delete_merged: bool = True):
-        """Merge subcluster_merge into self. Update centroids."""
-        sc_1 = self.subclusters[sc_idx1]
-        sc_2 = self.subclusters[sc_idx2]
-        if sc_1.store_vectors:
-            sc_1.vectors += sc_2.vectors
+        """Merge subcluster sc_idx2 into subcluster sc_idx1. Update centroids."""
+        self.merge(self.subclusters[sc_idx1], self.subclusters[sc_idx2], delete_merged)
+
+    def merge(self, sc_1: Subcluster, sc_2: Subcluster, delete_merged: bool = True):
+        """Merge subcluster sc_2 into subcluster sc_1. Update centroids.
+
+        If delete_merged, sc_2 is removed and the last subcluster is moved to its position.
+        """
+        sc_1.retained.merge(sc_2.retained)
 
         # Update centroid and vector_count
         sc_1.centroid = sc_1.vector_count * sc_1.centroid \
@@ -110,14 +247,13 @@ class Cluster:
             * sc_2.centroid
         sc_1.centroid /= sc_1.vector_count + sc_2.vector_count
         sc_1.vector_count += sc_2.vector_count
-        try:
-            sc_2.connected_subclusters.remove(sc_1)
-            sc_1.connected_subclusters.remove(sc_2)
-        except KeyError:
+        if sc_1 not in sc_2.connected_subclusters:
             sc_1.logger.warning("Attempted to merge unconnected subclusters. "
                             "Merging anyway.")
+        sc_2.connected_subclusters.discard(sc_1)
+        sc_1.connected_subclusters.discard(sc_2)
         for sc in sc_2.connected_subclusters:
-            sc.connected_subclusters.remove(sc_2)
+            sc.connected_subclusters.discard(sc_2)
             if sc_1 not in sc.connected_subclusters and sc != sc_1:
                 sc.connected_subclusters.update({sc_1})
         sc_1.connected_subclusters.update(sc_2.connected_subclusters)
@@ -148,11 +284,8 @@ class Cluster:
                 sc_1.conversations.append(conv_older)
 
         if delete_merged:
-            self.subclusters = self.subclusters[:sc_idx2] \
-                + self.subclusters[sc_idx2 + 1:]
-            for sc in self.subclusters:
-                if sc_2 in sc.connected_subclusters:
-                    sc.connected_subclusters.remove(sc_2)
+            # Edges are symmetric, so the edges to sc_2 were removed from its connected subclusters above
+            self.remove_subcluster(sc_2)
 
     def calculate_conversation_list(self):
         """
@@ -187,56 +320,125 @@ class LinksCluster:
                  subcluster_similarity_threshold: float,
                  pair_similarity_maximum: float,
                  store_vectors=False,
-                 logger=logging.getLogger()
+                 logger=logging.getLogger(),
+                 index="exact",
+                 index_options=None,
+                 vector_retention=None,
+                 retained_vectors=32
                  ):
+        """
+        Args:
+            store_vectors: Store every vector of the subclusters, if vector_retention is None
+            index: Nearest subcluster search, "exact" or "ivf" (approximate), see ann_index.create_index
+            index_options: Keyword arguments of the index, e.g. {"min_size": 10000, "nprobe": 16} for "ivf"
+            vector_retention: Vectors kept per subcluster, "reservoir", "recent", "none" or "all",
+                see vector_retention.create_retention
+            retained_vectors: Maximum number of vectors kept per subcluster with "reservoir" and "recent"
+        """
         self.clusters: List[Cluster] = []
         self.cluster_similarity_threshold = cluster_similarity_threshold
         self.subcluster_similarity_threshold = subcluster_similarity_threshold
         self.pair_similarity_maximum = pair_similarity_maximum
-        self.store_vectors = store_vectors
+        # Stored vectors are bounded by the retention policy, "all" keeps every vector
+        if vector_retention is None:
+            vector_retention = "all" if store_vectors else "none"
+        self.vector_retention = vector_retention
+        self.retained_vectors = retained_vectors
+        self.store_vectors = vector_retention != "none"
+        self.rng = np.random.default_rng()
+        create_retention(vector_retention)  # Raises ValueError for an unknown policy
 
         self.logger=logger
 
+        # Index of the subcluster centroids, so that the nearest subcluster is found without comparing the
+        # vector to every centroid in Python. It is updated when subclusters are created, changed or merged.
+        self.index_kind = index
+        self.index_options = index_options or {}
+        self.index = create_index(index, **self.index_options)
+        self._subcluster_clusters: Dict[Subcluster, int] = {}  # Subcluster -> index of its cluster
+
+        # Indices of the clusters changed since the last IdentityStore.record, so that only they are saved
+        self.changed_clusters: Set[int] = set()
+
+    def new_retention(self):
+        """Return an empty vector store of a new subcluster."""
+        return create_retention(self.vector_retention, self.retained_vectors, self.rng)
+
+    def _index_add(self, subcluster: Subcluster, cl_idx: int):
+        """Add centroid of a new subcluster of cluster cl_idx to the index."""
+        self.index.add(subcluster, subcluster.centroid)
+        self._subcluster_clusters[subcluster] = cl_idx
+
+    def _index_update(self, subcluster: Subcluster):
+        """Update the centroid of a changed subcluster in the index."""
+        self.index.update(subcluster, subcluster.centroid)
+
+    def _index_remove(self, subcluster: Subcluster):
+        """Remove a merged subcluster from the index."""
+        self.index.remove(subcluster)
+        del self._subcluster_clusters[subcluster]
+
+    def rebuild_index(self):
+        """Rebuild the index from the clusters, e.g. after the clusters have been replaced."""
+        self.index = create_index(self.index_kind, **self.index_options)
+        self._subcluster_clusters = {}
+        for cl_idx, cl in enumerate(self.clusters):
+            for sc in cl.subclusters:
+                self._index_add(sc, cl_idx)
+
+    def nearest_subcluster(self, vector: np.ndarray):
+        """Find the subcluster, whose centroid is most similar to vector.
+
+        Returns:
+            tuple
+                (cluster index, subcluster index, cosine similarity), or None if there are no subclusters
+        """
+        result = self.index.search(vector)
+        if result is None:
+            return None
+        subcluster = result[0]
+        cl_idx = self._subcluster_clusters[subcluster]
+        sc_idx = self.clusters[cl_idx].index_of(subcluster)
+        # Similarity of the best match in full precision, so that the thresholds are applied exactly
+        return cl_idx, sc_idx, 1.0 - cosine(vector, subcluster.centroid)
+
     def predict(self, new_vector: np.ndarray) -> dict:
         """Predict a cluster id for new_vector."""
         if len(self.clusters) == 0:
             # Handle first vector
-            self.clusters.append(Cluster(Subcluster(new_vector, store_vectors=self.store_vectors)))
+            subcluster = Subcluster(new_vector, store_vectors=self.store_vectors, retention=self.new_retention())
+            self.clusters.append(Cluster(subcluster))
+            self._index_add(subcluster, 0)
+            self.changed_clusters.add(0)
             return None
 
-        best_subcluster = None
-        best_similarity = -np.inf
-        best_subcluster_cluster_id = None
-        best_subcluster_id = None
-        for cl_idx, cl in enumerate(self.clusters):
-            for sc_idx, sc in enumerate(cl.subclusters):
-                cossim = 1.0 - cosine(new_vector, sc.centroid)
-                if cossim > best_similarity:
-                    best_subcluster = sc
-                    best_similarity = cossim
-                    best_subcluster_cluster_id = cl_idx
-                    best_subcluster_id = sc_idx
+        best_subcluster_cluster_id, best_subcluster_id, best_similarity = self.nearest_subcluster(new_vector)
+        best_subcluster = self.clusters[best_subcluster_cluster_id].subclusters[best_subcluster_id]
+        self.changed_clusters.add(best_subcluster_cluster_id)
         if best_similarity >= self.subcluster_similarity_threshold:  # eq. (20)
             # Add to existing subcluster
             best_subcluster.add(new_vector)
+            self._index_update(best_subcluster)
             assigned_cluster = self.clusters[best_subcluster_cluster_id]
-            self.update_cluster(best_subcluster_cluster_id, best_subcluster_id)
-            # assigned_cluster.update(best_subcluster_id)
+            self._update_subcluster(best_subcluster_cluster_id, best_subcluster)
             self.logger.info("Vector added to excisting sub cluster")
         else:
             # Create new subcluster
-            new_subcluster = Subcluster(new_vector, store_vectors=self.store_vectors)
+            new_subcluster = Subcluster(new_vector, store_vectors=self.store_vectors, retention=self.new_retention())
             cossim = 1.0 - cosine(new_subcluster.centroid, best_subcluster.centroid)
             if cossim >= self.sim_threshold(best_subcluster.vector_count, 1):  # eq. (21)
                 # New subcluster is part of existing cluster
                 self.add_edge(best_subcluster, new_subcluster)
                 self.clusters[best_subcluster_cluster_id].add_subcluster(new_subcluster)
+                self._index_add(new_subcluster, best_subcluster_cluster_id)
                 assigned_cluster = self.clusters[best_subcluster_cluster_id]
                 self.logger.info("New subcluster created as part of existing cluster")
             else:
                 # New subcluster is a new cluster
                 assigned_cluster = Cluster(new_subcluster)
                 self.clusters.append(assigned_cluster)
+                self._index_add(new_subcluster, len(self.clusters) - 1)
+                self.changed_clusters.add(len(self.clusters) - 1)
                 self.logger.info("New subcluster created as a new cluster")
         return assigned_cluster.as_dict()
 
@@ -277,15 +479,19 @@ class LinksCluster:
 
     def merge_subclusters(self, cl_idx, sc_idx1, sc_idx2):
         """Merge subclusters with id's sc_idx1 and sc_idx2 of cluster with id cl_idx."""
+        sc1 = self.clusters[cl_idx].subclusters[sc_idx1]
         sc2 = self.clusters[cl_idx].subclusters[sc_idx2]
-
-        self.clusters[cl_idx].merge_subclusters(sc_idx1, sc_idx2)
-        self.update_cluster(cl_idx, sc_idx1)
-        # self.clusters[cl_idx].subclusters = self.clusters[cl_idx].subclusters[:sc_idx2] \
-        #     + self.clusters[cl_idx].subclusters[sc_idx2 + 1:]
-        # for sc in self.clusters[cl_idx].subclusters:
-        #     if sc2 in sc.connected_subclusters:
-        #         sc.connected_subclusters.remove(sc2)
+        self._merge(cl_idx, sc1, sc2)
+        self._update_subcluster(cl_idx, sc1)
+
+    def _merge(self, cl_idx: int, sc1: Subcluster, sc2: Subcluster):
+        """Merge subcluster sc2 into sc1 of cluster cl_idx and update the index."""
+        self.clusters[cl_idx].merge(sc1, sc2)
+        self.changed_clusters.add(cl_idx)
+        if sc2 in self.index:
+            self._index_remove(sc2)
+        if sc1 in self.index:
+            self._index_update(sc1)
 
     def update_cluster(self, cl_idx: int, sc_idx: int):
         """Update cluster
@@ -304,41 +510,49 @@ class LinksCluster:
             None
 
         """
-        updated_sc = self.clusters[cl_idx].subclusters[sc_idx]
+        self._update_subcluster(cl_idx, self.clusters[cl_idx].subclusters[sc_idx])
+
+    def _update_subcluster(self, cl_idx: int, updated_sc: Subcluster):
+        """Update cluster cl_idx after its subcluster updated_sc has been changed, see update_cluster.
+
+        Subclusters are handled as objects, because merges and splits move the subclusters in the list.
+        """
+        cluster = self.clusters[cl_idx]
         severed_subclusters = []
-        connected_scs = set(updated_sc.connected_subclusters)
-        for connected_sc in connected_scs:
-            connected_sc_idx = None
-            for c_sc_idx, sc in enumerate(self.clusters[cl_idx].subclusters):
-                if sc == connected_sc:
-                    connected_sc_idx = c_sc_idx
-            if connected_sc_idx is None:
-                raise ValueError(f"Connected subcluster of {sc_idx} "
-                                 f"was not found in cluster list of {cl_idx}.")
+        pending = list(updated_sc.connected_subclusters)
+        while pending:
+            connected_sc = pending.pop()
+            if connected_sc not in updated_sc.connected_subclusters:
+                # Merged or disconnected after the connections were listed
+                continue
             cossim = 1.0 - cosine(updated_sc.centroid, connected_sc.centroid)
             if cossim >= self.subcluster_similarity_threshold:
-                self.merge_subclusters(cl_idx, sc_idx, connected_sc_idx)
+                self._merge(cl_idx, updated_sc, connected_sc)
+                # The centroid has changed, so all edges of the merged subcluster are checked again
+                pending = list(updated_sc.connected_subclusters)
             else:
                 are_connected = self.update_edge(updated_sc, connected_sc)
                 if not are_connected:
-                    severed_subclusters.append(connected_sc_idx)
-        for severed_sc_id in severed_subclusters:
-            severed_sc = self.clusters[cl_idx].subclusters[severed_sc_id]
-            if len(severed_sc.connected_subclusters) == 0:
-                for cluster_sc in self.clusters[cl_idx].subclusters:
-                    if cluster_sc != severed_sc:
-                        cossim = 1.0 - cosine(cluster_sc.centroid,
-                                              severed_sc.centroid)
-                        if cossim >= self.sim_threshold(cluster_sc.vector_count,
-                                                        severed_sc.vector_count):
-                            self.add_edge(cluster_sc, severed_sc)
+                    severed_subclusters.append(connected_sc)
+        for severed_sc in severed_subclusters:
+            if severed_sc not in cluster or len(severed_sc.connected_subclusters) > 0:
+                continue
+            for cluster_sc in cluster.subclusters:
+                if cluster_sc != severed_sc:
+                    cossim = 1.0 - cosine(cluster_sc.centroid,
+                                          severed_sc.centroid)
+                    if cossim >= self.sim_threshold(cluster_sc.vector_count,
+                                                    severed_sc.vector_count):
+                        self.add_edge(cluster_sc, severed_sc)
             if len(severed_sc.connected_subclusters) == 0:
-                self.clusters[cl_idx].subclusters = self.clusters[cl_idx].subclusters[:severed_sc_id] \
-                    + self.clusters[cl_idx].subclusters[severed_sc_id + 1:]
+                cluster.remove_subcluster(severed_sc)
                 self.clusters.append(Cluster(severed_sc))
+                self.changed_clusters.update((cl_idx, len(self.clusters) - 1))
+                if severed_sc in self._subcluster_clusters:
+                    self._subcluster_clusters[severed_sc] = len(self.clusters) - 1
 
     def get_all_vectors(self):
-        """Return all stored vectors from entire history.
+        """Return all stored vectors. With a bounded vector_retention, at most retained_vectors per subcluster.
 
         Returns:
             list
@@ -356,6 +570,21 @@ class LinksCluster:
                 all_vectors += scl.vectors
         return all_vectors
 
+    def memory_report(self):
+        """Return memory held by the centroids and stored vectors of every cluster (identity).
+
+        Returns:
+            list
+                dict per cluster: {"id": cluster id, "subclusters": number of subclusters,
+                "vectors": number of stored vectors, "bytes": bytes held}
+        """
+        return [{
+            "id": cl.id,
+            "subclusters": len(cl.subclusters),
+            "vectors": sum(len(sc.retained) for sc in cl.subclusters),
+            "bytes": sum(sc.nbytes for sc in cl.subclusters),
+        } for cl in self.clusters]
+
     def sim_threshold(self, k: int, kp: int) -> float:
         """Compute the similarity threshold.
 
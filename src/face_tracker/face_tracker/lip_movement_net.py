@@ -47,7 +47,9 @@ import numpy as np
 import cv2
 import dlib
 import math
+import copy
 import csv
+import threading
 from queue import Queue
 
 
@@ -715,8 +717,25 @@ class LipMovementDetector(object):
     def __init__(self, model_path, shape_predictor):
         self.input_sequence = Queue(FRAME_SEQ_LEN)
         self.model = load_model(model_path)
+        self.model_lock = threading.Lock()
         self.shape_predictor = shape_predictor
 
+    def warm_up(self):
+        """
+        Run the model once on a dummy sequence, so that the first real prediction does not pay for graph compilation.
+        """
+        with self.model_lock:
+            self.model.predict_on_batch(np.zeros((1, FRAME_SEQ_LEN, NUM_FEATURES)))
+
+    def share(self):
+        """
+        Return a detector with its own input sequences, that shares the model and the shape predictor
+        of this detector. Used for detecting lip movement on multiple cameras with one copy of the model.
+        """
+        detector = copy.copy(self)
+        detector.input_sequence = Queue(FRAME_SEQ_LEN)
+        return detector
+
     def initialize_input_sequence(self, num_of_faces):
         """
         Initialize input sequence to have an input queue for each face.
@@ -738,6 +757,13 @@ class LipMovementDetector(object):
         Test the video frame to see if the face in the bounding box is speaking or silent.
         """
         facial_points_vector = self.get_facial_landmark_vectors_from_bounding_box(frame, bounding_box)
+        return self.classify_landmarks(facial_points_vector, face_idx)
+
+    def classify_landmarks(self, facial_points_vector, face_idx):
+        """
+        Add facial landmarks of the face to its input sequence and classify the sequence as speaking or silent.
+        Landmarks are calculated separately with get_facial_landmark_vectors_from_bounding_box.
+        """
         if not facial_points_vector:
             return 'silent'
 
@@ -772,7 +798,8 @@ class LipMovementDetector(object):
             X_data = np.array([arr])
 
             # y_pred is already categorized
-            y_pred = self.model.predict_on_batch(X_data)
+            with self.model_lock:
+                y_pred = self.model.predict_on_batch(X_data)
 
             # convert y_pred from categorized continuous to single label
             y_pred_max = y_pred[0].argmax()
@@ -0,0 +1,77 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Decides if a frame has to be analyzed, by comparing heavily downscaled grayscale copies of consecutive frames.
+
+    While there is motion or faces are tracked, every frame is analyzed. When the scene has been static
+    for hold_time seconds and no faces are tracked, the gate goes idle and lets through only one frame every
+    idle_interval seconds, so that e.g. a person standing still in front of the camera is still found.
+    The gate wakes up on the first frame with motion.
+    """
+
+    def __init__(self, threshold=20, min_area=0.005, idle_interval=1.0, hold_time=2.0, width=64):
+        """
+        Args:
+            threshold: Minimum gray level difference of a pixel to count as changed.
+            min_area: Minimum fraction of changed pixels to count as motion.
+            idle_interval: Time between analyzed frames in seconds, when the gate is idle.
+            hold_time: Time without motion in seconds, before the gate goes idle.
+            width: Width of the downscaled frames in pixels.
+        """
+        self.threshold = threshold
+        self.min_area = min_area
+        self.idle_interval = idle_interval
+        self.hold_time = hold_time
+        self.width = width
+
+        self._previous = None
+        self.last_motion_time = None
+        self.last_open_time = None
+
+        self.idle = False
+        self.woke_up = False  # True if the gate woke up on the latest frame
+        self.motion_area = 0.0  # Fraction of changed pixels in the latest frame
+        self.skipped_frames = 0
+        self.wake_ups = 0
+
+    def update(self, frame, tracking=False, now=None):
+        """
+        Update the gate with a new BGR frame. Returns True if the frame should be analyzed.
+
+        Args:
+            frame: BGR image
+            tracking: True if faces are currently tracked. Tracked faces keep the gate open.
+            now: Current time in seconds, defaults to time.monotonic().
+        """
+        if now is None:
+            now = time.monotonic()
+
+        height = max(1, int(round(frame.shape[0] * self.width / frame.shape[1])))
+        small = cv2.cvtColor(cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA),
+                             cv2.COLOR_BGR2GRAY)
+        if self._previous is None or self._previous.shape != small.shape:
+            self.motion_area = 1.0
+        else:
+            changed = cv2.absdiff(small, self._previous) > self.threshold
+            self.motion_area = np.count_nonzero(changed) / changed.size
+        self._previous = small
+
+        if tracking or self.motion_area >= self.min_area:
+            self.last_motion_time = now
+
+        idle = now - self.last_motion_time >= self.hold_time
+        self.woke_up = self.idle and not idle
+        if self.woke_up:
+            self.wake_ups += 1
+        self.idle = idle
+
+        if not idle or now - self.last_open_time >= self.idle_interval:
+            self.last_open_time = now
+            return True
+        self.skipped_frames += 1
+        return False
@@ -0,0 +1,158 @@
+import os
+import urllib.request
+
+import cv2
+import numpy as np
+
+from .face_boxes import non_max_suppression
+
+# Same files that DeepFace downloads for its yunet detector and SFace model, so they are shared
+WEIGHTS_DIR = os.path.join(os.getenv("DEEPFACE_HOME", os.path.expanduser("~")), ".deepface", "weights")
+YUNET_WEIGHTS = "face_detection_yunet_2023mar.onnx"
+YUNET_URL = "https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/" + YUNET_WEIGHTS
+SFACE_WEIGHTS = "face_recognition_sface_2021dec.onnx"
+SFACE_URL = "https://github.com/opencv/opencv_zoo/raw/main/models/face_recognition_sface/" + SFACE_WEIGHTS
+
+
+class OpenCVFaceRecognizer(object):
+    """
+    Face detection and recognition with OpenCV cv2.FaceDetectorYN (YuNet) and cv2.FaceRecognizerSF (SFace).
+
+    Has the interface of FaceRecognizer for the default yunet + SFace configuration, and runs the same models
+    with OpenCV directly instead of through DeepFace. It has not been measured to be faster than DeepFace,
+    compare the backends with benchmarks/benchmark_face_recognition_backend.py on the target machine.
+    Detected faces are aligned to the 112x112 SFace input by their landmarks already in extract_faces,
+    so represent only runs the model.
+    """
+
+    def __init__(self, db_path, logger, model_name="SFace", detector_backend="yunet", detection_scales=(1.0,),
+                 score_threshold=0.9):
+        """
+        Args:
+            db_path: Not used, for compatibility with FaceRecognizer
+            logger: Logger
+            model_name, detector_backend: Must be "SFace" and "yunet"
+            detection_scales: Scales of the image, where faces are detected, see FaceRecognizer
+            score_threshold: Minimum detection confidence, the same as the DeepFace yunet default
+        """
+        if model_name != "SFace" or detector_backend != "yunet":
+            raise ValueError(f"OpenCV backend supports only yunet detector and SFace model, "
+                             f"got {detector_backend} and {model_name}")
+        self.logger = logger
+        self.db_path = db_path
+        self.model_name = model_name
+        self.detector_backend = detector_backend
+        self.detection_scales = list(detection_scales)
+
+        self.detector = cv2.FaceDetectorYN.create(self._weights(YUNET_WEIGHTS, YUNET_URL), "", (320, 320),
+                                                  score_threshold=score_threshold)
+        self.model = cv2.FaceRecognizerSF.create(self._weights(SFACE_WEIGHTS, SFACE_URL), "")
+        self.target_size = (112, 112)
+
+        self.logger.info("OpenCVFaceRecognizer initialized!")
+
+    def _weights(self, filename, url):
+        """
+        Return path of the weights file. Downloads the file, if it does not exist.
+        """
+        path = os.path.join(WEIGHTS_DIR, filename)
+        if not os.path.isfile(path):
+            self.logger.info(f"Downloading {url} to {path}")
+            os.makedirs(WEIGHTS_DIR, exist_ok=True)
+            urllib.request.urlretrieve(url, path + ".part")
+            os.replace(path + ".part", path)
+        return path
+
+    def warm_up(self, frame_shape=(480, 640, 3)):
+        """
+        Run the detector and the recognition model once on dummy images.
+        """
+        self.extract_faces(np.zeros(frame_shape, dtype=np.uint8))
+        self.represent_batch([np.zeros((*self.target_size, 3), dtype=np.float32)])
+
+    def extract_faces(self, img, detection_scales=None, frame_height=None):
+        """
+        Extract faces from BGR image. Discards small faces.
+
+        Args:
+            detection_scales: Scales of the image, where faces are detected. Defaults to self.detection_scales
+            frame_height: Faces wider than 0.8 times frame_height are discarded. Defaults to the image height,
+                give the height of the full frame, when img is a region of it.
+        Returns the same structure as FaceRecognizer.extract_faces, a list of dictionaries with keys:
+
+        - "face" (np.ndarray): The face aligned to the SFace input, RGB with values in [0, 1].
+
+        - "facial_area" (Dict[str, Any]): keys 'x', 'y', 'w', 'h' with int values
+            and keys 'left_eye', 'right_eye' with a tuple of 2 ints as values
+
+        - "confidence" (float): The confidence score associated with the detected face.
+        """
+        if detection_scales is None:
+            detection_scales = self.detection_scales
+        if frame_height is None:
+            frame_height = img.shape[0]
+
+        face_objs = []
+        for scale in detection_scales:
+            face_objs += self._extract_faces_scaled(img, scale)
+
+        if len(detection_scales) > 1:
+            # The same face is usually found on multiple scales
+            face_objs = non_max_suppression(face_objs)
+
+        return [face_obj for face_obj in face_objs if face_obj["facial_area"]["w"] < frame_height * 0.8]
+
+    def _extract_faces_scaled(self, img, scale):
+        """
+        Detect faces from image resized by scale. Landmarks are mapped back to the full resolution image
+        and faces are aligned from the full resolution image.
+        """
+        small_img = img
+        if scale != 1.0:
+            small_img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        height, width = small_img.shape[:2]
+        self.detector.setInputSize((width, height))
+        _, detections = self.detector.detect(small_img)
+        if detections is None:
+            return []
+
+        face_objs = []
+        for detection in detections:
+            # x, y, w, h, right eye, left eye, nose tip, right and left mouth corner, score
+            detection = detection.copy()
+            detection[:14] /= scale
+            x, y, w, h = (int(value) for value in detection[:4])
+            x, y = max(x, 0), max(y, 0)
+            aligned = self.model.alignCrop(img, detection)
+            face_objs.append({
+                "face": (aligned[:, :, ::-1] / 255).astype(np.float32),
+                "facial_area": {
+                    "x": x,
+                    "y": y,
+                    "w": w,
+                    "h": h,
+                    "left_eye": (int(detection[6]), int(detection[7])),
+                    "right_eye": (int(detection[4]), int(detection[5])),
+                },
+                "confidence": float(detection[14]),
+            })
+        return face_objs
+
+    def represent(self, img):
+        """
+        Calculate vector representation for one face image (RGB, values in [0, 1], like extract_faces returns).
+        """
+        if len(img.shape) == 4:
+            img = img[0]
+        if img.shape[:2] != self.target_size[::-1]:
+            img = cv2.resize(img, self.target_size)
+        # Rounded, so that the aligned uint8 face of extract_faces is restored exactly
+        bgr = np.ascontiguousarray(np.clip(np.rint(img[:, :, ::-1] * 255), 0, 255).astype(np.uint8))
+        return self.model.feature(bgr)[0].tolist()
+
+    def represent_batch(self, imgs):
+        """
+        Calculate vector representations for all faces of a frame. FaceRecognizerSF embeds one face per call.
+        """
+        return [self.represent(img) for img in imgs]
@@ -0,0 +1,174 @@
+"""
+Closed loop control of the face tracker quality for a target frame rate.
+"""
+from collections import defaultdict
+
+# Processing stages (see instrumentation.STAGES), whose cost each group of quality settings controls
+STAGE_GROUPS = {
+    "detection": ["detection", "embedding", "clustering"],
+    "lip": ["grayscale", "lip_landmarks", "lip_rnn"],
+    "debug_image": ["drawing", "debug_image"],
+}
+
+
+class QualitySetting:
+    """
+    One adjustable quality setting. values are ordered from the best quality to the cheapest.
+    """
+
+    def __init__(self, name, group, values):
+        self.name = name
+        self.group = group
+        self.values = values
+        self.level = 0
+
+    @property
+    def value(self):
+        return self.values[self.level]
+
+    @property
+    def exhausted(self):
+        return self.level >= len(self.values) - 1
+
+
+class QualityController:
+    """
+    Lowers the quality of the face tracker when frames take longer to process than the target frame rate allows,
+    and restores it when there is enough time left.
+
+    The load is the mean processing time of a frame relative to the frame time of the target frame rate.
+    When the load stays above high_load, the setting of the most expensive stage group (detection,
+    lip movement detection or debug image) is lowered one level. When the load stays below low_load even
+    after adding the time saved by the latest lowering, that lowering is undone.
+
+    Settings:
+        detection_scale_factor: Multiplier of the detection scales
+        detection_interval_max: Maximum number of frames between detections (with correlation tracking)
+        lip_stride: Lip movement is detected on every lip_stride-th frame
+        debug_image_rate: Maximum rate of the debug image in Hz, 0 for every frame
+    """
+
+    def __init__(self, target_fps, detection_interval_max=5, correlation_tracking=True, lip_movement_detection=True,
+                 debug_image_rate=0.0, high_load=1.1, low_load=0.8, lower_after=2, raise_after=5):
+        """
+        Args:
+            target_fps: Target frame rate
+            detection_interval_max, debug_image_rate: Configured values, used as the best quality
+            correlation_tracking: Detection interval is adjusted only with correlation tracking
+            lip_movement_detection: Lip stride is adjusted only with lip movement detection
+            high_load, low_load: Load limits for lowering and raising the quality
+            lower_after, raise_after: Number of consecutive measurements over or under the limits
+                before the quality is changed
+        """
+        self.target_fps = target_fps
+        self.high_load = high_load
+        self.low_load = low_load
+        self.lower_after = lower_after
+        self.raise_after = raise_after
+
+        self.settings = {}
+        if correlation_tracking:
+            self._add("detection_interval_max", "detection", [detection_interval_max * m for m in (1, 2, 4)])
+        self._add("detection_scale_factor", "detection", [1.0, 0.75, 0.5])
+        if lip_movement_detection:
+            self._add("lip_stride", "lip", [1, 2, 3, 4])
+        rates = [rate for rate in (10.0, 5.0, 2.0, 1.0) if debug_image_rate <= 0 or rate < debug_image_rate]
+        self._add("debug_image_rate", "debug_image", [debug_image_rate] + rates)
+
+        # Lowered settings as (setting, load before lowering, time saved per frame), the latest last
+        self.history = []
+
+        self.load = None
+        self.group_costs = {}
+        self._over = 0
+        self._under = 0
+        self._frames = 0
+        self._frame_time = 0.0
+        self._stage_time = defaultdict(float)
+
+    def _add(self, name, group, values):
+        self.settings[name] = QualitySetting(name, group, values)
+
+    def value(self, name):
+        """
+        Return the current value of the setting, or None if the setting is not controlled.
+        """
+        setting = self.settings.get(name)
+        return setting.value if setting is not None else None
+
+    def add_frame(self, frame_time, stage_durations):
+        """
+        Add measurement of one processed frame.
+
+        Args:
+            frame_time: Processing time of the frame in seconds
+            stage_durations: Dictionary stage -> seconds spent in the stage, see StageTimer.end_frame
+        """
+        self._frames += 1
+        self._frame_time += frame_time
+        for stage, duration in stage_durations.items():
+            self._stage_time[stage] += duration
+
+    def update(self, fps=None):
+        """
+        Evaluate the frames added since the previous update, and change the quality if needed.
+        Call periodically, e.g. once per fps measurement.
+
+        Returns: List of decision strings describing the changed settings, empty if nothing changed.
+        """
+        if self._frames == 0:
+            return []
+
+        frame_time = self._frame_time / self._frames
+        self.load = frame_time * self.target_fps
+        self.group_costs = {group: sum(self._stage_time[stage] for stage in stages) / self._frames
+                            for group, stages in STAGE_GROUPS.items()}
+        self._frames = 0
+        self._frame_time = 0.0
+        self._stage_time = defaultdict(float)
+
+        # The time saved by the latest lowering is known after the first measurement with it
+        if self.history and self.history[-1][2] is None:
+            setting, load_before, _ = self.history[-1]
+            self.history[-1] = (setting, load_before, max(0.0, (load_before - self.load) / self.target_fps))
+
+        self._over = self._over + 1 if self.load > self.high_load else 0
+        restore_load = self.load + self.target_fps * self.history[-1][2] if self.history else None
+        self._under = self._under + 1 if restore_load is not None and restore_load < self.low_load else 0
+
+        fps_text = f"fps={fps:.1f} " if fps is not None else ""
+        status = f"{fps_text}load={self.load:.2f} (target {self.target_fps:g} fps)"
+
+        if self._over >= self.lower_after:
+            self._over = 0
+            setting = self._setting_to_lower()
+            if setting is None:
+                return []
+            old = setting.value
+            setting.level += 1
+            self.history.append((setting, self.load, None))
+            cost = self.group_costs[setting.group] * self.target_fps
+            return [f"lowered {setting.name} {old} -> {setting.value}: {status}, "
+                    f"{setting.group} takes {100 * cost:.0f}% of the frame time"]
+
+        if self._under >= self.raise_after:
+            self._under = 0
+            setting, _, _ = self.history.pop()
+            old = setting.value
+            setting.level -= 1
+            return [f"raised {setting.name} {old} -> {setting.value}: {status}, "
+                    f"expected load {restore_load:.2f}"]
+
+        return []
+
+    def _setting_to_lower(self):
+        """
+        Return the setting of the most expensive stage group, that can still be lowered.
+        Within a group, the least lowered setting is chosen.
+        """
+        candidates = [setting for setting in self.settings.values() if not setting.exhausted]
+        if not candidates:
+            return None
+        groups = [group for group in STAGE_GROUPS if any(setting.group == group for setting in candidates)]
+        group = max(groups, key=lambda g: self.group_costs.get(g, 0.0))
+        return min((setting for setting in candidates if setting.group == group), key=lambda s: s.level)
@@ -0,0 +1,229 @@
+"""
+Offline replay benchmark of the FaceAnalyzer pipeline.
+
+Feeds a video file or a directory of frames through FaceAnalyzer.on_frame_received without ROS,
+and reports per-stage timings, fps and frame latency percentiles as JSON. Frames are processed
+as fast as possible, so the results of different configurations can be compared on the same recording.
+
+Usage:
+    ros2 run face_tracker face_tracker_replay recording.mp4 --correlation-tracking --detection-interval-max 10
+    python3 -m face_tracker.replay frames/ --predictor shape_predictor_68_face_landmarks.dat -o result.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import cv2
+import dlib
+import numpy as np
+
+from .face_analyzer import FaceAnalyzer, FACE_RECOGNITION_BACKENDS
+from .ann_index import INDEXES
+from .instrumentation import STAGES, StageTimer
+
+DEFAULT_LIP_MOVEMENT_MODEL = "1_32_False_True_0.25_lip_motion_net_model.h5"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def lip_movement_model_path(model):
+    """
+    Return the path of a lip movement model file, or of a model installed in the models directory
+    of the face_tracker package, like the lip_movement_detector parameter of the node.
+    """
+    if os.path.isfile(model):
+        return model
+    from ament_index_python.packages import get_package_share_directory
+    return os.path.join(get_package_share_directory("face_tracker"), "models", model)
+
+
+def read_frames(path, width=0):
+    """
+    Yield BGR frames from a video file or from the image files of a directory in name order.
+    """
+    def resize(frame):
+        if width and frame.shape[1] != width:
+            frame = cv2.resize(frame, (width, int(frame.shape[0] * width / frame.shape[1])))
+        return frame
+
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                frame = cv2.imread(os.path.join(path, name))
+                if frame is not None:
+                    yield resize(frame)
+        return
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Could not open {path}")
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield resize(frame)
+    finally:
+        cap.release()
+
+
+def percentiles_ms(samples):
+    """Return summary of durations (s) in milliseconds."""
+    if not samples:
+        return None
+    samples_ms = 1000 * np.asarray(samples)
+    p50, p95, p99 = np.percentile(samples_ms, [50, 95, 99])
+    return {
+        "mean": float(samples_ms.mean()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "max": float(samples_ms.max()),
+    }
+
+
+def replay(analyzer, frames, max_frames=0, warmup_frames=5, draw=False):
+    """
+    Run frames through analyzer. Returns dictionary of results.
+    Timings of the first warmup_frames frames are not included.
+    """
+    stage_timer = analyzer.stage_timer
+    latencies = []
+    faces = []
+    processed = 0
+    start = None
+    for frame in frames:
+        if processed == warmup_frames:
+            stage_timer.reset()
+            start = time.perf_counter()
+
+        frame_start = time.perf_counter()
+        faces.append(len(analyzer.on_frame_received(frame, draw=draw)))
+        if processed >= warmup_frames:
+            latencies.append(time.perf_counter() - frame_start)
+
+        processed += 1
+        if max_frames and processed >= max_frames:
+            break
+
+    if start is None:
+        raise ValueError(f"Not enough frames, got {processed} frames and {warmup_frames} are used for warm-up")
+
+    wall_time = time.perf_counter() - start
+    measured_frames = len(latencies)
+
+    stages = {}
+    for stage in STAGES + sorted(set(stage_timer.samples) - set(STAGES)):
+        samples = stage_timer.samples.get(stage)
+        if not samples:
+            continue
+        stages[stage] = {
+            "calls": len(samples),
+            "total_ms": 1000 * float(np.sum(samples)),
+            "per_frame_ms": 1000 * float(np.sum(samples)) / measured_frames,
+            "call_ms": percentiles_ms(samples),
+        }
+
+    return {
+        "frames": measured_frames,
+        "warmup_frames": warmup_frames,
+        "wall_time_s": wall_time,
+        "fps": measured_frames / wall_time,
+        "frame_latency_ms": percentiles_ms(latencies),
+        "mean_faces": float(np.mean(faces)),
+        "stages": stages,
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="video file or directory of frames")
+    parser.add_argument("-o", "--output", help="write JSON result to file instead of stdout")
+    parser.add_argument("--max-frames", type=int, default=0, help="0 for all frames")
+    parser.add_argument("--warmup-frames", type=int, default=5)
+    parser.add_argument("--width", type=int, default=1280, help="resize frames to this width, 0 to keep size")
+    parser.add_argument("--draw", action="store_true", help="draw face information to the frames")
+    parser.add_argument("--no-face-recognition", dest="face_recognition", action="store_false",
+                        help="disable face detection and recognition, to measure the rest of the pipeline")
+    parser.add_argument("--face-recognition-backend", default="deepface", choices=FACE_RECOGNITION_BACKENDS)
+    parser.add_argument("--face-recognition-model", default="SFace")
+    parser.add_argument("--face-detection-model", default="yunet")
+    parser.add_argument("--detection-scale", type=float, nargs="+", default=[1.0],
+                        help="detection scale, or multiple scales for a pyramid")
+    parser.add_argument("--correlation-tracking", action="store_true")
+    parser.add_argument("--async-detection", action="store_true")
+    parser.add_argument("--detection-interval-min", type=int, default=1)
+    parser.add_argument("--detection-interval-max", type=int, default=5)
+    parser.add_argument("--tracking-confidence-threshold", type=float, default=7.0)
+    parser.add_argument("--detection-max-age", type=float, default=1.0)
+    parser.add_argument("--tracking-workers", type=int, default=0)
+    parser.add_argument("--embedding-workers", type=int, default=0)
+    parser.add_argument("--roi-detection", action="store_true")
+    parser.add_argument("--roi-margin", type=float, default=1.0)
+    parser.add_argument("--full-scan-interval", type=int, default=5)
+    parser.add_argument("--cluster-similarity-threshold", type=float, default=0.3)
+    parser.add_argument("--subcluster-similarity-threshold", type=float, default=0.2)
+    parser.add_argument("--pair-similarity-maximum", type=float, default=1.0)
+    parser.add_argument("--cluster-index", default="exact", choices=INDEXES)
+    parser.add_argument("--predictor", help="dlib shape predictor file, enables lip movement detection")
+    parser.add_argument("--lip-movement-detector", default=DEFAULT_LIP_MOVEMENT_MODEL,
+                        help="lip movement model file, or name of a model installed with the package")
+    parsed = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger("face_tracker_replay")
+
+    lip_movement_detector = None
+    if parsed.predictor:
+        from .lip_movement_net import LipMovementDetector
+        lip_movement_detector = LipMovementDetector(lip_movement_model_path(parsed.lip_movement_detector),
+                                                    dlib.shape_predictor(parsed.predictor))
+
+    analyzer = FaceAnalyzer(logger,
+                            lip_movement_detector,
+                            parsed.face_recognition,
+                            parsed.correlation_tracking,
+                            parsed.cluster_similarity_threshold,
+                            parsed.subcluster_similarity_threshold,
+                            parsed.pair_similarity_maximum,
+                            parsed.face_recognition_model,
+                            parsed.face_detection_model,
+                            parsed.async_detection,
+                            parsed.detection_scale,
+                            parsed.detection_interval_min,
+                            parsed.detection_interval_max,
+                            parsed.tracking_confidence_threshold,
+                            parsed.detection_max_age,
+                            parsed.tracking_workers,
+                            StageTimer(enabled=True, keep_samples=True),
+                            parsed.face_recognition_backend,
+                            parsed.roi_detection,
+                            parsed.roi_margin,
+                            parsed.full_scan_interval,
+                            parsed.embedding_workers,
+                            cluster_index=parsed.cluster_index)
+    try:
+        result = replay(analyzer,
+                        read_frames(parsed.input, parsed.width),
+                        max_frames=parsed.max_frames,
+                        warmup_frames=parsed.warmup_frames,
+                        draw=parsed.draw)
+    finally:
+        analyzer.shutdown()
+
+    config = vars(parsed).copy()
+    config.pop("output")
+    result = {"input": parsed.input, "config": config, **result}
+
+    if parsed.output:
+        with open(parsed.output, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
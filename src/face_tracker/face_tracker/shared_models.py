@@ -0,0 +1,124 @@
+import threading
+import time
+
+
+class EmbeddingBatcher:
+    """
+    Combines the embedding requests of multiple camera threads into one model call.
+
+    The first thread that requests embeddings waits up to max_wait seconds for the other cameras to join
+    the batch, and then calculates the embeddings of all requests with one represent_batch call.
+    The other threads wait for their part of the result. Only one batch is calculated at a time,
+    requests that arrive meanwhile are collected to the next batch.
+    """
+
+    def __init__(self, represent_batch, cameras, max_wait=0.005):
+        """
+        Args:
+            represent_batch: Function that returns the representations of a list of face images
+            cameras: Number of cameras, a batch is started immediately when every camera has joined it
+            max_wait: Maximum time in seconds to wait for the other cameras
+        """
+        self._represent_batch = represent_batch
+        self.cameras = cameras
+        self.max_wait = max_wait
+        self._condition = threading.Condition()
+        self._model_lock = threading.Lock()
+        self._requests = []
+
+        self.batches = 0  # Number of model calls
+        self.requests = 0  # Number of combined requests
+
+    def represent_batch(self, imgs):
+        """
+        Calculate representations of face images, like FaceRecognizer.represent_batch.
+        Blocks until the batch containing the images has been calculated.
+        """
+        if len(imgs) == 0:
+            return []
+        request = {"imgs": imgs, "result": None, "error": None, "done": False}
+        with self._condition:
+            self._requests.append(request)
+            leader = len(self._requests) == 1
+            if not leader:
+                self._condition.notify_all()
+                while not request["done"]:
+                    self._condition.wait()
+            else:
+                deadline = time.monotonic() + self.max_wait
+                while len(self._requests) < self.cameras:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+        if leader:
+            self._run_batch()
+
+        if request["error"] is not None:
+            raise request["error"]
+        return request["result"]
+
+    def _run_batch(self):
+        """
+        Calculate the pending requests with one model call. Requests that join while the previous
+        batch is running are included.
+        """
+        with self._model_lock:
+            with self._condition:
+                requests = self._requests
+                self._requests = []
+            try:
+                representations = self._represent_batch([img for request in requests for img in request["imgs"]])
+                error = None
+            except Exception as e:
+                representations = None
+                error = e
+
+        with self._condition:
+            start = 0
+            for request in requests:
+                if error is None:
+                    request["result"] = representations[start:start + len(request["imgs"])]
+                    start += len(request["imgs"])
+                else:
+                    request["error"] = error
+                request["done"] = True
+            self.batches += 1
+            self.requests += len(requests)
+            self._condition.notify_all()
+
+
+class SharedFaceRecognizer:
+    """
+    View of a face recognizer shared by multiple cameras. Each camera has its own detection scales,
+    detection is serialized with a lock and embeddings are combined across cameras by an EmbeddingBatcher.
+    Has the interface of FaceRecognizer used by FaceAnalyzer.
+    """
+
+    def __init__(self, face_recognizer, detection_lock, batcher):
+        """
+        Args:
+            face_recognizer: FaceRecognizer or OpenCVFaceRecognizer shared by the cameras
+            detection_lock: Lock shared by the views of the face recognizer
+            batcher: EmbeddingBatcher shared by the views of the face recognizer
+        """
+        self.face_recognizer = face_recognizer
+        self.detection_lock = detection_lock
+        self.batcher = batcher
+        self.detection_scales = list(face_recognizer.detection_scales)
+
+    def extract_faces(self, img, detection_scales=None, frame_height=None):
+        """
+        Detect faces with the detection scales of this camera, see FaceRecognizer.extract_faces.
+        """
+        with self.detection_lock:
+            self.face_recognizer.detection_scales = self.detection_scales
+            return self.face_recognizer.extract_faces(img, detection_scales, frame_height)
+
+    def represent_batch(self, imgs):
+        return self.batcher.represent_batch(imgs)
+
+    def warm_up(self, frame_shape=(480, 640, 3)):
+        with self.detection_lock:
+            self.face_recognizer.warm_up(frame_shape)
@@ -0,0 +1,144 @@
+"""
+Tests for ExactIndex and IVFIndex classes.
+"""
+import threading
+
+import numpy as np
+import pytest
+
+from ann_index import ExactIndex, IVFIndex, create_index
+from test_utils import face_vectors
+
+
+def exact_nearest(vectors, query):
+    """Return index of the vector with the highest cosine similarity to the query."""
+    vectors = np.asarray(vectors)
+    similarities = vectors @ query / np.linalg.norm(vectors, axis=1) / np.linalg.norm(query)
+    return int(np.argmax(similarities))
+
+
+class TestExactIndex:
+    """Tests for ExactIndex class."""
+
+    def test_search(self):
+        """Test that search finds the most similar vector after adds, updates and removes."""
+        rng = np.random.default_rng(0)
+        index = ExactIndex(capacity=4)
+        vectors = {}
+        for key in range(50):
+            vectors[key] = rng.standard_normal(16)
+            index.add(key, vectors[key])
+        for key in range(0, 50, 3):
+            vectors[key] = rng.standard_normal(16)
+            index.update(key, vectors[key])
+        for key in range(0, 50, 4):
+            index.remove(key)
+            del vectors[key]
+
+        assert len(index) == len(vectors)
+        keys = list(vectors)
+        for _ in range(20):
+            query = rng.standard_normal(16)
+            key, similarity = index.search(query)
+            expected = keys[exact_nearest([vectors[key] for key in keys], query)]
+            assert key == expected
+            assert similarity == pytest.approx(vectors[key] @ query / np.linalg.norm(vectors[key])
+                                               / np.linalg.norm(query), abs=1e-5)
+
+    def test_empty(self):
+        """Test that an empty index finds nothing."""
+        assert ExactIndex().search(np.ones(4)) is None
+
+
+class TestIVFIndex:
+    """Tests for IVFIndex class."""
+
+    def test_exact_below_min_size(self):
+        """Test that a small index is not trained and finds the same vectors as exact search."""
+        rng = np.random.default_rng(1)
+        vectors = face_vectors(rng, 200, identities=100, noise=0.3)
+        index = IVFIndex(min_size=1000)
+        for key, vector in enumerate(vectors):
+            index.add(key, vector)
+        assert not index.trained
+        for query in face_vectors(rng, 20, identities=100, noise=0.3):
+            assert index.search(query)[0] == exact_nearest(vectors, query)
+
+    def test_recall(self):
+        """Test that a trained index finds the nearest vector of most queries."""
+        rng = np.random.default_rng(2)
+        vectors = face_vectors(rng, 3000, identities=100, noise=0.3)
+        index = IVFIndex(min_size=1000, nprobe=8, background=False)
+        for key, vector in enumerate(vectors):
+            index.add(key, vector)
+        assert index.trained
+        assert len(index.lists) > 1
+
+        queries = face_vectors(rng, 200, identities=100, noise=0.3)
+        recall = np.mean([index.search(query)[0] == exact_nearest(vectors, query) for query in queries])
+        assert recall >= 0.9
+
+    def test_update_remove(self):
+        """Test that updated vectors move to the list of their nearest centroid, and removed keys are not found."""
+        rng = np.random.default_rng(3)
+        vectors = dict(enumerate(face_vectors(rng, 1500, identities=100, noise=0.3)))
+        index = IVFIndex(min_size=1000, nprobe=4, background=False)
+        for key, vector in vectors.items():
+            index.add(key, vector)
+        for key in range(0, 1500, 7):
+            vectors[key] = rng.standard_normal(32)
+            index.update(key, vectors[key])
+        for key in range(0, 1500, 5):
+            index.remove(key)
+            del vectors[key]
+
+        assert len(index) == len(vectors) == sum(len(lst) for lst in index.lists)
+        for key, vector in vectors.items():
+            list_index = index._list_of[key]
+            assert key in index.lists[list_index]
+            np.testing.assert_allclose(index.vector(key), vector / np.linalg.norm(vector), rtol=1e-5, atol=1e-6)
+        for key in range(0, 1500, 7):
+            if key in vectors:
+                # An updated vector is found with itself as the query
+                assert index.search(vectors[key])[0] == key
+
+    def test_background_training(self):
+        """
+        Test that the lists serve queries during background training, and that the keys added, updated
+        and removed during training are in the right lists after the swap.
+        """
+        rng = np.random.default_rng(4)
+        vectors = dict(enumerate(face_vectors(rng, 1500, identities=100, noise=0.3)))
+        index = IVFIndex(min_size=1000, nprobe=4)
+        release = threading.Event()
+        train = index._train
+        index._train = lambda *args: release.wait() and train(*args)
+
+        for key, vector in vectors.items():
+            index.add(key, vector)
+        assert not index.trained
+        for key in range(0, 1500, 7):
+            vectors[key] = rng.standard_normal(32)
+            index.update(key, vectors[key])
+        for key in range(0, 1500, 5):
+            index.remove(key)
+            del vectors[key]
+        keys = list(vectors)
+        for query in face_vectors(rng, 20, identities=100, noise=0.3):
+            assert index.search(query)[0] == keys[exact_nearest([vectors[key] for key in keys], query)]
+
+        release.set()
+        index.wait()
+        assert index.trained
+        assert index.trained_size == 1000
+        assert len(index) == len(vectors) == sum(len(lst) for lst in index.lists)
+        for key, vector in vectors.items():
+            list_index = index._list_of[key]
+            assert key in index.lists[list_index]
+            assert list_index == int(np.argmax(index.centroids @ index.vector(key)))
+            np.testing.assert_allclose(index.vector(key), vector / np.linalg.norm(vector), rtol=1e-5, atol=1e-6)
+
+    def test_unknown_index(self):
+        """Test that an unknown index kind raises ValueError."""
+        with pytest.raises(ValueError):
+            create_index("hnsw")
@@ -0,0 +1,50 @@
+"""
+Tests for DetectionScheduler class.
+"""
+from detection_scheduler import DetectionScheduler
+
+
+class TestDetectionScheduler:
+    """Tests for DetectionScheduler class."""
+    def setup_method(self):
+        """Setup for tests."""
+        self.scheduler = DetectionScheduler(min_interval=2, max_interval=6, confidence_threshold=7.0, max_age=1.0)
+
+    def run(self, confidences, frames, start=0.0, frame_time=0.01):
+        """Return list of frame indices, where detection was scheduled."""
+        return [i for i in range(frames)
+                if self.scheduler.should_detect(confidences, now=start + i * frame_time)]
+
+    def test_confident_tracks(self):
+        """Test that confident tracks are detected again every max_interval frames."""
+        assert self.run([20.0, 15.0], 13) == [0, 6, 12]
+        assert self.scheduler.interval == 6
+        assert self.scheduler.reason == "max_interval"
+
+    def test_low_confidence(self):
+        """Test that low confidence triggers detection after min_interval frames."""
+        assert self.run([20.0, 3.0], 5) == [0, 2, 4]
+        assert self.scheduler.interval == 2
+        assert self.scheduler.reason == "confidence"
+
+    def test_unknown_confidence_ignored(self):
+        """Test that trackers without confidence do not trigger detection."""
+        assert self.run([None], 7) == [0, 6]
+
+    def test_max_age(self):
+        """Test that detection is triggered when too much time has passed."""
+        assert self.run([20.0], 4, frame_time=0.6) == [0, 2]
+        assert self.scheduler.reason == "max_age"
+
+    def test_full_scan_interval(self):
+        """Test that every full_scan_interval detection scans the full frame."""
+        scheduler = DetectionScheduler(full_scan_interval=3)
+        assert [scheduler.should_scan_full_frame(2) for _ in range(7)] == [False, False, True,
+                                                                            False, False, True, False]
+
+    def test_full_scan_without_tracks(self):
+        """Test that the full frame is scanned when there are no tracked faces."""
+        scheduler = DetectionScheduler(full_scan_interval=3)
+        assert [scheduler.should_scan_full_frame(count) for count in [0, 1, 1, 0, 1]] == [True, False, False,
+                                                                                          True, False]
+        assert all(DetectionScheduler().should_scan_full_frame(1) for _ in range(3))
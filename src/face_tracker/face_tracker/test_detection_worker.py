@@ -0,0 +1,75 @@
+"""
+Tests for DetectionWorker class.
+"""
+import logging
+import threading
+import time
+
+from detection_worker import DetectionWorker
+
+
+class TestDetectionWorker:
+    """Tests for DetectionWorker class."""
+
+    def setup_method(self):
+        """Setup for tests."""
+        self.release = threading.Event()
+        self.analyzed = []
+        self.worker = DetectionWorker(self.analyze, logging.getLogger())
+
+    def teardown_method(self):
+        """Teardown for tests."""
+        self.release.set()
+        self.worker.stop()
+
+    def analyze(self, frame, tag):
+        """Wait until released and return the frame and its tag as the result."""
+        self.release.wait(timeout=10)
+        self.analyzed.append(frame)
+        return [(frame, tag)]
+
+    def wait_result(self, timeout=10):
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            result = self.worker.poll_result()
+            if result is not None:
+                return result
+            time.sleep(0.001)
+        return None
+
+    def wait_busy(self, timeout=10):
+        end = time.monotonic() + timeout
+        while not self.worker.busy and time.monotonic() < end:
+            time.sleep(0.001)
+
+    def test_result(self):
+        """Test that the result is returned once, with the arguments given to submit."""
+        self.release.set()
+        self.worker.submit(1, "a")
+        assert self.wait_result() == [(1, "a")]
+        assert self.worker.poll_result() is None
+
+    def test_latest_frame(self):
+        """Test that frames submitted while the worker is busy are replaced by the latest one."""
+        self.worker.submit(1, "a")
+        self.wait_busy()
+        self.worker.submit(2, "b")
+        self.worker.submit(3, "c")
+        assert self.worker.dropped_frames == 1
+
+        self.release.set()
+        end = time.monotonic() + 10
+        while (len(self.analyzed) < 2 or self.worker.busy) and time.monotonic() < end:
+            time.sleep(0.001)
+        assert self.analyzed == [1, 3]
+        # The result of the older frame is replaced, if it was not picked up
+        assert self.worker.poll_result() == [(3, "c")]
+
+    def test_stop(self):
+        """Test that stop finishes the analysis in progress and ends the thread."""
+        self.worker.submit(1, "a")
+        self.wait_busy()
+        threading.Timer(0.05, self.release.set).start()
+        self.worker.stop()
+        assert self.analyzed == [1]
+        assert not self.worker._thread.is_alive()
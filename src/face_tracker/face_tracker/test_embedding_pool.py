@@ -0,0 +1,55 @@
+"""
+Tests for EmbeddingPool class.
+"""
+import logging
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+from embedding_pool import EmbeddingPool
+
+
+class FakeRecognizer:
+    """
+    Face recognizer of the worker processes, whose representation of an image is its mean.
+    An image of -1 values kills the worker.
+    """
+
+    def __init__(self, db_path, logger, model_name, detector_backend):
+        pass
+
+    def represent_batch(self, imgs):
+        if any(img.min() < 0 for img in imgs):
+            os._exit(1)
+        return [[float(img.mean())] for img in imgs]
+
+
+class TestEmbeddingPool:
+    """Tests for EmbeddingPool class."""
+
+    def setup_method(self):
+        """Setup for tests."""
+        self.pool = EmbeddingPool(2, logging.getLogger(), backend=FakeRecognizer)
+
+    def teardown_method(self):
+        """Teardown for tests."""
+        self.pool.shutdown()
+
+    def test_round_trip(self):
+        """Test that the images reach the workers through shared memory and the results keep their order."""
+        imgs = [np.full((112, 112, 3), value, dtype=np.float32) for value in (0.1, 0.2, 0.3, 0.4, 0.5)]
+        representations = self.pool.submit(imgs).result(timeout=60)
+        assert [mean for mean, in representations] == pytest.approx([0.1, 0.2, 0.3, 0.4, 0.5])
+        assert self.pool.submit([]).result() == []
+
+    def test_worker_crash(self):
+        """Test that a crashed worker fails the pending embeddings, and the pool is restarted on the next submit."""
+        future = self.pool.submit([np.full((8, 8, 3), -1.0)])
+        with pytest.raises(BrokenProcessPool):
+            future.result(timeout=60)
+
+        representations = self.pool.submit([np.full((8, 8, 3), 0.5)]).result(timeout=60)
+        assert representations[0][0] == pytest.approx(0.5)
+        assert self.pool.restarts == 1
@@ -0,0 +1,115 @@
+"""
+Tests for FaceAnalyzer class.
+"""
+import logging
+from concurrent.futures import Future
+
+import numpy as np
+
+from face import Face
+from face_analyzer import FaceAnalyzer
+
+
+class FakeRecognizer:
+    """Face recognizer, which detects the bounding box of the nonzero pixels of the image as a face."""
+
+    def __init__(self, detection_scales=(1.0,)):
+        self.detection_scales = list(detection_scales)
+        self.calls = []  # (image shape, detection scales, frame height) of the extract_faces calls
+
+    def extract_faces(self, img, detection_scales=None, frame_height=None):
+        self.calls.append((img.shape, detection_scales, frame_height))
+        ys, xs = np.nonzero(img[:, :, 0])
+        if len(xs) == 0:
+            return []
+        facial_area = {"x": int(xs.min()), "y": int(ys.min()),
+                       "w": int(xs.max() - xs.min()) + 1, "h": int(ys.max() - ys.min()) + 1}
+        if facial_area["w"] >= (frame_height or img.shape[0]) * 0.8:
+            return []
+        return [{"face": np.zeros((8, 8, 3)), "facial_area": facial_area}]
+
+    def represent_batch(self, imgs):
+        return [np.ones(16) for _ in imgs]
+
+
+def frame_with_face():
+    """Return a black frame with a 20x20 white face."""
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    frame[10:30, 10:30] = 255
+    return frame
+
+
+class FakePool:
+    """Embedding pool, whose futures are completed by the test."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, imgs):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+class TestFaceAnalyzer:
+    """Tests for FaceAnalyzer class."""
+
+    def test_embedding_pool_redetection(self):
+        """Test that a pooled embedding is applied to the face that continues the track after a re-detection."""
+        pool = FakePool()
+        analyzer = FaceAnalyzer(logging.getLogger(), face_recognizer=FakeRecognizer(), correlation_tracker=False,
+                                embedding_pool=pool)
+        frame = frame_with_face()
+
+        analyzer.on_frame_received(frame, draw=False)
+        first = analyzer.faces[0]
+        analyzer.on_frame_received(frame, draw=False)
+        second = analyzer.faces[0]
+        assert second is not first
+        # The track already has an embedding in flight
+        assert len(pool.futures) == 1
+
+        pool.futures[0].set_result([np.ones(16)])
+        analyzer.on_frame_received(frame, draw=False)
+        assert second.representation is not None and second.detections_since_verification == 0
+        assert first.representation is None
+        third = analyzer.faces[0]
+        assert third.representation is second.representation
+        assert len(analyzer.cluster.clusters) == 1
+        # The identity is not yet valid, so the track is embedded again
+        assert len(pool.futures) == 2
+
+    def test_roi_detection_tight_margin(self):
+        """Test that faces filling a tight region of interest are detected at scale 1 and not discarded as large."""
+        recognizer = FakeRecognizer(detection_scales=[0.5])
+        analyzer = FaceAnalyzer(logging.getLogger(), face_recognizer=recognizer, correlation_tracker=False,
+                                roi_detection=True, roi_margin=0.1)
+        frame = frame_with_face()
+        analyzer.on_frame_received(frame, draw=False)
+        analyzer.on_frame_received(frame, draw=False)
+
+        shape, detection_scales, frame_height = recognizer.calls[-1]
+        assert shape[0] < 30 and detection_scales == [1.0] and frame_height == 100
+        assert [face.facial_area() for face in analyzer.faces] == [{"x": 10, "y": 10, "w": 20, "h": 20}]
+
+    def test_no_face_recognition(self):
+        """Test that no faces are detected without a face recognizer."""
+        analyzer = FaceAnalyzer(logging.getLogger(), face_recognizer=False)
+        assert analyzer.on_frame_received(np.zeros((100, 100, 3), dtype=np.uint8)) == []
+
+    def test_tracking_workers(self):
+        """Test that faces tracked in the tracking thread pool move like the serially tracked faces."""
+        rng = np.random.default_rng(0)
+        frame = (rng.random((100, 160, 3)) * 255).astype(np.uint8)
+        moved = np.roll(frame, 5, axis=1)
+        locations = []
+        for workers in (0, 2):
+            analyzer = FaceAnalyzer(logging.getLogger(), face_recognizer=False, tracking_workers=workers)
+            analyzer.faces = [Face(10, 40, 10, 40, None, None, None), Face(80, 110, 50, 80, None, None, None)]
+            for face in analyzer.faces:
+                face.start_track(frame)
+            analyzer.update_locations(moved)
+            locations.append([face.facial_area() for face in analyzer.faces])
+            analyzer.shutdown()
+        assert locations[0] == locations[1]
+        assert locations[0][0]["x"] > 10
@@ -0,0 +1,72 @@
+"""
+Tests for face bounding box helper functions.
+"""
+from face_boxes import (scale_facial_area, offset_facial_area, expand_facial_area, merge_regions, iou,
+                        non_max_suppression, match_facial_areas)
+
+
+def area(x, y, w, h):
+    return {"x": x, "y": y, "w": w, "h": h}
+
+
+def test_scale_facial_area():
+    """Test that coordinates and eye locations are scaled."""
+    facial_area = area(10, 20, 30, 40)
+    facial_area["left_eye"] = (15, 25)
+    facial_area["right_eye"] = None
+    scaled = scale_facial_area(facial_area, 2.0)
+    assert scaled == {"x": 20, "y": 40, "w": 60, "h": 80, "left_eye": (30, 50), "right_eye": None}
+    assert facial_area["x"] == 10
+
+
+def test_offset_facial_area():
+    """Test that coordinates and eye locations are moved."""
+    facial_area = area(10, 20, 30, 40)
+    facial_area["left_eye"] = (15, 25)
+    assert offset_facial_area(facial_area, 100, 200) == {"x": 110, "y": 220, "w": 30, "h": 40,
+                                                         "left_eye": (115, 225)}
+
+
+def test_expand_facial_area():
+    """Test that region of interest is grown on every side and clipped to the frame."""
+    assert expand_facial_area(area(100, 100, 20, 40), 0.5, 640, 480) == area(90, 80, 40, 80)
+    assert expand_facial_area(area(0, 450, 20, 20), 1.0, 640, 480) == area(0, 430, 40, 50)
+
+
+def test_merge_regions():
+    """Test that overlapping regions are merged into their bounding box."""
+    regions = [area(0, 0, 10, 10), area(100, 100, 10, 10), area(5, 5, 10, 10), area(14, 0, 5, 5)]
+    assert merge_regions(regions) == [area(0, 0, 19, 15), area(100, 100, 10, 10)]
+    assert merge_regions([area(0, 0, 0, 10)]) == []
+
+
+def test_iou():
+    """Test intersection over union."""
+    assert iou(area(0, 0, 10, 10), area(0, 0, 10, 10)) == 1.0
+    assert iou(area(0, 0, 10, 10), area(20, 20, 10, 10)) == 0.0
+    assert iou(area(0, 0, 10, 10), area(5, 0, 10, 10)) == 50 / 150
+
+
+def test_non_max_suppression():
+    """Test that overlapping detections are combined and the most confident one is kept."""
+    face_objs = [
+        {"facial_area": area(0, 0, 10, 10), "confidence": 0.5},
+        {"facial_area": area(1, 1, 10, 10), "confidence": 0.9},
+        {"facial_area": area(50, 50, 10, 10), "confidence": 0.7},
+    ]
+    kept = non_max_suppression(face_objs)
+    assert [face_obj["confidence"] for face_obj in kept] == [0.9, 0.7]
+
+
+def test_match_facial_areas():
+    """Test that detections are matched to the overlapping or nearest track."""
+    tracks = [area(0, 0, 100, 100), area(200, 0, 100, 100), area(400, 0, 100, 100)]
+    detections = [area(210, 5, 100, 100), area(5, 0, 100, 100), area(800, 0, 100, 100)]
+    assert match_facial_areas(detections, tracks) == {0: 1, 1: 0}
+
+
+def test_match_facial_areas_centroid():
+    """Test that a shrunk detection inside a track is matched by its centroid."""
+    tracks = [area(0, 0, 200, 200)]
+    detections = [area(80, 80, 40, 40)]
+    assert match_facial_areas(detections, tracks) == {0: 0}
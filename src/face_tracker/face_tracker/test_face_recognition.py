@@ -0,0 +1,53 @@
+"""
+Tests for FaceRecognizer class.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("deepface")
+
+from face_recognition import FaceRecognizer
+
+
+class FakeKerasModel:
+    """Keras model, whose embedding of an input image is its flattened pixels."""
+
+    def predict_on_batch(self, batch):
+        return np.asarray(batch).reshape(len(batch), -1)
+
+
+class FakeModel:
+    """DeepFace recognition model with a non-square input."""
+
+    input_shape = (47, 55)  # (width, height), like DeepID
+
+    def __init__(self):
+        self.model = FakeKerasModel()
+
+
+def make_recognizer():
+    recognizer = FaceRecognizer.__new__(FaceRecognizer)
+    recognizer.model = FakeModel()
+    recognizer.target_size = recognizer.model.input_shape
+    return recognizer
+
+
+class TestFaceRecognizer:
+    """Tests for FaceRecognizer class."""
+
+    def test_batch_equals_single(self):
+        """Test that batched embeddings of non-square crops equal the embeddings of single faces."""
+        recognizer = make_recognizer()
+        rng = np.random.default_rng(0)
+        imgs = [rng.random((90, 60, 3)).astype(np.float32), rng.random((40, 80, 3)).astype(np.float32)]
+        batch = recognizer.represent_batch(imgs)
+        assert batch == [recognizer.represent(img) for img in imgs]
+
+    def test_preprocess_keeps_aspect_ratio(self):
+        """Test that a crop is resized to (height, width) of the model input without stretching."""
+        recognizer = make_recognizer()
+        img = np.ones((20, 40, 3), dtype=np.float32)
+        preprocessed = recognizer._preprocess(img)
+        assert preprocessed.shape == (1, 55, 47, 3)
+        # The wide crop fills the width, and black rows pad it above and below
+        assert np.all(preprocessed[0, 0] == 0) and np.all(preprocessed[0, 55 // 2] == 1)
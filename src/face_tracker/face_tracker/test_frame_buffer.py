@@ -0,0 +1,46 @@
+"""
+Tests for LatestFrameBuffer class.
+"""
+import threading
+
+from frame_buffer import LatestFrameBuffer
+
+
+class TestLatestFrameBuffer:
+    """Tests for LatestFrameBuffer class."""
+    def setup_method(self):
+        """Setup for tests."""
+        self.buffer = LatestFrameBuffer()
+
+    def test_get_newest(self):
+        """Test that only the newest frame is returned and older ones are counted as dropped."""
+        for frame in range(5):
+            self.buffer.put(frame)
+        frame, dropped = self.buffer.get(timeout=0)
+        assert frame == 4
+        assert dropped == 4
+        assert self.buffer.received_frames == 5
+        assert self.buffer.dropped_frames == 4
+
+    def test_dropped_since_get(self):
+        """Test that dropped count is reset on every get."""
+        self.buffer.put(1)
+        self.buffer.put(2)
+        assert self.buffer.get(timeout=0) == (2, 1)
+        self.buffer.put(3)
+        assert self.buffer.get(timeout=0) == (3, 0)
+        assert self.buffer.dropped_frames == 1
+
+    def test_get_timeout(self):
+        """Test that get returns None when there are no frames."""
+        assert self.buffer.get(timeout=0.01) == (None, 0)
+
+    def test_close_wakes_consumer(self):
+        """Test that closing the buffer wakes up a waiting consumer."""
+        results = []
+        consumer = threading.Thread(target=lambda: results.append(self.buffer.get()))
+        consumer.start()
+        self.buffer.close()
+        consumer.join(timeout=1.0)
+        assert not consumer.is_alive()
+        assert results == [(None, 0)]
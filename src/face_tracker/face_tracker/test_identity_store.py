@@ -0,0 +1,178 @@
+"""
+Tests for IdentityStore class.
+"""
+import os
+
+import numpy as np
+
+from identity_store import IdentityStore
+from links_cluster import LinksCluster, Subcluster
+from test_utils import face_vectors
+
+
+def make_cluster():
+    return LinksCluster(0.3, 0.2, 1.0, store_vectors=True)
+
+
+def state(links_cluster):
+    return [cluster.to_dict() for cluster in links_cluster.clusters]
+
+
+class TestIdentityStore:
+    """Tests for IdentityStore class."""
+
+    def fill(self, path, vectors, snapshot_interval=1000):
+        """Predict the vectors with a persistent LinksCluster. Returns the LinksCluster and the store."""
+        links_cluster = make_cluster()
+        store = IdentityStore(path, links_cluster, snapshot_interval=snapshot_interval)
+        store.load()
+        for vector in vectors:
+            links_cluster.predict(vector)
+            store.record()
+        store.flush()
+        return links_cluster, store
+
+    def restore(self, path):
+        links_cluster = make_cluster()
+        store = IdentityStore(path, links_cluster)
+        store.load()
+        return links_cluster, store
+
+    def test_restore(self, tmp_path):
+        """Test that snapshots and the log restore the clusters, which then predict like the originals."""
+        rng = np.random.default_rng(0)
+        original, store = self.fill(str(tmp_path), face_vectors(rng, 300), snapshot_interval=40)
+        assert store.generation > 0 and store.records > 0
+        # Subclusters connected by edges
+        for cl_idx, cluster in enumerate(original.clusters[:3]):
+            subcluster = Subcluster(rng.standard_normal(32))
+            LinksCluster.add_edge(cluster.subclusters[0], subcluster)
+            cluster.add_subcluster(subcluster)
+            original.rebuild_index()
+            original.changed_clusters.add(cl_idx)
+            store.record()
+        store.flush()
+
+        restored, _ = self.restore(str(tmp_path))
+        assert state(restored) == state(original)
+        assert len(restored.index) == sum(len(cluster.subclusters) for cluster in restored.clusters)
+        assert restored.clusters[0].subclusters[0].connected_subclusters == {restored.clusters[0].subclusters[-1]}
+
+        store.snapshot()
+        restored, _ = self.restore(str(tmp_path))
+        assert state(restored) == state(original)
+
+        for vector in face_vectors(np.random.default_rng(0), 50):
+            assert restored.predict(vector) == original.predict(vector)
+
+    def test_empty(self, tmp_path):
+        """Test that a new database is empty and close writes nothing."""
+        links_cluster, store = self.restore(str(tmp_path / "database"))
+        assert links_cluster.clusters == []
+        store.close()
+        assert not any(name.startswith("snapshot") for name in os.listdir(tmp_path / "database"))
+
+    def test_close(self, tmp_path):
+        """Test that close writes a snapshot and deletes the previous generation."""
+        rng = np.random.default_rng(1)
+        original, store = self.fill(str(tmp_path), face_vectors(rng, 50))
+        store.close()
+        assert sorted(os.listdir(tmp_path)) == ["changes-000001.jsonl", "snapshot-000001.json",
+                                                "snapshot-000001.npy"]
+        assert os.path.getsize(tmp_path / "changes-000001.jsonl") == 0
+
+        restored, _ = self.restore(str(tmp_path))
+        assert state(restored) == state(original)
+
+    def test_incomplete_record(self, tmp_path):
+        """Test that an incomplete last record is cut off, and records after it are restored."""
+        rng = np.random.default_rng(2)
+        vectors = face_vectors(rng, 60)
+        original, store = self.fill(str(tmp_path), vectors[:40])
+        expected = state(original)
+        store._log.write('{"clusters": [[0, {"id": ')
+        store._log.close()
+
+        restored, store = self.restore(str(tmp_path))
+        assert state(restored) == expected
+        for vector in vectors[40:]:
+            restored.predict(vector)
+            store.record()
+        store.flush()
+        store._log.close()
+
+        again, _ = self.restore(str(tmp_path))
+        assert state(again) == state(restored)
+
+    def test_incomplete_snapshot(self, tmp_path):
+        """Test that a snapshot without its json file is ignored, and the previous snapshot and log are loaded."""
+        rng = np.random.default_rng(3)
+        original, store = self.fill(str(tmp_path), face_vectors(rng, 60), snapshot_interval=25)
+        store._log.close()
+        generation = store.generation
+        np.save(tmp_path / f"snapshot-{generation + 1:06d}.npy", np.zeros((3, 32)))
+
+        restored, store = self.restore(str(tmp_path))
+        assert store.generation == generation
+        assert state(restored) == state(original)
+
+    def test_unwritten_snapshot(self, tmp_path):
+        """Test that the records after a snapshot was started are restored, if the snapshot was not written."""
+        rng = np.random.default_rng(5)
+        vectors = face_vectors(rng, 50)
+        original, store = self.fill(str(tmp_path), vectors[:40], snapshot_interval=15)
+        generation = store.generation
+        # The snapshot is started like snapshot does, but its files are never written
+        store.records = 0
+        store._start_snapshot()
+        for vector in vectors[40:]:
+            original.predict(vector)
+            store.record()
+        store.flush()
+        store._log.close()
+        assert not os.path.exists(tmp_path / f"snapshot-{generation + 1:06d}.json")
+
+        restored, store = self.restore(str(tmp_path))
+        assert store.generation == generation + 1
+        assert state(restored) == state(original)
+
+    def test_failed_snapshot(self, tmp_path):
+        """Test that the changes are kept in the log, if writing a snapshot fails."""
+        rng = np.random.default_rng(6)
+        links_cluster = make_cluster()
+        store = IdentityStore(str(tmp_path), links_cluster, snapshot_interval=10)
+        store.load()
+
+        def fail(path, write):
+            raise OSError("disk full")
+        store._write = fail
+        for vector in face_vectors(rng, 30):
+            links_cluster.predict(vector)
+            store.record()
+        store.flush()
+        assert not any(name.startswith("snapshot") for name in os.listdir(tmp_path))
+
+        restored, _ = self.restore(str(tmp_path))
+        assert state(restored) == state(links_cluster)
+
+    def test_merge_restored(self, tmp_path):
+        """Test that restored subclusters without stored vectors merge with bounded vector retention."""
+        rng = np.random.default_rng(4)
+        _, store = self.fill(str(tmp_path), face_vectors(rng, 50))
+        store.close()
+
+        restored = LinksCluster(0.3, 0.2, 1.0, vector_retention="reservoir", retained_vectors=4)
+        IdentityStore(str(tmp_path), restored).load()
+        for cl_idx, cluster in enumerate(restored.clusters):
+            first = cluster.subclusters[0]
+            assert len(first.retained) == 0 and first.retained.seen == 0
+            for vector in rng.standard_normal((2, 32)):
+                first.retained.add(vector)
+            second = Subcluster(rng.standard_normal(32), retention=restored.new_retention())
+            for vector in rng.standard_normal((10, 32)):
+                second.retained.add(vector)
+            LinksCluster.add_edge(first, second)
+            cluster.add_subcluster(second)
+            restored.rebuild_index()
+            restored.merge_subclusters(cl_idx, 0, len(cluster.subclusters) - 1)
+            assert len(first.retained) == 4 and first.retained.seen == 13
@@ -0,0 +1,99 @@
+"""
+Tests for StageTimer and ProfileCapture classes.
+"""
+import logging
+import os
+import pstats
+
+from instrumentation import HISTOGRAM_EDGES_MS, ProfileCapture, StageTimer
+
+
+class TestStageTimer:
+    """Tests for StageTimer class."""
+
+    def test_disabled(self):
+        """Test that disabled timer records nothing."""
+        timer = StageTimer(enabled=False)
+        with timer.stage("detection"):
+            pass
+        assert timer.end_frame() == {}
+        assert timer.statistics() == {}
+
+    def test_frame_durations(self):
+        """Test that durations of a stage are summed per frame."""
+        timer = StageTimer(enabled=True)
+        timer.record("tracking", 0.002)
+        timer.record("tracking", 0.003)
+        timer.record("detection", 0.010)
+        frame = timer.end_frame()
+        assert frame["tracking"] == 0.005
+        assert frame["detection"] == 0.010
+        assert timer.end_frame() == {}
+        assert timer.frame_count == 2
+
+    def test_rolling_window(self):
+        """Test that statistics are computed from the newest window calls."""
+        timer = StageTimer(enabled=True, window=4)
+        for duration in [1.0, 1.0, 0.001, 0.001, 0.001, 0.001]:
+            timer.record("detection", duration)
+        statistics = timer.statistics()["detection"]
+        assert statistics["calls"] == 4
+        assert statistics["max"] == 1.0
+        assert timer.samples == {}
+
+    def test_keep_samples(self):
+        """Test that all samples are kept with keep_samples."""
+        timer = StageTimer(enabled=True, window=2, keep_samples=True)
+        for _ in range(5):
+            timer.record("lip_rnn", 0.001)
+        assert len(timer.samples["lip_rnn"]) == 5
+        timer.reset()
+        assert timer.samples == {}
+
+    def test_histogram(self):
+        """Test that durations are counted into histogram buckets."""
+        timer = StageTimer(enabled=True)
+        for duration_ms in [0.5, 1.5, 1.5, 700]:
+            timer.record("embedding", duration_ms / 1000)
+        histogram = timer.statistics()["embedding"]["histogram"]
+        assert len(histogram) == len(HISTOGRAM_EDGES_MS) + 1
+        assert histogram[0] == 1
+        assert histogram[1] == 2
+        assert histogram[-1] == 1
+
+    def test_stage_order(self):
+        """Test that pipeline stages are listed in pipeline order before other stages."""
+        timer = StageTimer(enabled=True)
+        for name in ["custom", "drawing", "detection"]:
+            with timer.stage(name):
+                pass
+        assert list(timer.statistics()) == ["detection", "drawing", "custom"]
+
+
+class TestProfileCapture:
+    """Tests for ProfileCapture class."""
+
+    def test_capture(self, tmp_path):
+        """Test that requested capture is started by poll and dumped by stop."""
+        filename = str(tmp_path / "test.prof")
+        capture = ProfileCapture(logging.getLogger())
+        capture.poll()
+        assert not capture.active
+        capture.request(60.0, filename)
+        capture.poll()
+        assert capture.active
+        sum(range(1000))
+        capture.stop()
+        assert not capture.active
+        assert os.path.exists(filename)
+        pstats.Stats(filename)
+
+    def test_capture_expires(self, tmp_path):
+        """Test that capture is dumped by poll when its duration is over."""
+        filename = str(tmp_path / "test.prof")
+        capture = ProfileCapture(logging.getLogger())
+        capture.request(0.0, filename)
+        capture.poll()
+        capture.poll()
+        assert not capture.active
+        assert os.path.exists(filename)
@@ -8,6 +8,7 @@ https://github.com/QEDan/links_clustering/tree/master
 
 import numpy as np
 import random
+from scipy.spatial.distance import cosine
 
 from links_cluster import LinksCluster, Cluster, Subcluster, CONVERSATION_TRESHOLD
 
@@ -183,6 +184,7 @@ class TestLinksCluster:
         np.testing.assert_array_almost_equal(
             self.cluster.clusters[0].subclusters[0].centroid,
             np.mean([vector, vector2], axis=0))
+        self.check_centroid_matrix()
         
         # Test conversation times
         assert self.cluster.clusters[0].subclusters[0].current_conversation == current_conversation_merged
@@ -195,6 +197,86 @@ class TestLinksCluster:
             self.cluster.predict(vector)
         assert how_many == len(self.cluster.get_all_vectors())
 
+    def test_bounded_vector_retention(self):
+        """Test that a bounded retention policy keeps at most retained_vectors vectors per subcluster."""
+        cluster = LinksCluster(self.cluster_similarity_threshold,
+                               self.subcluster_similarity_threshold,
+                               self.pair_similarity_maximum,
+                               vector_retention="reservoir",
+                               retained_vectors=5)
+        vector = self.random_vec()
+        for _ in range(50):
+            cluster.predict(vector + 0.01 * self.random_vec())
+        assert len(cluster.clusters) == 1
+        assert cluster.clusters[0].subclusters[0].vector_count == 50
+        assert len(cluster.get_all_vectors()) == 5
+
+        report = cluster.memory_report()
+        assert report == [{"id": cluster.clusters[0].id, "subclusters": 1, "vectors": 5,
+                           "bytes": 5 * self.vector_dim * 4 + self.vector_dim * 8}]
+
+    def test_memory_report(self):
+        """Test that memory_report counts the stored vectors of every identity."""
+        for _ in range(100):
+            self.cluster.predict(self.random_vec())
+        report = self.cluster.memory_report()
+        assert [cl["id"] for cl in report] == [cl.id for cl in self.cluster.clusters]
+        assert sum(cl["vectors"] for cl in report) == 100
+        assert all(cl["bytes"] >= (cl["vectors"] + cl["subclusters"]) * self.vector_dim * 8 for cl in report)
+
+    def check_centroid_matrix(self):
+        """Check that the centroid index matches the subclusters of the clusters."""
+        subclusters = 0
+        for cl_idx, cl in enumerate(self.cluster.clusters):
+            for sc in cl.subclusters:
+                assert self.cluster._subcluster_clusters[sc] == cl_idx
+                np.testing.assert_allclose(self.cluster.index.vector(sc),
+                                           sc.centroid / np.linalg.norm(sc.centroid), rtol=1e-5, atol=1e-6)
+                subclusters += 1
+        assert subclusters == len(self.cluster.index) == len(self.cluster._subcluster_clusters)
+
+    def test_centroid_matrix(self):
+        """Test that the centroid matrix is kept up to date and gives the same nearest subcluster as a full search."""
+        rng = np.random.default_rng(2)
+        centers = [rng.random(self.vector_dim) - 0.5 for _ in range(10)]
+        for i in range(300):
+            vector = centers[i % len(centers)] + 0.2 * (rng.random(self.vector_dim) - 0.5)
+            self.cluster.predict(vector)
+        self.check_centroid_matrix()
+
+        for _ in range(20):
+            vector = rng.random(self.vector_dim) - 0.5
+            cl_idx, sc_idx, similarity = self.cluster.nearest_subcluster(vector)
+            best = max((1.0 - cosine(vector, sc.centroid), i, j)
+                       for i, cl in enumerate(self.cluster.clusters) for j, sc in enumerate(cl.subclusters))
+            assert (cl_idx, sc_idx) == best[1:]
+            assert abs(similarity - best[0]) < 1e-9
+
+        self.cluster.rebuild_index()
+        self.check_centroid_matrix()
+
+    def test_update_cluster_graph(self):
+        """Test that merges and splits keep subcluster positions, edges and the index consistent."""
+        cluster = LinksCluster(0.6, 0.8, 0.95, store_vectors=True)
+        rng = np.random.default_rng(3)
+        centers = rng.standard_normal((10, 32))
+        vectors = centers[rng.integers(0, 10, 300)] + 0.7 * rng.standard_normal((300, 32))
+        for vector in vectors:
+            cluster.predict(vector)
+        self.cluster = cluster
+        self.check_centroid_matrix()
+
+        subclusters = [sc for cl in cluster.clusters for sc in cl.subclusters]
+        assert len({sc.id for sc in subclusters}) == len(subclusters)
+        assert len(subclusters) > len(cluster.clusters)
+        assert sum(sc.vector_count for sc in subclusters) == len(vectors)
+        for cl in cluster.clusters:
+            for sc_idx, sc in enumerate(cl.subclusters):
+                assert cl.index_of(sc) == sc_idx
+                for connected in sc.connected_subclusters:
+                    assert connected in cl
+                    assert sc in connected.connected_subclusters
+
     def test_sim_threshold_limit(self):
         """Test that the limit for large k is near 1.0."""
         large_k = 2 ** 25
@@ -470,3 +552,30 @@ class TestCluster:
         assert len(self.cluster.subclusters[0].vectors) == 2
         assert len(self.cluster.subclusters[0].connected_subclusters) == 1
         assert self.cluster.subclusters[0].connected_subclusters == {new_subcluster_1}
+
+    def test_from_dict(self):
+        """Test that a cluster is restored from to_dict with its subclusters, edges and conversations."""
+        new_subcluster = Subcluster(self.random_vec())
+        new_subcluster.conversations.append({"start_time": 1.0, "end_time": 5.0, "duration": 4.0})
+        self.cluster.add_subcluster(new_subcluster)
+        LinksCluster.add_edge(self.cluster.subclusters[0], new_subcluster)
+        self.cluster.subclusters[0].add(self.random_vec())
+
+        restored = Cluster.from_dict(self.cluster.to_dict())
+        assert restored.id == self.cluster.id
+        assert restored.to_dict() == self.cluster.to_dict()
+        assert restored.subclusters[0].connected_subclusters == {restored.subclusters[1]}
+        np.testing.assert_array_equal(restored.subclusters[0].centroid, self.cluster.subclusters[0].centroid)
+        assert restored.calculate_conversation_list() == self.cluster.calculate_conversation_list()
+
+    def test_remove_subcluster(self):
+        """Test that a removed subcluster is replaced by the last one, and positions are kept up to date."""
+        subclusters = [self.cluster.subclusters[0]] + [Subcluster(self.random_vec()) for _ in range(3)]
+        for subcluster in subclusters[1:]:
+            self.cluster.add_subcluster(subcluster)
+        self.cluster.remove_subcluster(subclusters[1])
+        assert self.cluster.subclusters == [subclusters[0], subclusters[3], subclusters[2]]
+        assert subclusters[1] not in self.cluster
+        assert [self.cluster.index_of(sc) for sc in self.cluster.subclusters] == [0, 1, 2]
+        self.cluster.remove_subcluster(subclusters[2])
+        assert self.cluster.subclusters == [subclusters[0], subclusters[3]]
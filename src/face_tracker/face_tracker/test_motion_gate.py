@@ -0,0 +1,58 @@
+"""
+Tests for MotionGate class.
+"""
+import numpy as np
+
+from motion_gate import MotionGate
+
+
+def frame(value=0, square=None):
+    """Return gray BGR frame, optionally with a white square at x = square."""
+    img = np.full((240, 320, 3), value, dtype=np.uint8)
+    if square is not None:
+        img[100:160, square:square + 60] = 255
+    return img
+
+
+class TestMotionGate:
+    """Tests for MotionGate class."""
+    def setup_method(self):
+        """Setup for tests."""
+        self.gate = MotionGate(idle_interval=1.0, hold_time=2.0)
+
+    def run(self, frames, start=0.0, frame_time=0.1, tracking=False):
+        """Return list of gate results."""
+        return [self.gate.update(img, tracking, now=start + i * frame_time) for i, img in enumerate(frames)]
+
+    def test_static_scene_goes_idle(self):
+        """Test that a static scene is analyzed only every idle_interval after hold_time."""
+        results = self.run([frame()] * 50)
+        assert all(results[:20])
+        assert self.gate.idle
+        # After going idle at 2.0 s, a frame is let through one second after the previous analyzed frame
+        assert [i for i, result in enumerate(results) if i >= 20 and result] == [29, 39, 49]
+        assert self.gate.skipped_frames == 27
+
+    def test_motion_wakes_up(self):
+        """Test that the first frame with motion is analyzed."""
+        self.run([frame()] * 25)
+        assert self.gate.idle
+        assert self.gate.update(frame(square=100), now=2.5)
+        assert self.gate.woke_up
+        assert not self.gate.idle
+        assert self.gate.wake_ups == 1
+        assert self.gate.update(frame(square=104), now=2.6)
+        assert not self.gate.woke_up
+
+    def test_tracking_keeps_gate_open(self):
+        """Test that a static scene is analyzed on every frame while faces are tracked."""
+        assert all(self.run([frame()] * 50, tracking=True))
+        assert not self.gate.idle
+
+    def test_noise_is_not_motion(self):
+        """Test that small changes of brightness do not count as motion."""
+        rng = np.random.default_rng(0)
+        frames = [frame(100 + int(rng.integers(-5, 5))) for _ in range(30)]
+        self.run(frames)
+        assert self.gate.idle
+        assert self.gate.motion_area == 0.0
@@ -0,0 +1,58 @@
+"""
+Tests for QualityController class.
+"""
+from quality_controller import QualityController
+
+
+class TestQualityController:
+    """Tests for QualityController class."""
+    def setup_method(self):
+        """Setup for tests."""
+        self.controller = QualityController(target_fps=10, detection_interval_max=5, lower_after=2, raise_after=3)
+
+    def run(self, frame_time, stages, measurements):
+        """Add one frame per measurement and update. Returns all decisions."""
+        decisions = []
+        for _ in range(measurements):
+            self.controller.add_frame(frame_time, stages)
+            decisions += self.controller.update()
+        return decisions
+
+    def test_no_change_within_budget(self):
+        """Test that quality is not changed when the load is between the limits."""
+        assert self.run(0.09, {"detection": 0.05}, 10) == []
+        assert self.controller.value("detection_scale_factor") == 1.0
+        assert abs(self.controller.load - 0.9) < 1e-9
+
+    def test_lower_most_expensive_group(self):
+        """Test that the setting of the most expensive stage group is lowered."""
+        decisions = self.run(0.2, {"detection": 0.05, "lip_landmarks": 0.08, "lip_rnn": 0.05}, 2)
+        assert len(decisions) == 1
+        assert decisions[0].startswith("lowered lip_stride 1 -> 2")
+        assert self.controller.value("lip_stride") == 2
+
+    def test_lower_settings_of_group_in_turn(self):
+        """Test that the least lowered setting of a group is lowered."""
+        self.run(0.2, {"detection": 0.1}, 4)
+        assert self.controller.value("detection_interval_max") == 10
+        assert self.controller.value("detection_scale_factor") == 0.75
+        assert self.controller.value("lip_stride") == 1
+
+    def test_raise_when_saving_fits(self):
+        """Test that the latest lowering is undone, when the load stays low even with the saved time."""
+        self.run(0.2, {"detection": 0.1}, 2)
+        assert self.controller.value("detection_interval_max") == 10
+        # Lowering saved 0.1 s per frame, load 0.6 + 1.0 is too much
+        assert self.run(0.06, {"detection": 0.01}, 5) == []
+        self.controller.history[-1] = (self.controller.history[-1][0], 2.0, 0.01)
+        decisions = self.run(0.06, {"detection": 0.01}, 3)
+        assert decisions[0].startswith("raised detection_interval_max 10 -> 5")
+        assert self.controller.history == []
+
+    def test_uncontrolled_settings(self):
+        """Test that interval and lip stride are not controlled without tracking and lip movement detection."""
+        controller = QualityController(target_fps=10, correlation_tracking=False, lip_movement_detection=False,
+                                       debug_image_rate=5.0)
+        assert controller.value("detection_interval_max") is None
+        assert controller.value("lip_stride") is None
+        assert controller.settings["debug_image_rate"].values == [5.0, 2.0, 1.0]
@@ -0,0 +1,90 @@
+"""
+Tests for EmbeddingBatcher and SharedFaceRecognizer classes.
+"""
+import threading
+
+import pytest
+
+from shared_models import EmbeddingBatcher, SharedFaceRecognizer
+
+
+class FakeRecognizer:
+    """Face recognizer, whose representation of an image is the image itself."""
+
+    def __init__(self):
+        self.detection_scales = [1.0]
+        self.batch_sizes = []
+        self.extracted_scales = []
+
+    def represent_batch(self, imgs):
+        self.batch_sizes.append(len(imgs))
+        return [[img] for img in imgs]
+
+    def extract_faces(self, img, detection_scales=None, frame_height=None):
+        self.extracted_scales.append(list(self.detection_scales))
+        return []
+
+
+def run_cameras(batcher, requests):
+    """Request embeddings from one thread per camera and return the results per camera."""
+    results = [None] * len(requests)
+    barrier = threading.Barrier(len(requests))
+
+    def camera(index):
+        barrier.wait()
+        results[index] = batcher.represent_batch(requests[index])
+
+    threads = [threading.Thread(target=camera, args=(index,)) for index in range(len(requests))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestEmbeddingBatcher:
+    """Tests for EmbeddingBatcher class."""
+
+    def test_cameras_batched(self):
+        """Test that simultaneous requests of the cameras are calculated with one model call."""
+        recognizer = FakeRecognizer()
+        batcher = EmbeddingBatcher(recognizer.represent_batch, cameras=3, max_wait=5.0)
+        results = run_cameras(batcher, [[1, 2], [3], [4, 5, 6]])
+        assert results == [[[1], [2]], [[3]], [[4], [5], [6]]]
+        assert recognizer.batch_sizes == [6]
+        assert batcher.batches == 1
+        assert batcher.requests == 3
+
+    def test_wait_timeout(self):
+        """Test that a request is calculated after max_wait, when the other cameras have no faces."""
+        recognizer = FakeRecognizer()
+        batcher = EmbeddingBatcher(recognizer.represent_batch, cameras=2, max_wait=0.01)
+        assert batcher.represent_batch([1]) == [[1]]
+        assert batcher.represent_batch([]) == []
+        assert recognizer.batch_sizes == [1]
+
+    def test_error(self):
+        """Test that a failed model call raises in every camera of the batch."""
+        def represent_batch(imgs):
+            raise RuntimeError("model failed")
+
+        batcher = EmbeddingBatcher(represent_batch, cameras=1)
+        with pytest.raises(RuntimeError):
+            batcher.represent_batch([1])
+
+
+class TestSharedFaceRecognizer:
+    """Tests for SharedFaceRecognizer class."""
+
+    def test_detection_scales(self):
+        """Test that every camera detects faces with its own detection scales."""
+        recognizer = FakeRecognizer()
+        lock = threading.Lock()
+        batcher = EmbeddingBatcher(recognizer.represent_batch, cameras=2)
+        first = SharedFaceRecognizer(recognizer, lock, batcher)
+        second = SharedFaceRecognizer(recognizer, lock, batcher)
+        second.detection_scales = [0.5]
+        first.extract_faces(None)
+        second.extract_faces(None)
+        first.extract_faces(None)
+        assert recognizer.extracted_scales == [[1.0], [0.5], [1.0]]
@@ -0,0 +1,9 @@
+"""
+Helpers shared by the tests.
+"""
+
+
+def face_vectors(rng, count, dim=32, identities=10, noise=0.8):
+    """Return vectors around random identity centers, like embeddings of faces of the same people."""
+    centers = rng.standard_normal((identities, dim))
+    return centers[rng.integers(0, identities, count)] + noise * rng.standard_normal((count, dim))
@@ -0,0 +1,123 @@
+"""
+Tests for the vector retention policies.
+"""
+import numpy as np
+import pytest
+
+from vector_retention import AllVectors, NoVectors, RecentVectors, ReservoirVectors, create_retention
+
+
+def numbered(count, start=0, dim=4):
+    """Return vectors, whose elements are their number."""
+    return [np.full(dim, number, dtype=np.float64) for number in range(start, start + count)]
+
+
+def numbers(store):
+    return [int(vector[0]) for vector in store.vectors()]
+
+
+class TestReservoirVectors:
+    """Tests for ReservoirVectors class."""
+
+    def test_bounded(self):
+        """Test that at most capacity vectors are kept, as float32 rows."""
+        store = ReservoirVectors(10, np.random.default_rng(0))
+        for vector in numbered(1000):
+            store.add(vector)
+        assert len(store) == 10
+        assert store.seen == 1000
+        assert store.array.dtype == np.float32
+        assert store.nbytes == 10 * 4 * 4
+        assert len(set(numbers(store))) == 10
+
+    def test_uniform(self):
+        """Test that every vector is kept with the same probability."""
+        rng = np.random.default_rng(1)
+        kept = np.zeros(100)
+        for _ in range(2000):
+            store = ReservoirVectors(10, rng)
+            for vector in numbered(100):
+                store.add(vector)
+            kept[numbers(store)] += 1
+        # Every vector is kept in 10 % of the samples
+        assert np.all(np.abs(kept / 2000 - 0.1) < 0.035)
+
+    def test_merge(self):
+        """Test that a merged sample represents both samples by the number of their vectors."""
+        rng = np.random.default_rng(2)
+        from_first = 0
+        for _ in range(500):
+            first = ReservoirVectors(10, rng)
+            second = ReservoirVectors(10, rng)
+            for vector in numbered(300):
+                first.add(vector)
+            for vector in numbered(100, start=1000):
+                second.add(vector)
+            first.merge(second)
+            assert len(first) == 10
+            assert first.seen == 400
+            from_first += sum(number < 1000 for number in numbers(first))
+        assert from_first / (500 * 10) == pytest.approx(0.75, abs=0.03)
+
+    def test_merge_small(self):
+        """Test that small samples are concatenated."""
+        first = ReservoirVectors(10)
+        second = ReservoirVectors(10)
+        for vector in numbered(3):
+            first.add(vector)
+        for vector in numbered(4, start=10):
+            second.add(vector)
+        first.merge(second)
+        assert numbers(first) == [0, 1, 2, 10, 11, 12, 13]
+
+
+class TestRecentVectors:
+    """Tests for RecentVectors class."""
+
+    def test_latest(self):
+        """Test that the latest vectors are kept from the oldest to the latest."""
+        store = RecentVectors(5)
+        for vector in numbered(3):
+            store.add(vector)
+        assert numbers(store) == [0, 1, 2]
+        for vector in numbered(9, start=3):
+            store.add(vector)
+        assert numbers(store) == [7, 8, 9, 10, 11]
+
+    def test_merge(self):
+        """Test that merged stores keep the latest vectors of both."""
+        first = RecentVectors(4)
+        second = RecentVectors(4)
+        for vector in numbered(6):
+            (first if vector[0] % 2 == 0 else second).add(vector)
+        for vector in numbered(3, start=6):
+            first.add(vector)
+        first.merge(second)
+        assert numbers(first) == [5, 6, 7, 8]
+        first.add(numbered(1, start=9)[0])
+        assert numbers(first) == [6, 7, 8, 9]
+
+
+class TestPolicies:
+    """Tests for create_retention and the unbounded policies."""
+
+    def test_all(self):
+        """Test that all vectors are kept as they were given."""
+        store = create_retention("all")
+        assert isinstance(store, AllVectors)
+        vectors = numbered(100)
+        for vector in vectors:
+            store.add(vector)
+        assert all(kept is vector for kept, vector in zip(store.vectors(), vectors))
+
+    def test_none(self):
+        """Test that no vectors are kept."""
+        store = create_retention("none")
+        assert isinstance(store, NoVectors)
+        store.add(np.ones(4))
+        assert len(store) == 0 and store.vectors() == [] and store.nbytes == 0
+
+    def test_unknown(self):
+        """Test that an unknown policy raises ValueError."""
+        with pytest.raises(ValueError):
+            create_retention("lru")
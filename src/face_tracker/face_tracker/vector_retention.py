@@ -0,0 +1,204 @@
+"""
+Retention policies of the face embeddings stored in the subclusters of LinksCluster.
+
+Storing every embedding of a subcluster grows memory without bound on a long deployment, so the bounded policies
+keep at most capacity vectors per subcluster in a preallocated float32 array:
+
+    "reservoir": uniform random sample of all vectors of the subcluster (reservoir sampling)
+    "recent": the capacity latest vectors (ring buffer)
+    "none": no vectors
+    "all": every vector in a list, as they were given
+"""
+import time
+
+import numpy as np
+
+RETENTION_POLICIES = ["reservoir", "recent", "none", "all"]
+
+
+def create_retention(policy="reservoir", capacity=32, rng=None):
+    """
+    Return a new empty vector store of the policy.
+
+    Args:
+        policy: One of RETENTION_POLICIES
+        capacity: Maximum number of vectors of the bounded policies
+        rng: numpy Generator of the reservoir sampling
+    """
+    if policy == "reservoir":
+        return ReservoirVectors(capacity, rng)
+    if policy == "recent":
+        return RecentVectors(capacity)
+    if policy == "none":
+        return NoVectors()
+    if policy == "all":
+        return AllVectors()
+    raise ValueError(f"Unknown vector retention policy {policy}, use one of {RETENTION_POLICIES}")
+
+
+class AllVectors:
+    """Every vector in a list. The vectors are not copied."""
+
+    def __init__(self):
+        self._vectors = []
+
+    def __len__(self):
+        return len(self._vectors)
+
+    @property
+    def nbytes(self):
+        return sum(np.asarray(vector).nbytes for vector in self._vectors)
+
+    def vectors(self):
+        return self._vectors
+
+    def add(self, vector):
+        self._vectors.append(vector)
+
+    def merge(self, other: "AllVectors"):
+        self._vectors += other.vectors()
+
+    def clear(self):
+        self._vectors = []
+
+
+class NoVectors:
+    """No vectors."""
+
+    nbytes = 0
+
+    def __len__(self):
+        return 0
+
+    def vectors(self):
+        return []
+
+    def add(self, vector):
+        pass
+
+    def merge(self, other):
+        pass
+
+    def clear(self):
+        pass
+
+
+class _BoundedVectors:
+    """Up to capacity vectors as rows of a float32 array, which is allocated on the first vector."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.array = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes if self.array is not None else 0
+
+    def vectors(self):
+        """Return the vectors as a list of rows of the array."""
+        return list(self.array[:self.size]) if self.array is not None else []
+
+    def _append(self, vector):
+        if self.array is None:
+            self.array = np.empty((self.capacity, len(vector)), dtype=np.float32)
+        self.array[self.size] = vector
+        self.size += 1
+
+    def clear(self):
+        self.array = None
+        self.size = 0
+
+
+class ReservoirVectors(_BoundedVectors):
+    """
+    Uniform random sample of at most capacity vectors of all added vectors (Algorithm R),
+    so the sample covers the whole history of the subcluster.
+    """
+
+    def __init__(self, capacity, rng=None):
+        super().__init__(capacity)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.seen = 0  # Number of added vectors, also the merged ones
+
+    def add(self, vector):
+        self.seen += 1
+        if self.size < self.capacity:
+            self._append(vector)
+            return
+        row = self.rng.integers(0, self.seen)
+        if row < self.capacity:
+            self.array[row] = vector
+
+    def clear(self):
+        super().clear()
+        self.seen = 0
+
+    def merge(self, other: "ReservoirVectors"):
+        """
+        Combine the samples, so that the result is a uniform sample of the vectors of both. The number of
+        vectors taken from each sample is drawn like sampling capacity vectors of both without replacement.
+        """
+        seen = self.seen + other.seen
+        if len(other) == 0:
+            self.seen = seen
+            return
+        if self.size + other.size <= self.capacity:
+            for vector in other.array[:other.size]:
+                self._append(vector)
+        else:
+            count = self.rng.hypergeometric(self.seen, other.seen, self.capacity)
+            # seen and size disagree, if the vectors of a subcluster were not kept, e.g. after a restore
+            count = int(np.clip(count, self.capacity - other.size, self.size))
+            rows = np.concatenate([self.array[self.rng.choice(self.size, count, replace=False)],
+                                   other.array[self.rng.choice(other.size, self.capacity - count, replace=False)]])
+            self.array[:] = rows
+            self.size = self.capacity
+        self.seen = seen
+
+
+class RecentVectors(_BoundedVectors):
+    """The capacity latest vectors in a ring buffer."""
+
+    def __init__(self, capacity):
+        super().__init__(capacity)
+        self.times = np.zeros(capacity)  # Time when each row was added, for merging
+        self.next = 0  # Row of the next vector, when full
+
+    def vectors(self):
+        """Return the vectors from the oldest to the latest."""
+        if self.size < self.capacity:
+            return super().vectors()
+        return list(np.roll(self.array, -self.next, axis=0))
+
+    def add(self, vector):
+        now = time.monotonic()
+        if self.size < self.capacity:
+            self.times[self.size] = now
+            self._append(vector)
+            return
+        self.array[self.next] = vector
+        self.times[self.next] = now
+        self.next = (self.next + 1) % self.capacity
+
+    def clear(self):
+        super().clear()
+        self.next = 0
+
+    def merge(self, other: "RecentVectors"):
+        """Keep the capacity latest vectors of both."""
+        if len(other) == 0:
+            return
+        rows = np.concatenate([self.array[:self.size], other.array[:other.size]]) if self.size \
+            else other.array[:other.size]
+        times = np.concatenate([self.times[:self.size], other.times[:other.size]])
+        latest = np.argsort(times, kind="stable")[-self.capacity:]  # From the oldest to the latest
+        if self.array is None:
+            self.array = np.empty((self.capacity, rows.shape[1]), dtype=np.float32)
+        self.size = len(latest)
+        self.array[:self.size] = rows[latest]
+        self.times[:self.size] = times[latest]
+        self.next = 0
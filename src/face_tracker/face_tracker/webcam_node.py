@@ -1,18 +1,13 @@
 import rclpy
-import cv2
 import sys
 
 from rclpy.node import Node
 
+from std_msgs.msg import Header
 from sensor_msgs.msg import Image
 
-from cv_bridge import CvBridge, CvBridgeError
-
-bridge = CvBridge()
-
-class WebcamError(Exception):
-    """signal that webcam has stopped working"""
-    pass
+from .camera_capture import CameraCapture, WebcamError
+from .image_conversion import numpy_to_imgmsg
 
 class WebCamNode(Node):
     def __init__(self):
@@ -49,96 +44,80 @@ class WebCamNode(Node):
             self.declare_parameter("mjpg", False)
             .get_parameter_value()._bool_value
         )
+        self.publish_rate = (
+            self.declare_parameter("publish_rate", 0.0)  # Hz, 0 for camera framerate
+            .get_parameter_value().double_value
+        )
+        self.buffer_size = (
+            self.declare_parameter("buffer_size", 2)
+            .get_parameter_value().integer_value
+        )
 
         self.logger.info(f"Webcam node parameters:\n" +
                          f"index={self.index}\n" +
                          f"width={self.width}\n" +
                          f"height={self.height}\n" +
                          f"fps={self.fps}\n" +
-                         f"mjpg={self.mjpg}")
+                         f"mjpg={self.mjpg}\n" +
+                         f"publish_rate={self.publish_rate}\n" +
+                         f"buffer_size={self.buffer_size}")
 
         self.face_img_publisher = self.create_publisher(Image, raw_image_topic, 5)
 
-        # TODO: Implement better way to run webcam loop.
-        self.webcam_loop()
-
-
-    def webcam_loop(self):
-
-        self.open_webcam()
-
-        while True:
-            try:
-                # Capture a frame from webcam
-                ret, frame = self.cap.read()
-                if not ret:
-                    raise WebcamError
-
-            except WebcamError:
-                self.logger.error("[*] something went wrong, restarting webcam..")
-                # close and try reopening webcam 
-                self.close_webcam()
-                self.open_webcam()
-            try:
-                # Publish modified frame image
-                self.face_img_publisher.publish(bridge.cv2_to_imgmsg(frame, "bgr8"))
-            except CvBridgeError as e:
-                self.logger.warn("Could not convert ros img to opencv image: ", e)
-
-        # TODO: Close webcam properly
-        # self.close_webcam()
-
-    def open_webcam(self):
-        '''
-        Open webcam handle
-        '''
-        self.cap = cv2.VideoCapture(self.index)
-
-        if not self.cap.isOpened():
-            self.logger.fatal("[*] Cannot open a webcam!")
-            sys.exit(1)
-
-        # Set video capture parameters
-        if self.width:
-            W = self.width
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, W)
-        if self.height:
-            H = self.height
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, H)
-        if self.mjpg:
-            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
-        if self.fps:
-            self.cap.set(cv2.CAP_PROP_FPS, self.fps)
-
-        fps = self.cap.get(cv2.CAP_PROP_FPS)
-        w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-        self.logger.info(f"Webcam fps={fps}, shape={w},{h}")
-
-
-    def close_webcam(self):
-        '''
-        Destroy webcam handle and close all windows
-        '''
-        self.logger.info("closing webcam handle...")
-        self.cap.release()
-        cv2.destroyAllWindows()
-        self.logger.info("Webcam closed!")
+        # Frames are captured in a background thread and published by a timer
+        self.capture = CameraCapture(self.logger,
+                                     index=self.index,
+                                     width=self.width,
+                                     height=self.height,
+                                     fps=self.fps,
+                                     mjpg=self.mjpg,
+                                     buffer_size=self.buffer_size,
+                                     clock=lambda: self.get_clock().now())
+        self.capture.start()
+
+        publish_rate = self.publish_rate or self.capture.camera_fps or 30
+        self.logger.info(f"Publishing frames at {publish_rate} Hz")
+        self.published_sequence = 0
+        self.publish_timer = self.create_timer(1.0 / publish_rate, self.publish_frame)
+
+    def publish_frame(self):
+        """
+        Publish the newest captured frame, stamped with its capture time. Each frame is published only once.
+        """
+        latest = self.capture.latest()
+        if latest is None:
+            return
+        frame, capture_time, sequence = latest
+        if sequence == self.published_sequence:
+            return
+        self.published_sequence = sequence
+
+        header = Header(stamp=capture_time.to_msg())
+        self.face_img_publisher.publish(numpy_to_imgmsg(frame, "bgr8", header))
+
+    def destroy_node(self):
+        self.capture.stop()
+        return super().destroy_node()
+
 
 def main(args=None):
     # Initialize
     rclpy.init(args=args)
-    webcam = WebCamNode()
-
-    # Cannot ever get here as webcam loop is in init
-
-    # # Do work
-    # rclpy.spin(webcam)
-
-    # # Shutdown
-    # webcam.destroy_node()
-    # rclpy.shutdown()
+    try:
+        webcam = WebCamNode()
+    except WebcamError:
+        rclpy.shutdown()
+        sys.exit(1)
+
+    # Do work
+    try:
+        rclpy.spin(webcam)
+    except KeyboardInterrupt:
+        pass
+
+    # Shutdown
+    webcam.destroy_node()
+    rclpy.try_shutdown()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,72 @@
+import os
+
+from ament_index_python.packages import get_package_share_directory
+
+from launch import LaunchDescription
+from launch_ros.actions import Node
+
+#index should be lowest index for the camera as usb devices usually have multiple
+#index 0 is for first or only webcam like integrated laptop webcam for example
+#for virtual machines it is easiest to port thought only the camera you are going to use and changing the camera from virtual machine settings is easier.
+def generate_launch_description():
+
+    # Face tracker and webcam in one process, frames are not sent over DDS
+    tracker_camera_node = Node(
+        package="face_tracker",
+        executable="face_tracker_camera_node",
+        namespace="face_tracker",
+        parameters=[
+            {
+                "lip_movement_detection": True,
+                "face_recognition": True,
+                "correlation_tracking": False,
+                "async_detection": False,
+                "detection_interval_min": 1,
+                "detection_interval_max": 5,
+                "tracking_confidence_threshold": 7.0,
+                "detection_max_age": 1.0,
+                "tracking_workers": 0,
+                "embedding_workers": 0,
+                "roi_detection": False,
+                "roi_margin": 1.0,
+                "full_scan_interval": 5,
+                "cluster_similarity_threshold": 0.3,
+                "subcluster_similarity_threshold": 0.2,
+                "pair_similarity_maximum": 1.0,
+                "cluster_index": "exact",
+                "vector_retention": "reservoir",
+                "retained_vectors": 32,
+                "face_db": False,
+                "face_db_path": "~/database",
+                "face_db_snapshot_interval": 1000,
+                "face_recognition_model": "SFace",
+                "face_detection_model": "yunet",
+                "face_recognition_backend": "deepface",
+                "detection_scale": 1.0,
+                "face_image_topic": "image_face",
+                "face_topic": "faces",
+                "debug_image_rate": 0.0,
+                "debug_image_scale": 1.0,
+                "debug_image_compressed": False,
+                "motion_gate": False,
+                "motion_threshold": 20,
+                "motion_min_area": 0.005,
+                "motion_idle_interval": 1.0,
+                "target_fps": 0.0,
+                "stage_statistics": False,
+                "diagnostics_period": 5.0,
+                "profile_duration": 0.0,
+                "profile_file": "face_tracker.prof",
+                "predictor": "shape_predictor_68_face_landmarks.dat",
+                "lip_movement_detector": "1_32_False_True_0.25_lip_motion_net_model.h5",
+                "raw_image": "/image_raw",
+                "index": 0,
+                "width": 1280,
+                "height": 960,
+                "fps": 30,
+                "mjpg": True,
+            }
+        ],
+    )
+
+    return LaunchDescription([tracker_camera_node])
@@ -26,6 +26,8 @@ setup(
     entry_points={
         'console_scripts': [
             'face_tracker_node = face_tracker.face_tracker_node:main',
+            'face_tracker_camera_node = face_tracker.face_tracker_camera_node:main',
+            'face_tracker_replay = face_tracker.replay:main',
             'mock_face_tracker_node = face_tracker.mock_face_tracker_node:main',
             'webcam_node = ' + package_name + '.webcam_node:main',
         ],